@@ -2,5 +2,6 @@
 @author jacobi petrucciani
 @desc the archives module
 """
-from archives.archives import archives, parse_module  # noqa
+from archives.archives import archives, parse_module, ParseError  # noqa
 from archives.globals import __version__  # noqa
+from archives.linter import Linter  # noqa
@@ -2,232 +2,464 @@
 @author jacobi petrucciani
 @desc perhaps the archives are incomplete?
 """
+
 import click
+import json
 import os
 import re
 import sys
-from collections import defaultdict
+import time
+from collections import Counter, deque
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
-from typing import List, Set, Tuple
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+    Union,
+)
 from archives.globals import (
     ast3,
     DEFAULT_INCLUDES,
     DEFAULT_EXCLUDES,
-    DEFAULT_ARG_IGNORE,
     FORMATS,
     __version__,
 )
-from archives.models.python import Class, Function, Module
-from archives.models.rules import Issue
+from archives.models.rules import Issue, Record, Rule, RuleSet
 from archives.models.tags import Tags, CHAR
+from archives.utils.cache import Cache, CACHE_DIR, DEFAULT_CACHE_SIZE, ModelCache
 from archives.utils.state import get_state, State
+from archives.utils.symbols import INDEX_FILE, lookup, search, update_index
 from archives.utils.files import (
     find_project_root,
     path_empty,
     get_python_files,
-    decode_bytes,
+    decode_source,
+    has_pathspec,
+    read_source,
 )
-from archives.utils.text import out, err
+from archives.utils.git import changed_lines, GitError, GitIndex
+from archives.utils.metrics import collect, write_metrics
+from archives.utils.profile import PROFILER
+from archives.utils.text import out, err, Writer
+from archives.utils.watch import snapshot, Stamp
 from archives.rules import (
     MODULE_RULES,
     CLASS_RULES,
     FUNCTION_RULES,
-    MISSING_ARG,
-    UNEXPECTED_ARG,
-    UNTYPED_ARG,
+    ARG_RULES,
 )
 
+if TYPE_CHECKING:  # pragma: no cover
+    from concurrent.futures import Future
+    from archives.models.python import Class, Function, Module
+
+
+CHUNK_SIZE = 4
+# the modes that watching can not be combined with
+WATCH_CONFLICTS = ("doc", "doc_html", "index", "diff", "git")
+
+# parsed modules kept in memory between runs, when running as archivesd
+MODELS: Optional[ModelCache] = None
+
+
+class ParseError(Exception):
+    """
+    @desc raised when the source of a module is not valid python
+    """
+
 
-def parse_module(filename: str) -> Module:
+def parse_source(
+    contents: Union[str, bytes], filename: str, skeleton: bool = False
+) -> "Module":
     """
     @cc 5
-    @desc parse a module into our archives' models
+    @desc parse the source of a module into our archives' models
+    @arg contents: the source code of the module, or its raw bytes in any encoding
+    @arg filename: the path to report issues in the module under
+    @arg skeleton: a flag to only parse headers and docstrings, when possible
+    @ret a parsed Module object of the given source
+    """
+    # the models, and radon with them, are only imported once a file is parsed
+    from archives.models.python import Module
+
+    if skeleton:
+        from archives.models.skeleton import parse_skeleton
+
+        with PROFILER.phase("parse"):
+            text = decode_source(contents) if isinstance(contents, bytes) else contents
+            module = parse_skeleton(text, filename)
+        if module is not None:
+            return module
+    try:
+        with PROFILER.phase("parse"):
+            ast = parse_ast(contents)
+    except (SyntaxError, ValueError, RecursionError) as error:
+        raise ParseError(f"unable to parse {filename}: {error}") from error
+    with PROFILER.phase("models"):
+        return Module(ast, filename)
+
+
+def parse_ast(contents: Union[str, bytes]) -> ast3.Module:
+    """
+    @cc 3
+    @desc parse source into an AST, letting the parser decode raw bytes itself
+    @arg contents: the source code of a module, or its raw bytes
+    @ret the AST of the module
+    """
+    try:
+        # the parser follows the coding cookie and bom of bytes without a copy
+        return ast3.parse(contents)
+    except SyntaxError:
+        if not isinstance(contents, bytes):
+            raise
+    # bytes invalid in their encoding are replaced, as they are for text
+    return ast3.parse(decode_source(contents))
+
+
+def parse_module(
+    filename: str,
+    contents: Optional[Union[str, bytes]] = None,
+    raise_errors: bool = False,
+) -> "Module":
+    """
+    @cc 7
+    @desc parse a module into our archives' models, exiting if asked to on errors
     @arg filename: the python file to parse
+    @arg contents: the already read contents of the file, if any
+    @arg raise_errors: a flag to leave parse errors to the caller, not report them
     @ret a parsed Module object of the given file
     """
     state = get_state()
-    contents = ""
-    if str(filename)[-2:] == "/-":
-        contents, _, __ = decode_bytes(sys.stdin.buffer.read())
-    elif not os.path.isfile(filename):
-        raise Exception("file does not exist")
-    else:
-        with open(filename, encoding="utf-8", errors="replace") as file_to_read:
-            contents += file_to_read.read()
+    if contents is None:
+        if str(filename)[-2:] == "/-":
+            contents = sys.stdin.buffer.read()
+        elif not os.path.isfile(filename):
+            raise Exception("file does not exist")
+        else:
+            with PROFILER.phase("read"):
+                contents = read_source(filename)
     try:
-        ast = ast3.parse(contents)
-    except:  # noqa
+        # function bodies are only parsed when a rule needs their complexity
+        return parse_source(contents, filename, not state.rules.measures)
+    except ParseError:
+        if raise_errors:
+            raise
         out("error in parsing", color="red")
         if state.ignore_exceptions:
             sys.exit(0)
-    module = Module(ast, filename)  # type: ignore
-    return module
+        raise
 
 
-def function_lint(function: Function) -> List:
+def lint(module: "Module", state: State = None) -> List:
     """
-    @cc 16
-    @desc function specific lint
-    @arg function: the Function object to lint
-    @ret a list of issues found in this function
+    @cc 6
+    @desc lint the given module, walking every class and function in it
+    @arg module: the module to lint
+    @arg state: the state to count objects in, or None for the current click state
+    @ret a list of issues found in this module
     """
-    state = get_state()
-    issues = []
+    if state is None:
+        state = get_state()
+    issues: List[Issue] = []
 
-    state.function_count += 1
+    state.module_count += 1
+    state.line_count += module.end_line
 
-    if function.doc and function.doc.no_lint:
-        state.function_nolint_count += 1
+    if module.doc and module.doc.no_lint:
+        state.module_nolint_count += 1
         return []
 
-    # check this function for rules
-    for rule in state.function_rules:
-        if rule.check(function):
-            issues.append(Issue(rule, function))
+    for rule, check in state.rules.module:
+        if check(module):
+            issues.append(Issue(rule, module))
+
+    issues.extend(walk(module.functions, module.classes, state))
+    return issues
+
 
-    # check for missing args
-    if MISSING_ARG.code not in state.disable_list:
-        for arg_name in function.missing_args:
-            issues.append(Issue(MISSING_ARG, function, dict(arg=arg_name)))
+def walk(functions: List["Function"], classes: List["Class"], state: State) -> List:
+    """
+    @cc 12
+    @desc lint functions and classes, and everything nested in them
+    @arg functions: the functions to lint
+    @arg classes: the classes to lint, before the functions
+    @arg state: the state with the rules to check, to count objects in
+    @ret a list of issues found in these functions and classes
+    """
+    rules = state.rules
+    issues: List[Issue] = []
 
-    # check for unexpected args
-    if UNEXPECTED_ARG.code not in state.disable_list:
-        for arg_name in function.unexpected_args:
-            issues.append(Issue(UNEXPECTED_ARG, function, dict(arg=arg_name)))
+    # the (rules, arg rules) of functions and classes, indexed by is_class
+    tables = ((rules.function, rules.args), (rules.klass, ()))
+    counts = [0, 0]
+    nolint_counts = [0, 0]
 
-    # check for untyped args
-    if UNTYPED_ARG.code not in state.disable_list:
-        for arg in [
-            x for x in function.args if not x.typed and x.name not in DEFAULT_ARG_IGNORE
-        ]:
-            issues.append(Issue(UNTYPED_ARG, function, dict(arg=arg)))
+    # a stack of (is_class, object), visited in the same order as a recursive walk
+    stack: List[Tuple[bool, Any]] = [(False, x) for x in reversed(functions)]
+    stack.extend((True, x) for x in reversed(classes))
+    while stack:
+        is_class, obj = stack.pop()
+        counts[is_class] += 1
+        if obj.doc and obj.doc.no_lint:
+            nolint_counts[is_class] += 1
+            continue
 
-    # check nested classes
-    for sub_class in function.classes:
-        issues.extend(class_lint(sub_class))
+        checks, arg_checks = tables[is_class]
+        for rule, check in checks:
+            if check(obj):
+                issues.append(Issue(rule, obj))
+        for rule, check in arg_checks:
+            for arg in check(obj):
+                issues.append(Issue(rule, obj, dict(arg=arg)))
 
-    # check all sub functions
-    for sub_function in function.functions:
-        issues.extend(function_lint(sub_function))
+        # nested classes are checked before nested functions
+        stack.extend((False, x) for x in reversed(obj.functions))
+        stack.extend((True, x) for x in reversed(obj.classes))
 
+    state.function_count += counts[False]
+    state.class_count += counts[True]
+    state.function_nolint_count += nolint_counts[False]
+    state.class_nolint_count += nolint_counts[True]
     return issues
 
 
-def class_lint(class_def: Class) -> List:
+def apply_rules(state: State) -> None:
     """
-    @cc 7
-    @desc class specific lint
-    @arg class_def: the Class object to lint
-    @ret a list of issues found in this class
+    @cc 1
+    @desc set the compiled rules of the given state, without the disabled ones
+    @arg state: the state to set the active rule set on
     """
+    state.rules = compile_rules(tuple(state.disable_list), state.profile)
 
-    state = get_state()
-    issues = []
 
-    state.class_count += 1
+@lru_cache(maxsize=16)
+def compile_rules(disabled: Tuple[str, ...], profile: bool) -> RuleSet:
+    """
+    @cc 4
+    @desc compile the rule set for some disabled codes, once for all files of a run
+    @arg disabled: the codes of the rules to skip
+    @arg profile: a flag to time each check of each rule
+    @ret the compiled RuleSet
+    """
+    module, klass, function, args = MODULE_RULES, CLASS_RULES, FUNCTION_RULES, ARG_RULES
+    if profile:
+        module, klass, function, args = (
+            [profiled(x) for x in table] for table in (module, klass, function, args)
+        )
+    return RuleSet(
+        module=module, klass=klass, function=function, args=args, disabled=disabled
+    )
+
 
-    if class_def.doc and class_def.doc.no_lint:
-        state.class_nolint_count += 1
-        return []
+def profiled(rule: Rule) -> Rule:
+    """
+    @cc 1
+    @desc copy a rule, timing each of its checks
+    @arg rule: the rule to time
+    @ret a copy of the rule with a timed check
+    """
+    check = PROFILER.timed_rule(rule.code, rule.check)
+    return Rule(rule.code, rule.desc, check, rule.measures)
 
-    # check this class for rules
-    for rule in state.class_rules:
-        if rule.check(class_def):
-            issues.append(Issue(rule, class_def))
 
-    # check nested classes
-    for sub_class in class_def.classes:
-        issues.extend(class_lint(sub_class))
+def build_models(module: "Module") -> int:
+    """
+    @cc 2
+    @desc build the models of every function and class in a module up front
+    @arg module: the module to build the models of
+    @ret the number of functions measured for their complexity
+    """
+    objects: List[Union["Function", "Class"]] = [*module.functions, *module.classes]
+    while objects:
+        obj = objects.pop()
+        objects.extend([*obj.functions, *obj.classes])
+    return len(module.complexities)
 
-    # check functions within this class
-    for function in class_def.functions:
-        issues.extend(function_lint(function))
 
-    return issues
+def get_cache(state: State) -> Optional[Cache]:
+    """
+    @cc 2
+    @desc get the result cache for the rules active in the given state
+    @arg state: a state that has already had apply_rules called on it
+    @ret the Cache for this run, or None if caching is disabled
+    """
+    if not state.cache_dir:
+        return None
+    return Cache(state.cache_dir, state.rules.codes(), state.cache_size)
 
 
-def lint(module: Module) -> List:
+def lint_file(
+    filename: str, options: Dict, blob: Optional[str] = None
+) -> Tuple[List[Record], Dict[str, int]]:
     """
-    @cc 7
-    @desc lint the given module!
-    @arg module: the module to lint
-    @ret a list of issues found in this module
+    @cc 17
+    @desc parse and lint a single file with its own state, so it can run in a worker
+    @arg filename: the python file to lint
+    @arg options: the options of the current run, from State.options
+    @arg blob: the git blob id of the file, if it is unchanged from the git index
+    @ret a tuple of (the issue records found, the object counters of this file)
     """
+    state = State()
+    state.update(options)
+    apply_rules(state)
+    stdin = filename[-2:] == "/-"
+    models = None if stdin else MODELS
+    module = models.get(filename) if models is not None else None
+    if module is not None and module.skeleton and state.rules.measures:
+        module = None
 
-    issues = []
-    state = get_state()
+    # warm models are already in memory, so they skip the result cache
+    cache = None if stdin or models is not None else get_cache(state)
+    contents = None
+    if cache:
+        if blob:
+            # files unchanged from the git index are looked up without reading them
+            key = cache.blob_key(filename, blob)
+        else:
+            with PROFILER.phase("read"):
+                contents = read_source(filename)
+            with PROFILER.phase("cache"):
+                key = cache.key(filename, contents)
+        with PROFILER.phase("cache"):
+            hit = cache.get(key)
+        if hit:
+            return [Record(*x) for x in hit[0]], dict(hit[1], cache_hits=1)
+    with click.Context(archives, obj=state):
+        if module is None:
+            module = parse_module(filename, contents)
+            if models is not None:
+                models.set(filename, module)
+        if state.profile:
+            # build everything up front, so its time isn't counted against the rules
+            with PROFILER.phase("models"):
+                build_models(module)
+        with PROFILER.phase("rules"):
+            records = [x.record() for x in lint(module)]
+    if cache:
+        with PROFILER.phase("cache"):
+            cache.set(key, records, state.counters())
+        state.cache_misses = 1
+    return records, state.counters()
 
-    state.module_count += 1
 
-    if module.doc and module.doc.no_lint:
-        state.module_nolint_count += 1
-        return []
+def parse_jobs(jobs: str) -> int:
+    """
+    @cc 4
+    @desc parse the value of the --jobs flag into a worker count
+    @arg jobs: either 'auto' or a positive number of jobs
+    @ret the number of worker processes to use
+    """
+    if jobs == "auto":
+        return os.cpu_count() or 1
+    count = int(jobs)
+    if count < 1:
+        raise ValueError(jobs)
+    return count
 
-    for rule in state.module_rules:
-        if rule.check(module):
-            issues.append(Issue(rule, module))
 
-    for class_def in module.classes:
-        issues.extend(class_lint(class_def))
+def lint_chunk(
+    files: List[Tuple[str, Optional[str]]],
+    options: Dict,
+    lint_one: Optional[Callable] = None,
+) -> List[Tuple[List[Record], Dict[str, int]]]:
+    """
+    @cc 3
+    @desc lint a batch of files, to cut down on the overhead of sending work to a worker
+    @arg files: a list of (python file to lint, git blob id of the file)
+    @arg options: the options of the current run, from State.options
+    @arg lint_one: the function to lint each file with, lint_file if not given
+    @ret a list of the lint_file results for each file, in order
+    """
+    lint = lint_file if lint_one is None else lint_one
+    return [lint(x, options, blob) for x, blob in files]
 
-    for function in module.functions:
-        issues.extend(function_lint(function))
 
-    return issues
+def parallel_results(
+    files: Iterable[Tuple[str, Optional[str]]],
+    options: Dict,
+    jobs: int,
+    lint_one: Optional[Callable] = None,
+) -> Iterator[Tuple[List[Record], Dict[str, int]]]:
+    """
+    @cc 6
+    @desc lint files across a pool of worker processes, keeping only a window in flight
+    @arg files: the (path, git blob id) of each of the files to lint
+    @arg options: the options of the current run, from State.options
+    @arg jobs: the number of worker processes to use
+    @arg lint_one: the function to lint each file with, lint_file if not given
+    @ret an iterator of lint_file results, in the same order as the files
+    """
+    from concurrent.futures import ProcessPoolExecutor
 
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending: Deque["Future"] = deque()
+        chunk: List[Tuple[str, Optional[str]]] = []
+        for item in files:
+            chunk.append(item)
+            if len(chunk) < CHUNK_SIZE:
+                continue
+            pending.append(executor.submit(lint_chunk, chunk, options, lint_one))
+            chunk = []
+            if len(pending) >= jobs * 2:
+                yield from pending.popleft().result()
+        if chunk:
+            pending.append(executor.submit(lint_chunk, chunk, options, lint_one))
+        while pending:
+            yield from pending.popleft().result()
 
-def archives_lint(ctx: click.Context, sources: Set[Path], state: State) -> None:
+
+def lint_results(files: Iterable[str], state: State) -> Iterator[List[Record]]:
     """
-    @cc 20
-    @desc perform an archives documentation lint
-    @arg ctx: the click context of the current run
-    @arg sources: the source files to lint
-    @arg state: the current click state
+    @cc 12
+    @desc lint files one at a time, yielding each file's issues as soon as it is done
+    @arg files: the paths of the files to lint
+    @arg state: the current click state, which collects the counters
+    @ret an iterator of the list of issue records for each file
     """
+    options = state.options()
+    blobs = state.blobs
+    items = ((x, blobs.get(x)) for x in files)
+    if state.jobs > 1:
+        results = parallel_results(items, options, state.jobs)
+    else:
+        lint_one = PROFILER.timed_files(lint_file) if state.profile else lint_file
+        results = (lint_one(x, options, blob) for x, blob in items)
 
-    # apply disables to the global rule state
-    state.module_rules = [x for x in MODULE_RULES if x.code not in state.disable_list]
-    state.class_rules = [x for x in CLASS_RULES if x.code not in state.disable_list]
-    state.function_rules = [
-        x for x in FUNCTION_RULES if x.code not in state.disable_list
-    ]
-
-    # lint the files
-    issues = []
-    for file in sources:
-        module = parse_module(str(file.absolute()))
-        issues.extend(lint(module))
-
-    for issue in issues:
-        obj = issue.obj
-        rule = issue.rule
-        module = obj if isinstance(obj, Module) else obj.module
-        extra_info = dict(name=obj.name)
-
-        # function specific info
-        if isinstance(obj, Function):
-            extra_info["cc"] = obj.complexity
-            if obj.doc:
-                extra_info["doc_cc"] = obj.doc.cc
-
-        message = FORMATS[state.format].format_map(
-            defaultdict(
-                str,
-                path=module.path,
-                line=issue.line,
-                column=issue.column,
-                code=rule.code,
-                text=rule.desc.format_map(
-                    defaultdict(str, **extra_info, **issue.extra)
-                ),
-            )
-        )
-        out(message, color="blue")
+    for records, counters in results:
+        state.merge(counters)
+        if state.hunks is not None and records:
+            hunks = state.hunks.get(str(Path(records[0].path).resolve()), [])
+            records = [x for x in records if x.touches(hunks)]
+        yield sorted(records) if state.sort else records
+
+    cache = get_cache(state)
+    if cache:
+        cache.prune()
+
+
+def summary(issue_count: int, state: State) -> None:
+    """
+    @cc 10
+    @desc print the summary of a lint run, and its stats and profile if asked for
+    @arg issue_count: the number of issues found
+    @arg state: the current click state, with the counters of the run
+    """
     if not state.quiet:
-        if issues:
-            trailing_s = "s" if len(issues) != 1 else ""
+        if issue_count:
+            trailing_s = "s" if issue_count != 1 else ""
             out("\nImpossible! Perhaps your archives are incomplete?", color="red")
-            out(f"{len(issues)} issue{trailing_s} found", color="red")
+            out(f"{issue_count} issue{trailing_s} found", color="red")
         else:
             out("Incredible! It appears that your archives are complete!", color="blue")
             out("0 issues found", color="blue")
@@ -246,24 +478,490 @@ def archives_lint(ctx: click.Context, sources: Set[Path], state: State) -> None:
                 f"{_fns} function{'s' if _fns != 1 else ''} ({state.function_nolint_count} nolint)"
             )
 
-    ctx.exit(0 if not issues else 1)
+        if state.profile:
+            for line in PROFILER.report():
+                out(line)
+
+
+def archives_lint(ctx: click.Context, sources: Iterable[Path], state: State) -> None:
+    """
+    @cc 14
+    @desc perform an archives documentation lint
+    @arg ctx: the click context of the current run
+    @arg sources: the source files to lint
+    @arg state: the current click state
+    """
+    template = FORMATS[state.format]
+    issue_count = 0
+    codes: Counter = Counter()
+    profile = None
+    if state.profile_dump:
+        import cProfile
+
+        profile = cProfile.Profile()
+        profile.enable()
+    with Writer(path=state.output, color="blue") as writer:
+        for records in lint_results((str(x.absolute()) for x in sources), state):
+            if records and (state.output or not state.quiet):
+                with PROFILER.phase("output"):
+                    writer.write([x.render(template) for x in records])
+            issue_count += len(records)
+            codes.update(x.code for x in records)
+    if profile and state.profile_dump:
+        profile.disable()
+        profile.dump_stats(state.profile_dump)
+    summary(issue_count, state)
+    if state.metrics_file:
+        metrics = collect(state, time.perf_counter() - state.started, codes)
+        try:
+            write_metrics(state.metrics_file, metrics, state.metrics_format)
+        except OSError as error:
+            err(f"unable to write metrics to {state.metrics_file}: {error}")
+    ctx.exit(0 if not issue_count else 1)
+
+
+def archives_watch(
+    ctx: click.Context,
+    find: Callable[[List[str]], Iterable[Path]],
+    state: State,
+) -> None:
+    """
+    @cc 15
+    @desc lint files each time they change, keeping the results of the rest in memory
+    @arg ctx: the click context of the current run
+    @arg find: a callable that walks the sources, adding each directory to a list
+    @arg state: the current click state
+    """
+    template = FORMATS[state.format]
+    options = state.options()
+    files: List[str] = []
+    folders: Dict[str, Stamp] = {}
+    stamps: Optional[Dict[str, Stamp]] = None
+    results: Dict[str, Tuple[List[Record], Dict[str, int]]] = {}
+    try:
+        while True:
+            # only walk the sources again when a directory has had files added or removed
+            if stamps is None or snapshot(folders) != folders:
+                # every directory walked is watched, even those without files yet
+                walked: List[str] = []
+                files = [str(x.absolute()) for x in find(walked)]
+                folders = snapshot(walked)
+            current = snapshot(files)
+            if current != stamps:
+                changed = [x for x in current if current[x] != (stamps or {}).get(x)]
+                if state.jobs > 1 and len(changed) > 1:
+                    pairs = [(x, None) for x in changed]
+                    linted = parallel_results(pairs, options, state.jobs, watch_file)
+                else:
+                    linted = (watch_file(x, options) for x in changed)
+                results.update(zip(changed, linted))
+                stamps = current
+                watch_report([results[x] for x in current], template, state)
+            time.sleep(state.watch_interval)
+    except KeyboardInterrupt:
+        ctx.exit(0)
+
+
+def parse_record(filename: str, error: ParseError) -> Record:
+    """
+    @cc 4
+    @desc turn a module that could not be parsed into an issue for it
+    @arg filename: the path of the module
+    @arg error: the error raised parsing the module
+    @ret an E999 issue record at the line of the syntax error
+    """
+    cause = error.__cause__
+    line = getattr(cause, "lineno", None) or 1
+    column = max((getattr(cause, "offset", None) or 1) - 1, 0)
+    text = f"unable to parse module: {getattr(cause, 'msg', None) or cause}"
+    return Record(filename, line, column, "E999", text, line)
+
+
+def watch_file(
+    filename: str, options: Dict, blob: str = None
+) -> Tuple[List[Record], Dict[str, int]]:
+    """
+    @cc 3
+    @desc lint a watched file, so a syntax error doesn't stop the watch
+    @arg filename: the python file to lint
+    @arg options: the options of the current run, from State.options
+    @arg blob: the git blob id of the file, if it is unchanged from the git index
+    @ret a tuple of (the issue records found, the object counters of this file)
+    """
+    try:
+        # the error is raised rather than exiting, even with --ignore-exceptions
+        return lint_file(filename, dict(options, ignore_exceptions=False), blob)
+    except ParseError as error:
+        ignored = options.get("ignore_exceptions")
+        return ([] if ignored else [parse_record(filename, error)]), {}
+
+
+def watch_report(
+    results: List[Tuple[List[Record], Dict[str, int]]], template: str, state: State
+) -> None:
+    """
+    @cc 7
+    @desc print the issues and summary of every watched file
+    @arg results: the lint_file results of every watched file, in order
+    @arg template: the format template to render each issue with
+    @arg state: the current click state, which collects the counters
+    """
+    state.reset()
+    issue_count = 0
+    with Writer(path=state.output, color="blue") as writer:
+        for records, counters in results:
+            state.merge(counters)
+            if records and (state.output or not state.quiet):
+                records = sorted(records) if state.sort else records
+                writer.write([x.render(template) for x in records])
+            issue_count += len(records)
+    summary(issue_count, state)
 
 
-def archives_doc(ctx: click.Context, sources: Set[Path], state: State) -> None:
+def doc_key(file: Path, root: Path) -> str:
     """
     @cc 2
+    @desc get the key to document a file under, unique across the project
+    @arg file: the file being documented
+    @arg root: the root of the project
+    @ret the path of the file relative to the root, or to the filesystem if outside it
+    """
+    path = Path(os.path.abspath(file))
+    try:
+        return path.relative_to(root).as_posix()
+    except ValueError:
+        # keys are always relative, so that pages keyed by them stay inside the site
+        return path.relative_to(path.anchor).as_posix()
+
+
+def archives_doc(
+    ctx: click.Context, sources: Iterable[Path], root: Path, state: State
+) -> None:
+    """
+    @cc 11
     @desc perform archives documentation generation
     @arg ctx: the click context of the current run
     @arg sources: the source files to lint
+    @arg root: the root of the project, to key modules by their path from
+    @arg state: the current click state
+    """
+    if state.doc_format == "json":
+        modules = {
+            file.parts[-1]: parse_module(str(file.absolute())).serialize()
+            for file in sources
+        }
+
+        out(modules)
+        ctx.exit(0)
+
+    # stream each module as it is parsed, rather than holding all of them
+    compact: Dict[str, Any] = dict(separators=(",", ":"), sort_keys=True, default=str)
+    failed = []
+    with Writer(path=state.output) as writer:
+        start = "{"
+        for file in sources:
+            key = doc_key(file, root)
+            try:
+                module = parse_module(str(file.absolute()), raise_errors=True)
+            except ParseError:
+                # skipped, so that what was already streamed stays valid json
+                failed.append(key)
+                continue
+            data = module.serialize()
+            if state.doc_format == "ndjson":
+                line = json.dumps(dict(path=key, module=data), **compact)
+            else:
+                line = f"{start}{json.dumps(key)}:{json.dumps(data, **compact)}"
+                start = ","
+            writer.write([line])
+        if state.doc_format == "json-compact":
+            writer.write(["{}" if start == "{" else "}"])
+    for key in failed:
+        err(f"error in parsing {key}")
+    ctx.exit(1 if failed and not state.ignore_exceptions else 0)
+
+
+def archives_doc_html(
+    ctx: click.Context, sources: Iterable[Path], root: Path, out_dir: str, state: State
+) -> None:
+    """
+    @cc 8
+    @desc render a static html site of the documentation, only redoing what changed
+    @arg ctx: the click context of the current run
+    @arg sources: the source files to document
+    @arg root: the root of the project, to lay out pages by their path from
+    @arg out_dir: the folder to write the site to
+    @arg state: the current click state
+    """
+    from archives.site import build_site
+
+    files = ((doc_key(x, root), str(x.absolute())) for x in sources)
+    rendered, indexed, failed = build_site(files, out_dir, state.jobs)
+    for key in failed:
+        err(f"error in parsing {key}")
+    if not state.quiet:
+        pages = f"{len(rendered)} page{'s' if len(rendered) != 1 else ''}"
+        indexes = f"{len(indexed)} index page{'s' if len(indexed) != 1 else ''}"
+        out(f"rendered {pages} and {indexes} into {out_dir}", color="blue")
+    ctx.exit(1 if failed and not state.ignore_exceptions else 0)
+
+
+def archives_index(
+    ctx: click.Context,
+    sources: Iterable[Path],
+    root: Path,
+    index_file: str,
+    state: State,
+) -> None:
+    """
+    @cc 8
+    @desc index every module, class, function, and arg that changed into sqlite
+    @arg ctx: the click context of the current run
+    @arg sources: the source files to index
+    @arg root: the root of the project, to key modules by their path from
+    @arg index_file: the sqlite file to keep the index in
+    @arg state: the current click state
+    """
+    import sqlite3
+
+    files = ((doc_key(x, root), str(x.absolute())) for x in sources)
+    try:
+        skeleton = not state.rules.measures
+        indexed, removed, failed = update_index(index_file, files, str(root), skeleton)
+    except sqlite3.Error as error:
+        err(f"unable to update the index at {index_file}: {error}")
+        ctx.exit(2)
+    for key in failed:
+        err(f"error in parsing {key}")
+    if not state.quiet:
+        modules = f"{len(indexed)} module{'s' if len(indexed) != 1 else ''}"
+        out(f"indexed {modules}, removed {len(removed)}, in {index_file}", color="blue")
+    ctx.exit(1 if failed and not state.ignore_exceptions else 0)
+
+
+def archives_query(
+    ctx: click.Context, index_file: str, query: str, symbol: str, state: State
+) -> None:
+    """
+    @cc 6
+    @desc look up symbols in the index, by the words of their docs or by their name
+    @arg ctx: the click context of the current run
+    @arg index_file: the sqlite file the index is kept in
+    @arg query: words to search the descriptions and notes of symbols for
+    @arg symbol: a name or qualified name to look up instead
     @arg state: the current click state
     """
-    modules = {
-        file.parts[-1]: parse_module(str(file.absolute())).serialize()
-        for file in sources
-    }
+    import sqlite3
 
-    out(modules)
-    ctx.exit(0)
+    if not os.path.isfile(index_file):
+        err(f"no index found at {index_file}, create one with --index")
+        ctx.exit(2)
+    try:
+        symbols = lookup(index_file, symbol) if symbol else search(index_file, query)
+    except sqlite3.Error as error:
+        err(f"unable to read the index at {index_file}: {error}")
+        ctx.exit(2)
+    with Writer(path=state.output) as writer:
+        writer.write([x.render() for x in symbols])
+    ctx.exit(0 if symbols else 1)
+
+
+def iter_sources(
+    src: Tuple[str],
+    root: Path,
+    include: Pattern[str],
+    exclude: Pattern[str],
+    gitignore: bool = False,
+    index: GitIndex = None,
+    walked: Optional[List[str]] = None,
+) -> Iterator[Path]:
+    """
+    @cc 9
+    @desc find the files to lint from the given sources, yielding them as they are found
+    @arg src: the files and directories passed to archives
+    @arg root: the root of the project being linted
+    @arg include: a regex for including files
+    @arg exclude: a regex for excluding files
+    @arg gitignore: a flag to also skip anything ignored by .gitignore files
+    @arg index: the git index to list directories from, instead of walking them
+    @arg walked: a list to add each directory walked to
+    @ret an iterator of unique source files, in a deterministic order
+    """
+    seen: Set[Path] = set()
+    for source in src:
+        path = Path(source)
+        if path.is_dir() and index:
+            files: Iterable[Path] = index.python_files(path, root, include, exclude)
+        elif path.is_dir():
+            files = get_python_files(path, root, include, exclude, gitignore, walked)
+        elif path.is_file() or source == "-":
+            # if a file was explicitly given, we don't care about its extension
+            files = [path]
+        else:
+            err(f"invalid path: {source}")
+            continue
+        for file in files:
+            if file not in seen:
+                seen.add(file)
+                yield file
+
+
+def diff_sources(
+    ctx: click.Context, sources: Iterable[Path], root: Path, ref: str, state: State
+) -> Iterator[Path]:
+    """
+    @cc 4
+    @desc limit the sources to the files changed since the given git ref
+    @arg ctx: the click context of the current run
+    @arg sources: the source files found for this run
+    @arg root: the root of the project being linted
+    @arg ref: the git ref to diff against
+    @arg state: the current click state, which collects the changed lines
+    @ret an iterator of the sources that have changes since the given ref
+    """
+    try:
+        state.hunks = changed_lines(ref, root)
+    except GitError as error:
+        err(f"unable to diff against {ref!r}: {str(error).strip()}")
+        ctx.exit(2)
+    hunks = state.hunks
+    return (x for x in sources if str(x.resolve()) in hunks)
+
+
+def list_info(ctx: click.Context, list_rules: bool, list_tags: bool) -> None:
+    """
+    @cc 5
+    @desc print the active rules or tags and exit, if either was asked for
+    @arg ctx: the click context of the current run
+    @arg list_rules: a flag to print the list of rules
+    @arg list_tags: a flag to print the list of tags and their descriptions
+    """
+    if list_rules:
+        for rule in [*MODULE_RULES, *CLASS_RULES, *FUNCTION_RULES, *ARG_RULES]:
+            out(f"{rule.code}: {rule.desc}")
+        ctx.exit(0)
+    if list_tags:
+        for tag in Tags.all():
+            out(f"{CHAR}{tag.name}\t{tag.desc}")
+        ctx.exit(0)
+
+
+def compile_filter(ctx: click.Context, name: str, regex: str) -> Pattern[str]:
+    """
+    @cc 2
+    @desc compile a regex passed to the cli, exiting if it is invalid
+    @arg ctx: the click context of the current run
+    @arg name: the name of the option the regex was passed to
+    @arg regex: the regex to compile
+    @ret the compiled regex
+    """
+    try:
+        return re.compile(regex)
+    except re.error:
+        err(f"invalid regex for {name}: {regex!r}")
+        ctx.exit(2)
+
+
+def check_modes(ctx: click.Context, src: Tuple[str], modes: Dict[str, Any]) -> None:
+    """
+    @cc 10
+    @desc exit if the given modes of the cli can not be used together
+    @arg ctx: the click context of the current run
+    @arg src: the files and directories passed to archives
+    @arg modes: the modes of the run, by the name of their option
+    """
+    if modes["query"] and modes["symbol"]:
+        err("--query and --symbol can not be used together")
+        ctx.exit(2)
+    stdin = "-" in src
+    if modes["watch"] and (stdin or any(modes[x] for x in WATCH_CONFLICTS)):
+        err(
+            "--watch can not be used with --doc, --doc-html, --index, --diff, --git, "
+            "or stdin"
+        )
+        ctx.exit(2)
+    if (modes["doc_html"] or modes["index"]) and stdin:
+        err("--doc-html and --index can not be used with stdin")
+        ctx.exit(2)
+
+
+def select_sources(
+    ctx: click.Context,
+    src: Tuple[str],
+    root: Path,
+    filters: Tuple[Pattern[str], Pattern[str], bool],
+    modes: Dict[str, Any],
+    state: State,
+) -> Iterator[Path]:
+    """
+    @cc 8
+    @desc find the sources of this run, from the git index or limited to a diff if asked
+    @arg ctx: the click context of the current run
+    @arg src: the files and directories passed to archives
+    @arg root: the root of the project being linted
+    @arg filters: the include regex, the exclude regex, and the gitignore flag
+    @arg modes: the modes of the run, by the name of their option
+    @arg state: the current click state
+    @ret an iterator of the sources, exiting if there are none
+    """
+    index = None
+    if modes["git"]:
+        try:
+            index = GitIndex(root)
+        except GitError as error:
+            err(f"unable to list files from git: {str(error).strip()}")
+            ctx.exit(2)
+        state.blobs = index.blobs
+    sources = iter_sources(src, root, *filters, index)
+    if state.profile:
+        sources = PROFILER.iterate("discovery", sources)
+    if modes["diff"]:
+        sources = diff_sources(ctx, sources, root, modes["diff"], state)
+    first = next(sources, None)
+    if first is None:
+        if state.verbose or not state.quiet:
+            out("no python files are detected")
+        ctx.exit(0)
+    return chain([first], sources)
+
+
+def archives_run(
+    ctx: click.Context,
+    src: Tuple[str],
+    root: Path,
+    filters: Tuple[Pattern[str], Pattern[str], bool],
+    modes: Dict[str, Any],
+    state: State,
+) -> None:
+    """
+    @cc 9
+    @desc run archives in the mode that was asked for, linting by default
+    @arg ctx: the click context of the current run
+    @arg src: the files and directories passed to archives
+    @arg root: the root of the project being linted
+    @arg filters: the include regex, the exclude regex, and the gitignore flag
+    @arg modes: the modes of the run, by the name of their option
+    @arg state: the current click state
+    """
+    if modes["query"] or modes["symbol"]:
+        query, symbol = modes["query"], modes["symbol"]
+        archives_query(ctx, modes["index_file"], query, symbol, state)
+    path_empty(src, ctx)
+    if "-" in src or state.profile:
+        # stdin can only be read from this process, and profiles only cover it
+        state.jobs = 1
+    if modes["watch"]:
+        archives_watch(
+            ctx, lambda walked: iter_sources(src, root, *filters, None, walked), state
+        )
+    sources = select_sources(ctx, src, root, filters, modes, state)
+    if modes["index"]:
+        archives_index(ctx, sources, root, modes["index_file"], state)
+    if modes["doc_html"]:
+        archives_doc_html(ctx, sources, root, modes["doc_html"], state)
+    if modes["doc"]:
+        archives_doc(ctx, sources, root, state)
+    archives_lint(ctx, sources, state)
 
 
 @click.command(context_settings=dict(help_option_names=["-h", "--help"]))
@@ -291,6 +989,18 @@ def archives_doc(ctx: click.Context, sources: Set[Path], state: State) -> None:
 @click.option(
     "--disable", type=str, default="", help="comma separated list of rules to disable"
 )
+@click.option(
+    "--gitignore",
+    is_flag=True,
+    default=False,
+    help="also skip files and folders ignored by .gitignore files",
+)
+@click.option(
+    "--git",
+    is_flag=True,
+    default=False,
+    help="list files from the git index, skipping unchanged files without reading them",
+)
 @click.option("-q", "--quiet", is_flag=True)
 @click.option("-v", "--verbose", is_flag=True)
 @click.option(
@@ -313,6 +1023,44 @@ def archives_doc(ctx: click.Context, sources: Set[Path], state: State) -> None:
     default=False,
     help="generate documentation for the given sources",
 )
+@click.option(
+    "--doc-html",
+    type=click.Path(file_okay=False, dir_okay=True, writable=True),
+    default=None,
+    help="render a static html site of the documentation into this folder",
+)
+@click.option(
+    "--doc-format",
+    type=click.Choice(["json", "ndjson", "json-compact"]),
+    default="json",
+    show_default=True,
+    help="format of --doc output, streaming one module at a time unless json",
+)
+@click.option(
+    "--index",
+    "build_index",
+    is_flag=True,
+    default=False,
+    help="index the symbols and docs of the sources into sqlite, for --query",
+)
+@click.option(
+    "--index-file",
+    type=click.Path(file_okay=True, dir_okay=False, writable=True),
+    default=None,
+    help=f"sqlite file for the index [default: <project root>/{INDEX_FILE}]",
+)
+@click.option(
+    "--query",
+    type=str,
+    default=None,
+    help="search the index for symbols whose @desc or @note mention these words",
+)
+@click.option(
+    "--symbol",
+    type=str,
+    default=None,
+    help="look up a name, or a qualified name such as Class.method, in the index",
+)
 @click.option(
     "--ignore-exceptions",
     is_flag=True,
@@ -325,6 +1073,97 @@ def archives_doc(ctx: click.Context, sources: Set[Path], state: State) -> None:
     default=False,
     help="print out additional stats for this linting run",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    type=str,
+    default="1",
+    show_default=True,
+    help="number of worker processes to lint with, or 'auto' for one per cpu",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(file_okay=True, dir_okay=False, writable=True, allow_dash=True),
+    default=None,
+    help="write issues to this file instead of standard out",
+)
+@click.option(
+    "--sort/--no-sort",
+    default=True,
+    show_default=True,
+    help="sort the issues of each file by line",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=False,
+    help="do not read or write the lint result cache",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, dir_okay=True, writable=True),
+    default=None,
+    help=f"directory for the lint result cache [default: <git root>/{CACHE_DIR}]",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CACHE_SIZE,
+    show_default=True,
+    help="maximum number of files to keep in the lint result cache",
+)
+@click.option(
+    "--diff",
+    type=str,
+    default=None,
+    metavar="REF",
+    help="only lint functions, classes, and modules changed since the given git ref",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    default=False,
+    help="keep running, re-linting files as they change",
+)
+@click.option(
+    "--watch-interval",
+    type=click.FloatRange(min=0.01),
+    default=1.0,
+    show_default=True,
+    help="seconds to wait between checks for changes in watch mode",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="time each phase and rule of this run, in a single process",
+)
+@click.option(
+    "--profile-files",
+    type=click.IntRange(min=0),
+    default=10,
+    show_default=True,
+    help="number of the slowest files to list when profiling",
+)
+@click.option(
+    "--profile-dump",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="also write cProfile stats of the lint to this file, for pstats",
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="write machine readable metrics of this run to this file",
+)
+@click.option(
+    "--metrics-format",
+    type=click.Choice(["json", "openmetrics"]),
+    default=None,
+    help="format of the metrics file [default: openmetrics for .prom files, else json]",
+)
 @click.version_option(version=__version__)
 @click.argument(
     "src",
@@ -343,17 +1182,39 @@ def archives(
     exclude: str,
     format: str,  # pylint: disable=redefined-builtin
     disable: str,
+    gitignore: bool,
+    git: bool,
     list_rules: bool,
     list_tags: bool,
     stats: bool,
     ignore_exceptions: bool,
     doc: bool,
+    doc_format: str,
+    doc_html: str,
+    build_index: bool,
+    index_file: str,
+    query: str,
+    symbol: str,
+    jobs: str,
+    output: str,
+    sort: bool,
+    no_cache: bool,
+    cache_dir: str,
+    cache_size: int,
+    diff: str,
+    watch: bool,
+    watch_interval: float,
+    profile: bool,
+    profile_files: int,
+    profile_dump: str,
+    metrics_file: str,
+    metrics_format: str,
     src: Tuple[str],
 ) -> None:
     """
     check if your code's archives are incomplete!
     \f
-    @cc 15
+    @cc 11
     @desc the main cli method for archives
     @arg ctx: the click context arg
     @arg quiet: the cli quiet flag
@@ -362,65 +1223,86 @@ def archives(
     @arg exclude: a regex for what files to exclude
     @arg format: a flag to specify output format for the issues
     @arg disable: a comma separated disable list for rules
+    @arg gitignore: a flag to skip anything ignored by .gitignore files
+    @arg git: a flag to list files from the git index
     @arg list_rules: a flag to print the list of rules and exit
     @arg list_tags: a flag to print the list of tags and their descriptions
     @arg stats: a flag to print extra stats at the end of a lint run
     @arg ignore_exceptions: a flag to ignore parsing errors and exit 0
     @arg doc: a flag to specify if we should generate docs instead of lint
+    @arg doc_format: the format of the generated docs
+    @arg doc_html: a folder to render a static html site of the documentation into
+    @arg build_index: a flag to index the symbols and docs of the sources into sqlite
+    @arg index_file: the sqlite file to keep the index in
+    @arg query: words to search the index for
+    @arg symbol: a name to look up in the index
+    @arg jobs: the number of worker processes to lint with, or 'auto'
+    @arg output: a file to write issues to, instead of standard out
+    @arg sort: a flag to sort the issues of each file by line
+    @arg no_cache: a flag to disable the lint result cache
+    @arg cache_dir: the directory to keep the lint result cache in
+    @arg cache_size: the maximum number of entries in the lint result cache
+    @arg diff: a git ref to limit the lint to the changes made since
+    @arg watch: a flag to keep linting files as they change
+    @arg watch_interval: the seconds to wait between checks for changes
+    @arg profile: a flag to time each phase and rule of the run
+    @arg profile_files: the number of the slowest files to list when profiling
+    @arg profile_dump: a file to write cProfile stats to
+    @arg metrics_file: a file to write machine readable metrics of the run to
+    @arg metrics_format: the format of the metrics file, json or openmetrics
     @arg src: a file or directory to scan for files to lint
     """
     state = ctx.ensure_object(State)
+    state.started = time.perf_counter()
     state.verbose = verbose
     state.quiet = quiet
     state.format = format
     state.disable_list = disable.split(",")
     state.ignore_exceptions = ignore_exceptions
     state.stats = stats
+    state.sort = sort
+    state.output = output if output != "-" else None
+    state.doc_format = doc_format
+    state.profile = profile or bool(profile_dump)
+    apply_rules(state)
+    state.profile_dump = profile_dump
+    state.metrics_file = metrics_file
+    state.metrics_format = metrics_format
+    PROFILER.configure(state.profile, profile_files)
 
-    if list_rules:
-        for rule in [
-            *MODULE_RULES,
-            *CLASS_RULES,
-            *FUNCTION_RULES,
-            MISSING_ARG,
-            UNEXPECTED_ARG,
-            UNTYPED_ARG,
-        ]:
-            out(f"{rule.code}: {rule.desc}")
-        ctx.exit(0)
-    if list_tags:
-        for tag in Tags.all():
-            out(f"{CHAR}{tag.name}\t{tag.desc}")
-        ctx.exit(0)
+    list_info(ctx, list_rules, list_tags)
     try:
-        include_regex = re.compile(include)
-    except re.error:
-        err(f"invalid regex for include: {include!r}")
+        state.jobs = parse_jobs(jobs)
+    except ValueError:
+        err(f"invalid number of jobs: {jobs!r}")
         ctx.exit(2)
-    try:
-        exclude_regex = re.compile(exclude)
-    except re.error:
-        err(f"invalid regex for exclude: {exclude!r}")
+    filters = (
+        compile_filter(ctx, "include", include),
+        compile_filter(ctx, "exclude", exclude),
+        gitignore,
+    )
+    if gitignore and not has_pathspec():
+        err("--gitignore requires the pathspec package to be installed")
         ctx.exit(2)
     root = find_project_root(src)
-    sources: Set[Path] = set()
-    path_empty(src, ctx)
-    for source in src:
-        path = Path(source)
-        if path.is_dir():
-            sources.update(get_python_files(path, root, include_regex, exclude_regex))
-        elif path.is_file() or source == "-":
-            # if a file was explicitly given, we don't care about its extension
-            sources.add(path)
-        else:
-            err(f"invalid path: {source}")
-    if not sources:
-        if state.verbose or not state.quiet:
-            out("no python files are detected")
-        ctx.exit(0)
-    if doc:
-        archives_doc(ctx, sources, state)
-    archives_lint(ctx, sources, state)
+    # outside of a git checkout the root is a guess, so only cache where asked to
+    if not no_cache and (cache_dir or (root / ".git").is_dir()):
+        state.cache_dir = cache_dir or str(root / CACHE_DIR)
+        state.cache_size = cache_size
+    state.watch_interval = watch_interval
+    modes = dict(
+        watch=watch,
+        doc=doc,
+        doc_html=doc_html,
+        index=build_index,
+        index_file=index_file or str(root / INDEX_FILE),
+        query=query,
+        symbol=symbol,
+        diff=diff,
+        git=git,
+    )
+    check_modes(ctx, src, modes)
+    archives_run(ctx, src, root, filters, modes, state)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""
+@author jacobi petrucciani
+@desc a thin client for archivesd, that only imports the standard library
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+from typing import Any, IO, List, Tuple
+
+
+ADDRESS_VAR = "ARCHIVESD_ADDRESS"
+# the archives options that take a value, so that a - after one is not stdin
+VALUE_OPTIONS = frozenset(
+    {
+        "--include",
+        "--exclude",
+        "--format",
+        "--disable",
+        "--doc-html",
+        "--doc-format",
+        "--index-file",
+        "--query",
+        "--symbol",
+        "-j",
+        "--jobs",
+        "-o",
+        "--output",
+        "--cache-dir",
+        "--cache-size",
+        "--diff",
+        "--watch-interval",
+        "--profile-files",
+        "--profile-dump",
+        "--metrics-file",
+        "--metrics-format",
+    }
+)
+
+
+def default_address() -> str:
+    """
+    @cc 3
+    @desc get the address archivesd listens on, unless told otherwise
+    @ret the path to a unix socket, or a host:port pair for tcp
+    """
+    address = os.environ.get(ADDRESS_VAR)
+    if address:
+        return address
+    runtime = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime, f"archivesd-{os.getuid()}.sock")
+
+
+def parse_address(address: str) -> Tuple[int, Any]:
+    """
+    @cc 4
+    @desc parse an archivesd address into a socket family and address
+    @arg address: the path to a unix socket, or a host:port pair for tcp
+    @ret a tuple of (socket family, socket address)
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and os.sep not in address:
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address  # pylint: disable=no-member
+
+
+def reads_stdin(argv: List[str]) -> bool:
+    """
+    @cc 5
+    @desc check if a set of archives arguments lints stdin, given as a - path
+    @arg argv: the arguments to run archives with
+    @ret True if a - is given as a path, rather than as the value of an option
+    """
+    value = False
+    for index, arg in enumerate(argv):
+        if value:
+            value = False
+        elif arg == "--":
+            return "-" in argv[index + 1 :]
+        elif arg == "-":
+            return True
+        else:
+            value = arg in VALUE_OPTIONS
+    return False
+
+
+def run(
+    argv: List[str], address: str = None, stdout: IO = None, stderr: IO = None
+) -> int:
+    """
+    @cc 8
+    @desc forward a set of archives arguments to archivesd, streaming back the output
+    @arg argv: the arguments to run archives with
+    @arg address: the address archivesd is listening on
+    @arg stdout: where to write the output of archives
+    @arg stderr: where to write the errors of archives
+    @ret the exit code of the archives run
+    """
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    request = dict(argv=argv, cwd=os.getcwd(), stdin=None)
+    if reads_stdin(argv):
+        request["stdin"] = sys.stdin.buffer.read().decode("latin-1")
+
+    family, addr = parse_address(address or default_address())
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.connect(addr)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("r", encoding="utf-8") as responses:
+            for line in responses:
+                frame = json.loads(line)
+                if "exit" in frame:
+                    return frame["exit"]
+                stream = stdout if "out" in frame else stderr
+                stream.write(frame.get("out", frame.get("err", "")))
+                stream.flush()
+    stderr.write("archivesd closed the connection\n")
+    return 2
+
+
+def main() -> None:
+    """
+    @cc 2
+    @desc the entrypoint for the archives-client script
+    """
+    try:
+        sys.exit(run(sys.argv[1:]))
+    except OSError as error:
+        sys.stderr.write(f"unable to reach archivesd: {error}\n")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+@author jacobi petrucciani
+@desc archivesd, a long running archives server that keeps imports and models warm
+"""
+import click
+import importlib
+import io
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Dict, Union
+from archives.client import default_address, parse_address
+from archives.globals import __version__
+from archives.utils.cache import DEFAULT_CACHE_SIZE, ModelCache
+from archives.utils.files import find_project_root
+from archives.utils.text import out
+
+
+# the archives cli module, as the package shadows it with the click command
+cli = importlib.import_module("archives.archives")
+
+
+class FrameWriter(io.TextIOBase):
+    """
+    @desc a text stream that forwards everything written to it as json frames
+    """
+
+    def __init__(self, wfile: io.BufferedIOBase, key: str) -> None:
+        """
+        @cc 1
+        @desc frame writer constructor
+        @arg wfile: the client connection to write frames to
+        @arg key: the key to send text under, either 'out' or 'err'
+        """
+        super().__init__()
+        self.wfile = wfile
+        self.key = key
+
+    def writable(self) -> bool:
+        """
+        @cc 1
+        @desc this stream is always writable
+        @ret True
+        """
+        return True
+
+    def write(self, text: Union[str, bytes]) -> int:
+        """
+        @cc 3
+        @desc send a chunk of text to the client
+        @arg text: the text to send, bytes are decoded as utf-8
+        @ret the number of characters written
+        """
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", "replace")
+        if text:
+            frame = json.dumps({self.key: text}) + "\n"
+            self.wfile.write(frame.encode("utf-8"))
+        return len(text)
+
+    def flush(self) -> None:
+        """
+        @cc 1
+        @desc flush the client connection
+        """
+        self.wfile.flush()
+
+
+def run_request(request: Dict, wfile: io.BufferedIOBase) -> int:
+    """
+    @cc 7
+    @desc run archives for a client request, streaming its output back
+    @arg request: the client request, with the argv, cwd, and stdin to run with
+    @arg wfile: the client connection to stream output to
+    @ret the exit code of the archives run
+    """
+    cwd = os.getcwd()
+    stdin = sys.stdin
+    try:
+        os.chdir(request["cwd"])
+        # relative sources find a different project root from each directory
+        find_project_root.cache_clear()
+        if request.get("stdin") is not None:
+            sys.stdin = io.TextIOWrapper(io.BytesIO(request["stdin"].encode("latin-1")))
+        with redirect_stdout(FrameWriter(wfile, "out")), redirect_stderr(
+            FrameWriter(wfile, "err")
+        ):
+            try:
+                return cli.archives.main(
+                    args=request["argv"], prog_name="archives", standalone_mode=False
+                )
+            except click.ClickException as error:
+                error.show()
+                return error.exit_code
+            except SystemExit as error:
+                if error.code is None or isinstance(error.code, int):
+                    return error.code or 0
+                # an exit with a message fails, as it does for python itself
+                print(error.code, file=sys.stderr)
+                return 1
+    finally:
+        os.chdir(cwd)
+        sys.stdin = stdin
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    @desc handles a single archives run for a client
+    """
+
+    def handle(self) -> None:
+        """
+        @cc 4
+        @desc read the client request, run it, and send back the exit code
+        """
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            code = run_request(json.loads(line), self.wfile)
+        except Exception as error:  # noqa
+            FrameWriter(self.wfile, "err").write(f"archivesd error: {error!r}\n")
+            code = 2
+        self.wfile.write((json.dumps(dict(exit=code or 0)) + "\n").encode("utf-8"))
+
+
+def is_loopback(host: str) -> bool:
+    """
+    @cc 3
+    @desc check if a host only resolves to loopback addresses
+    @arg host: the hostname or ip address to check
+    @ret True if every address of the host is a loopback address
+    """
+    try:
+        infos = socket.getaddrinfo(host, None, socket.AF_INET)
+    except socket.gaierror:
+        return False
+    return all(ipaddress.ip_address(x[4][0]).is_loopback for x in infos)
+
+
+def make_server(address: str) -> socketserver.BaseServer:
+    """
+    @cc 4
+    @desc create a server listening on the given address
+    @arg address: the path to a unix socket, or a loopback host:port pair for tcp
+    @ret a server that handles one archives run at a time
+    """
+    family, addr = parse_address(address)
+    if family == socket.AF_INET:
+        # requests run any archives arguments, writing files, and are not authenticated
+        if not is_loopback(addr[0]):
+            raise ValueError(f"archivesd only listens on loopback hosts, not {addr[0]}")
+        return socketserver.TCPServer(addr, RequestHandler)
+    if os.path.exists(addr):
+        # clean up the socket of a previous archivesd
+        os.remove(addr)
+    umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(addr, RequestHandler)
+    finally:
+        os.umask(umask)
+    os.chmod(addr, 0o600)
+    return server
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--address",
+    type=str,
+    default=None,
+    help="unix socket path, or loopback host:port, to listen on",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CACHE_SIZE,
+    show_default=True,
+    help="maximum number of parsed modules to keep in memory",
+)
+@click.version_option(version=__version__)
+def archivesd(address: str, cache_size: int) -> None:
+    """
+    run archives as a server, for use with archives-client
+    \f
+    @cc 5
+    @desc the main cli method for archivesd
+    @arg address: the address to listen on
+    @arg cache_size: the maximum number of parsed modules to keep in memory
+    """
+    setattr(cli, "MODELS", ModelCache(cache_size))
+    address = address or default_address()
+    try:
+        server = make_server(address)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint="'--address'") from error
+    out(f"archivesd listening on {address}", force=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if isinstance(server, socketserver.UnixStreamServer):
+            os.remove(address)
+
+
+if __name__ == "__main__":
+    archivesd()  # noqa
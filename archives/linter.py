@@ -0,0 +1,123 @@
+"""
+@author jacobi petrucciani
+@desc a reusable linter for using archives from other python code
+"""
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Union
+from archives.archives import apply_rules, lint, parse_source
+from archives.globals import DEFAULT_EXCLUDES, DEFAULT_INCLUDES, FORMATS
+from archives.models.rules import Record
+from archives.utils.files import find_project_root, get_python_files, read_source
+from archives.utils.state import State
+
+
+class Linter:
+    """
+    @desc a linter configured once, keeping its own state rather than click's
+    """
+
+    def __init__(
+        self,
+        disable: Iterable[str] = (),
+        output_format: str = "flake8",
+        include: str = DEFAULT_INCLUDES,
+        exclude: str = DEFAULT_EXCLUDES,
+        sort: bool = True,
+    ) -> None:
+        """
+        @cc 2
+        @desc linter constructor, compiling its rules and patterns up front
+        @arg disable: the codes of the rules to skip
+        @arg output_format: the name of the format to render issues in
+        @arg include: a regex for the files to include from directories
+        @arg exclude: a regex for the files and directories to exclude
+        @arg sort: a flag to sort the issues of each file by line
+        """
+        if output_format not in FORMATS:
+            raise ValueError(
+                f"unknown format {output_format!r}, expected one of {FORMATS}"
+            )
+        self.state = State()
+        self.state.disable_list = list(disable)
+        self.state.format = output_format
+        self.state.sort = sort
+        apply_rules(self.state)
+        self.template = FORMATS[output_format]
+        self.include = re.compile(include)
+        self.exclude = re.compile(exclude)
+
+    def lint_source(
+        self, text: Union[str, bytes], path: str = "<string>"
+    ) -> List[Record]:
+        """
+        @cc 3
+        @desc lint the source code of a module, raising ParseError if it is invalid
+        @arg text: the source code to lint, or its raw bytes in any encoding
+        @arg path: the path to report the issues of the source under
+        @ret a list of the issue records found
+        """
+        module = parse_source(text, path, not self.state.rules.measures)
+        records = [x.record() for x in lint(module, self.state)]
+        return sorted(records) if self.state.sort else records
+
+    def lint_paths(self, paths: Iterable[Union[str, Path]]) -> List[Record]:
+        """
+        @cc 2
+        @desc lint files, and the python files found in directories
+        @arg paths: the files and directories to lint
+        @ret a list of the issue records found, file by file
+        """
+        records = []
+        for path in self.files(paths):
+            records.extend(self.lint_source(read_source(str(path)), str(path)))
+        return records
+
+    def files(self, paths: Iterable[Union[str, Path]]) -> Iterator[Path]:
+        """
+        @cc 8
+        @desc find the files to lint, raising FileNotFoundError for missing paths
+        @arg paths: the files and directories to lint
+        @ret an iterator of each file to lint, once each
+        """
+        sources = [Path(x).absolute() for x in paths]
+        root = find_project_root(tuple(str(x) for x in sources))
+        seen = set()
+        for source in sources:
+            if source.is_dir():
+                found: Iterable[Path] = get_python_files(
+                    source, root, self.include, self.exclude
+                )
+            elif source.is_file():
+                found = [source]
+            else:
+                raise FileNotFoundError(f"invalid path: {source}")
+            for path in found:
+                if path not in seen:
+                    seen.add(path)
+                    yield path
+
+    def render(self, records: Iterable[Record]) -> List[str]:
+        """
+        @cc 2
+        @desc render issue records in the format of this linter
+        @arg records: the records to render
+        @ret a line for each record
+        """
+        return [x.render(self.template) for x in records]
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        """
+        @cc 1
+        @desc the object counters of everything linted so far
+        @ret a dict of counter names to their values
+        """
+        return self.state.counters()
+
+    def reset(self) -> None:
+        """
+        @cc 1
+        @desc zero the object counters of this linter
+        """
+        self.state.reset()
@@ -0,0 +1,459 @@
+"""
+@author jacobi petrucciani
+@desc archives-lsp, a language server that publishes archives issues as diagnostics
+"""
+import click
+import importlib
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, IO, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+from archives.globals import ast3, __version__
+from archives.models.python import Function, last_line, Module
+from archives.models.rules import Record
+from archives.utils.state import State
+
+
+# the archives cli module, as the package shadows it with the click command
+cli = importlib.import_module("archives.archives")
+
+# the lsp constants this server uses
+FULL_SYNC = 1
+WARNING = 2
+METHOD_NOT_FOUND = -32601
+# the line of a model, as issue texts show it
+MODEL_LINE = re.compile(r"\(line:(\d+)\)")
+
+
+def read_message(stream: IO[bytes]) -> Optional[Dict]:
+    """
+    @cc 6
+    @desc read a json-rpc message framed with a Content-Length header
+    @arg stream: the stream to read from
+    @ret the message, or None once the stream is closed
+    """
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.decode("ascii").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    if length is None:
+        return None
+    return json.loads(stream.read(length).decode("utf-8"))
+
+
+def write_message(stream: IO[bytes], message: Dict) -> None:
+    """
+    @cc 1
+    @desc write a json-rpc message framed with a Content-Length header
+    @arg stream: the stream to write to
+    @arg message: the message to write
+    """
+    body = json.dumps(message).encode("utf-8")
+    stream.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+    stream.flush()
+
+
+def uri_path(uri: str) -> str:
+    """
+    @cc 2
+    @desc get the path of a document, to report its issues under
+    @arg uri: the uri of the document
+    @ret the local path of a file uri, or the uri itself otherwise
+    """
+    parsed = urlparse(uri)
+    return unquote(parsed.path) if parsed.scheme == "file" else uri
+
+
+def changed_lines(old: List[str], new: List[str]) -> Tuple[int, int, int]:
+    """
+    @cc 5
+    @desc find the lines that differ between two versions of a document
+    @arg old: the lines of the previous version
+    @arg new: the lines of the current version
+    @ret a tuple of (first changed line, last changed line of old, lines added)
+    """
+    first = 0
+    shortest = min(len(old), len(new))
+    while first < shortest and old[first] == new[first]:
+        first += 1
+    last = 0
+    while last < shortest - first and old[-1 - last] == new[-1 - last]:
+        last += 1
+    return first + 1, len(old) - last, len(new) - len(old)
+
+
+def shift(record: Record, after: int, added: int) -> Record:
+    """
+    @cc 1
+    @desc move the lines of an issue that come after an edit, including in its text
+    @arg record: the issue to move
+    @arg after: the last line before the edit moved lines
+    @arg added: how many lines the edit added, or removed if negative
+    @ret the issue record with its lines moved
+    """
+
+    def move(line: int) -> int:
+        """
+        @cc 2
+        @desc move a line if it comes after the edit
+        @arg line: the line to move
+        @ret the line it is on now
+        """
+        return line + added if line > after else line
+
+    text = MODEL_LINE.sub(lambda x: f"(line:{move(int(x.group(1)))})", record.text)
+    return record._replace(
+        line=move(record.line), text=text, end_line=move(record.end_line)
+    )
+
+
+def outer_functions(tree: ast3.Module) -> List[ast3.FunctionDef]:
+    """
+    @cc 4
+    @desc find the functions of a module that are not nested in another function
+    @arg tree: the AST of the module
+    @ret the AST functions at the top level, or in classes at any depth
+    """
+    functions = []
+    nodes = list(tree.body)
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, ast3.FunctionDef):
+            functions.append(node)
+        elif isinstance(node, ast3.ClassDef):
+            nodes.extend(node.body)
+    return functions
+
+
+def parse_function(
+    lines: List[str], start: int, end: int
+) -> Optional[ast3.FunctionDef]:
+    """
+    @cc 8
+    @desc parse a function on its own, from the lines of a document it should span
+    @arg lines: the lines of the document
+    @arg start: the line the function starts on
+    @arg end: the line the function should end on
+    @ret the AST of the function numbered as in the document, or None if it is not
+    """
+    source = lines[start - 1 : end]
+    first = source[0]
+    indent = first[: len(first) - len(first.lstrip())]
+    offset = start - 1
+    if indent:
+        # a block keeps the function indented as it is, so its columns stay right
+        source = ["if 1:", *source]
+        offset -= 1
+    try:
+        tree = ast3.parse("\n".join(source) + "\n")
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+    body = tree.body[0].body if indent else tree.body  # type: ignore
+    if len(tree.body) != 1 or len(body) != 1:
+        return None
+    node = body[0]
+    if not isinstance(node, ast3.FunctionDef) or last_line(node) != len(source):
+        return None
+    ast3.increment_lineno(node, offset)
+    return node
+
+
+class Document:
+    """
+    @desc an open document, with the models and issues of its last lint
+    """
+
+    def __init__(self, uri: str, text: str) -> None:
+        """
+        @cc 1
+        @desc document constructor
+        @arg uri: the uri of the document
+        @arg text: the text of the document when it was opened
+        """
+        self.uri = uri
+        self.path = uri_path(uri)
+        self.lines = text.splitlines()
+        self.module: Optional[Module] = None
+        self.records: List[Record] = []
+        # the (first, last) lines of each function not nested in another function
+        self.spans: List[Tuple[int, int]] = []
+        # a change waiting out the debounce, and when to lint it
+        self.pending: Optional[str] = text
+        self.deadline = 0.0
+
+
+class Server:
+    """
+    @desc a language server that lints open documents as they change
+    """
+
+    def __init__(self, state: State, output: IO[bytes], debounce: float) -> None:
+        """
+        @cc 1
+        @desc server constructor
+        @arg state: the state with the rules to check
+        @arg output: the stream to write messages to
+        @arg debounce: how many seconds to wait for typing to stop before linting
+        """
+        self.state = state
+        self.output = output
+        self.debounce = debounce
+        self.documents: Dict[str, Document] = {}
+        self.shutdown = False
+        # how many lints re-checked a single function, rather than the whole document
+        self.partial_lints = 0
+
+    def handle(self, message: Dict) -> bool:
+        """
+        @cc 9
+        @desc handle a request or notification from the client
+        @arg message: the json-rpc message
+        @ret False once the client asks the server to exit
+        """
+        method = message.get("method")
+        params = message.get("params") or {}
+        result: Any = None
+        if method == "initialize":
+            sync = dict(openClose=True, change=FULL_SYNC, save=True)
+            result = dict(
+                capabilities=dict(textDocumentSync=sync),
+                serverInfo=dict(name="archives", version=__version__),
+            )
+        elif method == "shutdown":
+            self.shutdown = True
+        elif method == "exit":
+            return False
+        elif method and method.startswith("textDocument/"):
+            self.document_event(method, params)
+        elif "id" in message:
+            error = dict(code=METHOD_NOT_FOUND, message=f"unknown method {method}")
+            self.send(dict(id=message["id"], error=error))
+            return True
+        if "id" in message:
+            self.send(dict(id=message["id"], result=result))
+        return True
+
+    def document_event(self, method: str, params: Dict) -> None:
+        """
+        @cc 7
+        @desc track the opening, changing, saving, and closing of documents
+        @arg method: the name of the notification
+        @arg params: the parameters of the notification
+        """
+        uri = params["textDocument"]["uri"]
+        if method == "textDocument/didOpen":
+            self.documents[uri] = Document(uri, params["textDocument"]["text"])
+            self.flush(uri)
+        elif method == "textDocument/didChange" and uri in self.documents:
+            document = self.documents[uri]
+            document.pending = params["contentChanges"][-1]["text"]
+            document.deadline = time.monotonic() + self.debounce
+        elif method == "textDocument/didSave" and uri in self.documents:
+            self.flush(uri)
+        elif method == "textDocument/didClose":
+            self.documents.pop(uri, None)
+            self.publish(uri, [])
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        @cc 4
+        @desc find when the next debounced change is due to be linted
+        @ret the earliest deadline of the pending changes, or None if there are none
+        """
+        documents = self.documents.values()
+        deadlines = [x.deadline for x in documents if x.pending is not None]
+        return min(deadlines) if deadlines else None
+
+    def flush(self, uri: str = None) -> None:
+        """
+        @cc 5
+        @desc lint the pending changes whose debounce is over
+        @arg uri: a document to lint now, whether or not its debounce is over
+        """
+        now = time.monotonic()
+        for document in list(self.documents.values()):
+            due = document.uri == uri or document.deadline <= now
+            if document.pending is not None and due:
+                self.update(document, document.pending)
+
+    def update(self, document: Document, text: str) -> None:
+        """
+        @cc 6
+        @desc lint a new version of a document, and publish its diagnostics
+        @arg document: the document that changed
+        @arg text: the new text of the document
+        """
+        document.pending = None
+        lines = text.splitlines()
+        if not self.update_function(document, lines):
+            try:
+                tree = ast3.parse(text)
+            except (SyntaxError, ValueError, RecursionError) as error:
+                line = getattr(error, "lineno", None) or 1
+                message = f"error in parsing: {error}"
+                record = Record(document.path, line, 0, "E999", message, line)
+                self.publish(document.uri, [record], lines)
+                return
+            document.module = Module(tree, document.path)
+            issues = cli.lint(document.module, self.state)
+            document.records = sorted(x.record() for x in issues)
+            document.spans = [(x.lineno, last_line(x)) for x in outer_functions(tree)]
+        document.lines = lines
+        self.publish(document.uri, document.records, lines)
+
+    def update_function(self, document: Document, lines: List[str]) -> bool:
+        """
+        @cc 15
+        @desc re-lint only the function a change was made in, if it stayed inside one
+        @arg document: the document that changed
+        @arg lines: the lines of the new version of the document
+        @ret False if the whole document needs to be parsed and linted instead
+        """
+        if document.module is None:
+            return False
+        if lines == document.lines:
+            return True
+        first, last, added = changed_lines(document.lines, lines)
+        span = next((x for x in document.spans if x[0] < first and last <= x[1]), None)
+        if span is None:
+            return False
+        start, end = span
+        node = parse_function(lines, start, end + added)
+        if node is None:
+            # the change moved code in or out of the function, or broke its syntax
+            return False
+
+        # the function is measured on its own, rather than with the whole module
+        alone = Module(ast3.Module(body=[node], type_ignores=[]), document.path)
+        issues = cli.walk([Function(node, alone)], [], self.state)
+        before, after = [], []
+        for record in document.records:
+            if record.line < start:
+                before.append(shift(record, end - 1, added))
+            elif record.line > end:
+                after.append(shift(record, end, added))
+        document.records = [*before, *sorted(x.record() for x in issues), *after]
+        document.spans = [
+            (x + added if x > end else x, y + added if y >= end else y)
+            for x, y in document.spans
+        ]
+        self.partial_lints += 1
+        return True
+
+    def publish(self, uri: str, records: List[Record], lines: List[str] = None) -> None:
+        """
+        @cc 4
+        @desc send the issues of a document to the client as diagnostics
+        @arg uri: the uri of the document
+        @arg records: the issues of the document
+        @arg lines: the lines of the document, to highlight the line of each issue
+        """
+        lines = lines or []
+        diagnostics = []
+        for record in records:
+            line = max(record.line - 1, 0)
+            width = len(lines[line]) if line < len(lines) else 0
+            diagnostics.append(
+                dict(
+                    range=dict(
+                        start=dict(line=line, character=record.column),
+                        end=dict(line=line, character=max(width, record.column)),
+                    ),
+                    severity=WARNING,
+                    code=record.code,
+                    source="archives",
+                    message=record.text,
+                )
+            )
+        params = dict(uri=uri, diagnostics=diagnostics)
+        self.send(dict(method="textDocument/publishDiagnostics", params=params))
+
+    def send(self, message: Dict) -> None:
+        """
+        @cc 1
+        @desc send a message to the client
+        @arg message: the json-rpc message, without its version
+        """
+        write_message(self.output, dict(jsonrpc="2.0", **message))
+
+    def serve(self, stream: IO[bytes]) -> int:
+        """
+        @cc 9
+        @desc handle messages until the client exits, linting changes once they settle
+        @arg stream: the stream to read messages from
+        @ret the exit code, which is 0 only if the client asked to shut down first
+        """
+        messages: queue.Queue = queue.Queue()
+
+        def read() -> None:
+            """
+            @cc 3
+            @desc read messages in the background, so debounces can time out
+            """
+            while True:
+                message = read_message(stream)
+                messages.put(message)
+                if message is None:
+                    return
+
+        threading.Thread(target=read, daemon=True).start()
+        while True:
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else deadline - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                self.flush()
+                continue
+            try:
+                message = messages.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if message is None or not self.handle(message):
+                return 0 if self.shutdown else 1
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--disable",
+    type=str,
+    default="",
+    help="disable rules, separated by commas",
+)
+@click.option(
+    "--debounce",
+    type=click.FloatRange(min=0),
+    default=0.3,
+    show_default=True,
+    help="seconds to wait for typing to stop before linting a change",
+)
+@click.version_option(version=__version__)
+@click.pass_context
+def archives_lsp(ctx: click.Context, disable: str, debounce: float) -> None:
+    """
+    run archives as a language server over stdio, for editors
+    \f
+    @cc 1
+    @desc the main cli method for archives-lsp
+    @arg ctx: the click context arg
+    @arg disable: the codes of the rules to disable, separated by commas
+    @arg debounce: how many seconds to wait for typing to stop before linting
+    """
+    state = State()
+    state.disable_list = disable.split(",")
+    cli.apply_rules(state)
+    server = Server(state, sys.stdout.buffer, debounce)
+    ctx.exit(server.serve(sys.stdin.buffer))
+
+
+if __name__ == "__main__":
+    archives_lsp()  # noqa
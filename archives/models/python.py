@@ -3,12 +3,16 @@
 @desc python related AST classes
 """
 from enum import Enum
-from radon.complexity import cc_visit_ast
-from radon.metrics import h_visit_ast
-from typing import Dict, Set, Union
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 from archives.globals import ast3, DEFAULT_ARG_IGNORE, IS_38
+from archives.utils.profile import PROFILER
 from archives.utils.text import debug
-from archives.models.tags import Tags
+from archives.models.tags import Tag, Tags
+
+
+# timers for the phases of building models, only recording while profiling
+DOCS_TIMER = PROFILER.phase("docs")
+COMPLEXITY_TIMER = PROFILER.phase("complexity")
 
 
 def parse_elt(elt: Union[ast3.Name, ast3.Subscript]) -> str:
@@ -38,18 +42,65 @@ def parse_elt(elt: Union[ast3.Name, ast3.Subscript]) -> str:
     return ""
 
 
+def last_line(node: ast3.AST) -> int:
+    """
+    @cc 3
+    @desc find the last line of an AST node, for ASTs that do not track end lines
+    @arg node: the AST node to find the end of
+    @ret the line number of the last line of the given node
+    """
+    end = getattr(node, "end_lineno", None)
+    if end:
+        return end
+    return max(getattr(x, "lineno", 0) for x in ast3.walk(node))
+
+
+def docstring(body: List[ast3.stmt]) -> Optional[ast3.Expr]:
+    """
+    @cc 4
+    @desc find the docstring of a body, a string on its own as the first statement
+    @arg body: the AST statements of a body
+    @ret the docstring statement, or None if the body has none
+    """
+    node = body[0] if body else None
+    if isinstance(node, ast3.Expr) and isinstance(getattr(node.value, "s", None), str):
+        return node
+    return None
+
+
+def nested_classes(
+    function: Union[ast3.FunctionDef, ast3.AsyncFunctionDef],
+) -> List[ast3.ClassDef]:
+    """
+    @cc 4
+    @desc find the classes defined in a function, or in the functions nested in it
+    @arg function: the AST function to search
+    @ret a list of the AST classes defined within the function
+    """
+    classes = []
+    nodes = list(function.body)
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, ast3.ClassDef):
+            classes.append(node)
+        elif isinstance(node, (ast3.FunctionDef, ast3.AsyncFunctionDef)):
+            nodes.extend(node.body)
+    return classes
+
+
 class Annotation:
     """
     @desc representation of a type annotation in python code
     """
 
+    __slots__ = ("type",)
+
     def __init__(self, anno: Union[ast3.Name, ast3.Subscript]) -> None:
         """
         @cc 1
         @desc annotation constructor
         @arg anno: an AST annotation object to parse into a type
         """
-        self._annotation = anno
         self.type = parse_elt(anno)
 
     def __str__(self) -> str:
@@ -83,38 +134,61 @@ class Doc:
         CLASS = 1
         MODULE = 2
 
+    __slots__ = (
+        "value",
+        "tags",
+        "no_lint",
+        "no_doc",
+        "todo",
+        "desc",
+        "args",
+        "links",
+        "ret",
+        "author",
+        "cc",
+        "notes",
+        "warnings",
+    )
+
     def __init__(self, doc_string: ast3.Expr, doc_type: Type) -> None:
         """
-        @cc 8
+        @cc 3
         @desc easier to use version of the ast docstring def
         @arg doc_string: the expression used to represent a docstring
         @arg doc_type: the enum type of doc string this is used for
         """
-        self._doc = doc_string
         self.value = doc_string.value.s.strip()  # type: ignore
-        desc = Tags.DESC.regex.search(self.value)
-        ret = Tags.RETURN.regex.search(self.value)
-        cc = Tags.CC.regex.search(self.value)  # pylint: disable=invalid-name
-        author = Tags.AUTHOR.regex.search(self.value)
-        todo = Tags.TODO.regex.search(self.value)
+        with DOCS_TIMER:
+            self.tags = Tags.scan(self.value)
 
-        self.no_lint = bool(Tags.NO_LINT.regex.search(self.value))
-        self.no_doc = bool(Tags.NO_DOC.regex.search(self.value))
-        self.todo = todo[1] if todo else ""
+        self.no_lint = Tags.NO_LINT.name in self.tags
+        self.no_doc = Tags.NO_DOC.name in self.tags
+        self.todo = self.first(Tags.TODO, "")
 
-        self.desc = desc[1] if desc else ""
+        self.desc = self.first(Tags.DESC, "")
         self.args = {
             x: y
-            for x, y in Tags.ARG.regex.findall(self.value)
+            for x, y in self.tags.get(Tags.ARG.name, [])
             if x not in DEFAULT_ARG_IGNORE
         }
-        self.links = Tags.LINK.regex.findall(self.value)
-        self.ret = ret[1] if ret else ""
-        self.author = author[1] if author else ""
-        self.cc = int(cc[1] if cc else -1)  # pylint: disable=invalid-name
+        self.links = self.tags.get(Tags.LINK.name, [])
+        self.ret = self.first(Tags.RETURN, "")
+        self.author = self.first(Tags.AUTHOR, "")
+        self.cc = int(self.first(Tags.CC, -1))  # pylint: disable=invalid-name
 
-        self.notes = Tags.NOTE.regex.findall(self.value)
-        self.warnings = Tags.WARN.regex.findall(self.value)
+        self.notes = self.tags.get(Tags.NOTE.name, [])
+        self.warnings = self.tags.get(Tags.WARN.name, [])
+
+    def first(self, tag: Tag, default: Any) -> Any:
+        """
+        @cc 2
+        @desc get the value of the first occurrence of a tag in this docstring
+        @arg tag: the tag to look up
+        @arg default: the value to return if the tag is not present
+        @ret the value of the first occurrence of the tag, or the default
+        """
+        values = self.tags.get(tag.name)
+        return values[0] if values else default
 
     def __repr__(self) -> str:
         """
@@ -140,6 +214,7 @@ class Doc:
             notes=self.notes,
             warnings=self.warnings,
             no_lint=self.no_lint,
+            no_doc=self.no_doc,
         )
 
 
@@ -148,6 +223,8 @@ class Arg:
     @desc representation of an arg
     """
 
+    __slots__ = ("typed", "line", "column", "name", "type", "type_line", "type_column")
+
     def __init__(self, arg: ast3.arg) -> None:
         """
         @cc 2
@@ -196,34 +273,45 @@ class Function:
     @desc representation of a function
     """
 
+    __slots__ = (
+        "_node",
+        "name",
+        "line",
+        "end_line",
+        "column",
+        "module",
+        "args",
+        "untyped",
+        "doc",
+        "returns",
+        "return_typed",
+        "missing_args",
+        "unexpected_args",
+        "_functions",
+        "_classes",
+        "_measured",
+    )
+
     def __init__(self, function: ast3.FunctionDef, module: "Module") -> None:
         """
-        @cc 14
+        @cc 10
         @desc easier to use version of the ast function def
         @arg function: the AST functionDef to parse
         @arg module: the module this function resides in
         """
 
-        # easy data
-        self._function = function
+        # easy data, the AST is only kept until the lazy fields are extracted
+        self._node: Optional[ast3.FunctionDef] = function
         self.name = function.name
         self.line = function.lineno
+        self.end_line = last_line(function)
         self.column = function.col_offset
-        self.body = function.body
         self.module = module
-        self.decorators = function.decorator_list
 
         # time to parse arguments
-        self._args = function.args.args
-        self.args = [Arg(x) for x in self._args]
-        self.functions = [
-            Function(x, self.module)
-            for x in self.body
-            if isinstance(x, ast3.FunctionDef)
-        ]
-        self.classes = [
-            Class(x, self.module) for x in self.body if isinstance(x, ast3.ClassDef)
-        ]
+        self.args = [Arg(x) for x in function.args.args]
+        self._functions: Optional[List[Function]] = None
+        self._classes: Optional[List[Class]] = None
         self.untyped = [
             x for x in self.args if not x.typed and x not in DEFAULT_ARG_IGNORE
         ]
@@ -234,9 +322,9 @@ class Function:
         self.unexpected_args: Set[str] = set()
         arg_names = set(x.name for x in self.args if x.name not in DEFAULT_ARG_IGNORE)
         self.missing_args = arg_names
-        if isinstance(self.body[0], ast3.Expr):
-            # this is most likely a doc string
-            self.doc = Doc(self.body[0], Doc.Type.FUNCTION)
+        node = docstring(function.body)
+        if node is not None:
+            self.doc = Doc(node, Doc.Type.FUNCTION)
             doc_arg_names = set(x for x, y in self.doc.args.items())
             self.missing_args = arg_names - doc_arg_names
             self.unexpected_args = doc_arg_names - arg_names
@@ -244,11 +332,77 @@ class Function:
             self.return_typed = True
             self.returns = parse_elt(function.returns)  # type: ignore
 
-        # complexity checks
-        self._radon = cc_visit_ast(self._function)[0]
-        self.complexity = self._radon.complexity
-        self.is_method = self._radon.is_method
-        self._halstead = h_visit_ast(self._function)
+        # complexity checks are expensive, so they are only run when needed
+        self._measured: Optional[Tuple[int, bool]] = None
+
+    def release(self) -> None:
+        """
+        @cc 3
+        @desc drop the AST of this function once everything has been extracted from it
+        """
+        if self._functions is not None and self._classes is not None:
+            self._node = None
+
+    @property
+    def functions(self) -> List["Function"]:
+        """
+        @cc 4
+        @desc the functions nested in this function, built on first access
+        @ret a list of nested Function objects
+        """
+        if self._functions is None:
+            self._functions = [
+                Function(x, self.module)
+                for x in self._node.body  # type: ignore
+                if isinstance(x, ast3.FunctionDef)
+            ]
+            self.release()
+        return self._functions
+
+    @property
+    def classes(self) -> List["Class"]:
+        """
+        @cc 4
+        @desc the classes nested in this function, built on first access
+        @ret a list of nested Class objects
+        """
+        if self._classes is None:
+            self._classes = [
+                Class(x, self.module)
+                for x in self._node.body  # type: ignore
+                if isinstance(x, ast3.ClassDef)
+            ]
+            self.release()
+        return self._classes
+
+    @property
+    def measured(self) -> Tuple[int, bool]:
+        """
+        @cc 2
+        @desc the radon measurements of this function, computed on first access
+        @ret a tuple of (complexity, is_method) for this function
+        """
+        if self._measured is None:
+            self._measured = self.module.complexities[(self.line, self.column)]
+        return self._measured
+
+    @property
+    def complexity(self) -> int:
+        """
+        @cc 1
+        @desc the cyclomatic complexity of this function
+        @ret the cyclomatic complexity as calculated by radon
+        """
+        return self.measured[0]
+
+    @property
+    def is_method(self) -> bool:
+        """
+        @cc 1
+        @desc whether radon considers this function a method
+        @ret true if this function is a method
+        """
+        return self.measured[1]
 
     def __repr__(self) -> str:
         """
@@ -260,7 +414,7 @@ class Function:
 
     def serialize(self) -> Dict:
         """
-        @cc 6
+        @cc 7
         @desc serialize method for saving to json
         @ret a dict of this arg's properties
         """
@@ -272,7 +426,7 @@ class Function:
             args=[x.serialize() for x in self.args],
             functions=[x.serialize() for x in self.functions],
             classes=[x.serialize() for x in self.classes],
-            complexity=self.complexity,
+            complexity=None if self.module.skeleton else self.complexity,
             returns=self.returns,
             doc=self.doc.serialize() if self.doc else None,
         )
@@ -283,31 +437,77 @@ class Class:
     @desc representation of a python class
     """
 
+    __slots__ = (
+        "_node",
+        "line",
+        "end_line",
+        "column",
+        "name",
+        "module",
+        "doc",
+        "_functions",
+        "_classes",
+    )
+
     def __init__(self, cls: ast3.ClassDef, module: "Module") -> None:
         """
-        @cc 6
+        @cc 2
         @desc easier to use version of a class
         @arg cls: the AST ClassDef to parse
         @arg module: the module this class resides in
         """
-        self.body = cls.body
+        self._node: Optional[ast3.ClassDef] = cls
         self.line = cls.lineno
+        self.end_line = last_line(cls)
         self.column = cls.col_offset
         self.name = cls.name
         self.module = module
-        self.decorators = cls.decorator_list
         self.doc = None
-        self.functions = [
-            Function(x, self.module)
-            for x in self.body
-            if isinstance(x, ast3.FunctionDef)
-        ]
-        self.classes = [
-            Class(x, self.module) for x in self.body if isinstance(x, ast3.ClassDef)
-        ]
-        if isinstance(self.body[0], ast3.Expr):
-            # this is most likely a doc string
-            self.doc = Doc(self.body[0], Doc.Type.CLASS)
+        self._functions: Optional[List[Function]] = None
+        self._classes: Optional[List[Class]] = None
+        node = docstring(cls.body)
+        if node is not None:
+            self.doc = Doc(node, Doc.Type.CLASS)
+
+    def release(self) -> None:
+        """
+        @cc 3
+        @desc drop the AST of this class once everything has been extracted from it
+        """
+        if self._functions is not None and self._classes is not None:
+            self._node = None
+
+    @property
+    def functions(self) -> List[Function]:
+        """
+        @cc 4
+        @desc the methods of this class, built on first access
+        @ret a list of Function objects in this class
+        """
+        if self._functions is None:
+            self._functions = [
+                Function(x, self.module)
+                for x in self._node.body  # type: ignore
+                if isinstance(x, ast3.FunctionDef)
+            ]
+            self.release()
+        return self._functions
+
+    @property
+    def classes(self) -> List["Class"]:
+        """
+        @cc 4
+        @desc the classes nested in this class, built on first access
+        @ret a list of nested Class objects
+        """
+        if self._classes is None:
+            self._classes = [
+                Class(x, self.module)
+                for x in self._node.body  # type: ignore
+                if isinstance(x, ast3.ClassDef)
+            ]
+            self.release()
+        return self._classes
 
     def __repr__(self) -> str:
         """
@@ -339,26 +539,119 @@ class Module:
     @desc representation of a python module
     """
 
+    __slots__ = (
+        "_body",
+        "doc",
+        "path",
+        "name",
+        "end_line",
+        "skeleton",
+        "_functions",
+        "_classes",
+        "_complexities",
+    )
+
     def __init__(self, module: ast3.Module, filename: str) -> None:
         """
-        @cc 6
+        @cc 3
         @desc easier to use version of a module
         @arg module: the AST module to parse
         @arg filename: the filename of the module we're parsing
         """
         self.doc = None
-        self.body = module.body
+        self._body: Optional[List[ast3.stmt]] = module.body
         self.path = filename
         self.name = self.path.split("/")[-1]
-        self.functions = [
-            Function(x, self) for x in self.body if isinstance(x, ast3.FunctionDef)
-        ]
-        self.classes = [
-            Class(x, self) for x in self.body if isinstance(x, ast3.ClassDef)
-        ]
-        if isinstance(self.body[0], ast3.Expr):
-            # this is most likely a doc string
-            self.doc = Doc(self.body[0], Doc.Type.MODULE)
+        self.end_line = last_line(module.body[-1]) if module.body else 0
+        # set for modules parsed without the bodies of their functions
+        self.skeleton = False
+        self._functions: Optional[List[Function]] = None
+        self._classes: Optional[List[Class]] = None
+        self._complexities: Optional[Dict[Tuple[int, int], Tuple[int, bool]]] = None
+        node = docstring(module.body)
+        if node is not None:
+            self.doc = Doc(node, Doc.Type.MODULE)
+
+    def release(self) -> None:
+        """
+        @cc 6
+        @desc drop the AST of this module once everything has been extracted from it
+        """
+        if self._functions is None or self._classes is None:
+            return
+        if self._complexities is not None or not (self._functions or self._classes):
+            self._body = None
+
+    @property
+    def complexities(self) -> Dict[Tuple[int, int], Tuple[int, bool]]:
+        """
+        @cc 9
+        @desc the complexity of every function, computed in one pass over the module
+        @ret a dict of (line, column) to the (complexity, is_method) of the function there
+        """
+        if self._complexities is None and self.skeleton:
+            # a skeleton has no bodies to measure
+            self._complexities = {}
+        if self._complexities is None:
+            # radon is only imported once something needs its complexity
+            from radon.visitors import ComplexityVisitor
+
+            with COMPLEXITY_TIMER:
+                # radon visits each top level function once, reporting nested
+                # functions as closures, so nothing is traversed more than once
+                self._complexities = {}
+                # the body is only released early when it has nothing to measure
+                nodes = list(self._body or [])
+                blocks = []
+                while nodes:
+                    node = nodes.pop()
+                    if isinstance(node, ast3.ClassDef):
+                        nodes.extend(node.body)
+                    elif isinstance(node, (ast3.FunctionDef, ast3.AsyncFunctionDef)):
+                        blocks.extend(ComplexityVisitor.from_ast(node).functions)
+                        # radon doesn't report on the methods of classes in functions
+                        nodes.extend(nested_classes(node))
+                while blocks:
+                    block = blocks.pop()
+                    self._complexities[(block.lineno, block.col_offset)] = (
+                        block.complexity,
+                        block.is_method,
+                    )
+                    blocks.extend(block.closures)
+            self.release()
+        return self._complexities
+
+    @property
+    def functions(self) -> List[Function]:
+        """
+        @cc 4
+        @desc the top level functions of this module, built on first access
+        @ret a list of Function objects in this module
+        """
+        if self._functions is None:
+            self._functions = [
+                Function(x, self)
+                for x in self._body  # type: ignore
+                if isinstance(x, ast3.FunctionDef)
+            ]
+            self.release()
+        return self._functions
+
+    @property
+    def classes(self) -> List[Class]:
+        """
+        @cc 4
+        @desc the top level classes of this module, built on first access
+        @ret a list of Class objects in this module
+        """
+        if self._classes is None:
+            self._classes = [
+                Class(x, self)
+                for x in self._body  # type: ignore
+                if isinstance(x, ast3.ClassDef)
+            ]
+            self.release()
+        return self._classes
 
     def __repr__(self) -> str:
         """
@@ -2,8 +2,21 @@
 @author jacobi petrucciani
 @desc rules and issues models
 """
-from typing import Callable, Dict, Union
-from archives.models.python import Class, Function, Module
+from collections import defaultdict
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    NamedTuple,
+    Tuple,
+    Union,
+    TYPE_CHECKING,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from archives.models.python import Class, Function, Module
 
 
 class Rule:
@@ -11,17 +24,108 @@ class Rule:
     @desc a rule for an issue with the archives
     """
 
-    def __init__(self, code: str, desc: str, check: Callable) -> None:
+    __slots__ = ("code", "check", "desc", "measures")
+
+    def __init__(
+        self, code: str, desc: str, check: Callable, measures: bool = False
+    ) -> None:
         """
         @cc 1
         @desc issue constructor
         @arg code: the error code for the rule
         @arg desc: the description string
         @arg check: a function to check if this rule is broken
+        @arg measures: a flag for rules that need the complexity of function bodies
         """
         self.code = code
         self.check = check
         self.desc = desc
+        self.measures = measures
+
+
+class RuleSet:
+    """
+    @desc the rules active for a run, compiled once into a table per kind of object
+    """
+
+    __slots__ = ("disabled", "module", "klass", "function", "args", "measures")
+
+    def __init__(
+        self,
+        module: Iterable[Rule],
+        klass: Iterable[Rule],
+        function: Iterable[Rule],
+        args: Iterable[Rule],
+        disabled: Iterable[str],
+    ) -> None:
+        """
+        @cc 3
+        @desc rule set constructor, dropping the disabled rules up front
+        @arg module: the rules to check each module with
+        @arg klass: the rules to check each class with
+        @arg function: the rules to check each function with
+        @arg args: the rules whose checks return each offending arg of a function
+        @arg disabled: the codes of the rules to skip
+        """
+        self.disabled: FrozenSet[str] = frozenset(disabled)
+        self.module = self.compile(module)
+        self.klass = self.compile(klass)
+        self.function = self.compile(function)
+        self.args = self.compile(args)
+        tables = [self.module, self.klass, self.function, self.args]
+        # without complexity, only the headers and docstrings of a module are needed
+        self.measures = any(rule.measures for table in tables for rule, _ in table)
+
+    def compile(self, rules: Iterable[Rule]) -> Tuple[Tuple[Rule, Callable], ...]:
+        """
+        @cc 3
+        @desc build the dispatch table of the given rules that are not disabled
+        @arg rules: the rules to check one kind of object with
+        @ret a tuple of (rule, check function) for each enabled rule
+        """
+        return tuple((x, x.check) for x in rules if x.code not in self.disabled)
+
+    def codes(self) -> List[str]:
+        """
+        @cc 3
+        @desc list the codes of every enabled rule
+        @ret the codes of the rules in this set
+        """
+        tables = [self.module, self.klass, self.function, self.args]
+        return [rule.code for table in tables for rule, _ in table]
+
+
+class Record(NamedTuple):
+    """
+    @desc a plain, picklable record of an issue, detached from the parsed models
+    """
+
+    path: str
+    line: int
+    column: int
+    code: str
+    text: str
+    end_line: int
+
+    def render(self, template: str) -> str:
+        """
+        @cc 1
+        @desc format this record with one of the output format templates
+        @arg template: a format string, such as one of the FORMATS values
+        @ret the formatted issue message
+        """
+        return template.format_map(defaultdict(str, **self._asdict()))
+
+    def touches(self, hunks: List[Tuple[int, int]]) -> bool:
+        """
+        @cc 3
+        @desc check if the object this issue was found on overlaps any changed lines
+        @arg hunks: a list of (first, last) line ranges that were changed
+        @ret true if any of the given hunks overlaps this issue's object
+        """
+        return any(
+            first <= self.end_line and self.line <= last for first, last in hunks
+        )
 
 
 class Issue:
@@ -29,8 +133,10 @@ class Issue:
     @desc an instance of a Rule being flagged
     """
 
+    __slots__ = ("rule", "obj", "line", "column", "extra")
+
     def __init__(
-        self, rule: Rule, obj: Union[Class, Function, Module], extra: Dict = None
+        self, rule: Rule, obj: Union["Class", "Function", "Module"], extra: Dict = None
     ) -> None:
         """
         @cc 4
@@ -39,12 +145,41 @@ class Issue:
         @arg obj: either a class, function, or module that breaks the rule
         @arg extra: extra data to pass to the issue description template
         """
+        # the models are only imported once something has been parsed
+        from archives.models.python import Module
+
         self.rule = rule
         self.obj = obj
         self.line = 0 if isinstance(obj, Module) else obj.line
         self.column = 0 if isinstance(obj, Module) else obj.column
         self.extra = extra or {}
 
+    def record(self) -> Record:
+        """
+        @cc 5
+        @desc flatten this issue into a plain record of its location and message
+        @ret a Record for this issue
+        """
+        from archives.models.python import Function, Module
+
+        obj = self.obj
+        module = obj if isinstance(obj, Module) else obj.module
+        extra_info: Dict[str, Union[str, int]] = dict(name=obj.name)
+
+        # function specific info, only computing complexity if the rule shows it
+        if isinstance(obj, Function):
+            if "{cc}" in self.rule.desc:
+                extra_info["cc"] = obj.complexity
+            if obj.doc:
+                extra_info["doc_cc"] = obj.doc.cc
+
+        text = self.rule.desc.format_map(
+            defaultdict(str, **extra_info, **self.extra)
+        )
+        return Record(
+            module.path, self.line, self.column, self.rule.code, text, obj.end_line
+        )
+
     def __str__(self) -> str:
         """
         @cc 1
@@ -0,0 +1,293 @@
+"""
+@author jacobi petrucciani
+@desc a fast parse of only the classes, functions, and docstrings of a module
+"""
+import re
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional, Pattern, Tuple
+from archives.globals import ast3
+from archives.models.python import Module
+
+
+# strings are matched whole, so that quotes and hashes inside of them are skipped
+STRING = (
+    r'"""[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""'
+    r"|'''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''"
+    r'|"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+    r"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'"
+)
+TOKENS = re.compile(rf"{STRING}|#[^\n]*", re.S)
+DEFINITION = re.compile(r"\n( *)(?:async[ \t]+)?(?:def|class)[ \t]")
+HEADER = re.compile(r"[()\[\]{}:]")
+# strings, implicitly joined and maybe in brackets, with anything after a semicolon
+DOCSTRING = re.compile(
+    r"(?:\([\s\x00\\]*)*(?:[A-Za-z]{0,2}S[\s\x00\\]*)+(?:\)[\s\x00\\]*)*(?:;.*)?", re.S
+)
+NESTED = re.compile(r"@|(?:async[ \t]+)?(?:def|class)[ \t]")
+# a line with code at or left of some indent, where a definition there has ended
+DEDENTS: Dict[int, Pattern] = {}
+INDENTS = re.compile(r"\n[ \t\f]+")
+OPENERS = {"(": 1, "[": 1, "{": 1, ")": -1, "]": -1, "}": -1}
+
+
+def blank(match: "re.Match") -> str:
+    """
+    @cc 2
+    @desc blank out a string or comment, keeping the lines that a string spans
+    @arg match: the matched string or comment
+    @ret an S for a string, with a null at the start of each line it continues on
+    """
+    text = match.group()
+    if text[0] == "#":
+        return ""
+    return "S" + "\n\x00" * text.count("\n")
+
+
+def expand(match: "re.Match") -> str:
+    """
+    @cc 1
+    @desc expand the tabs that a line is indented with, as python does
+    @arg match: the newline and indent of the line
+    @ret the newline and indent, with tabs expanded to spaces
+    """
+    # a form feed resets the indent before it, as it does for the tokenizer
+    text = match.group()[1:]
+    return "\n" + text[text.rfind("\f") + 1 :].expandtabs(8)
+
+
+def depth(text: str) -> int:
+    """
+    @cc 1
+    @desc count the brackets left open in some blanked code
+    @arg text: the blanked code to count the brackets of
+    @ret the number of brackets opened and not closed
+    """
+    opened = text.count("(") + text.count("[") + text.count("{")
+    return opened - text.count(")") - text.count("]") - text.count("}")
+
+
+def indent(line: str) -> int:
+    """
+    @cc 1
+    @desc measure the indent of a line
+    @arg line: the line to measure
+    @ret the number of spaces the line starts with
+    """
+    return len(line) - len(line.lstrip(" "))
+
+
+def string_end(lines: List[str], start: int) -> Optional[int]:
+    """
+    @cc 6
+    @desc find the last line of a statement that is only a string, such as a docstring
+    @arg lines: the blanked lines of the module
+    @arg start: the line the statement starts on
+    @ret the last line of the statement, or None if it is not only a string
+    """
+    end = start
+    level = depth(lines[start])
+    # a statement goes on while brackets are open, or onto continued lines
+    while end + 1 < len(lines) and (level or lines[end + 1][:1] == "\x00"):
+        end += 1
+        if lines[end] != "\x00":
+            level += depth(lines[end])
+    text = "\n".join(lines[start : end + 1]).strip()
+    return end if DOCSTRING.fullmatch(text) else None
+
+
+class Scanner:
+    """
+    @desc find the extent of each definition in a module, without parsing it
+    """
+
+    __slots__ = ("text", "lines", "starts", "original", "skeleton", "ends")
+
+    def __init__(self, contents: str) -> None:
+        """
+        @cc 4
+        @desc blank the strings and comments of a module, to scan its code
+        @arg contents: the source code of the module
+        """
+        # a leading newline lets every line, including the first, be found by "\n"
+        source = "\n" + contents.replace("\r\n", "\n").replace("\r", "\n")
+        self.text = TOKENS.sub(blank, source)
+        # lines continued by a backslash are marked like those a string continues onto
+        self.text = self.text.replace("\\\n", "\\\n\x00")
+        if "\t" in self.text or "\f" in self.text:
+            self.text = INDENTS.sub(expand, self.text)
+        self.lines = self.text.split("\n")
+        self.starts = [0, *accumulate(len(x) + 1 for x in self.lines)]
+        self.original = source.split("\n")
+        self.skeleton = [""] * len(self.lines)
+        self.ends: Dict[int, int] = {}
+
+    def line_of(self, offset: int) -> int:
+        """
+        @cc 1
+        @desc find the line of an offset into the blanked module
+        @arg offset: the offset into the blanked module
+        @ret the line number that the offset is on
+        """
+        return bisect_right(self.starts, offset) - 1
+
+    def last_code(self, before: int) -> int:
+        """
+        @cc 3
+        @desc find the last line with code on it, before some line
+        @arg before: the line to search back from
+        @ret the last line with code before it, or 0 if there is none
+        """
+        line = before - 1
+        while line > 0 and not self.lines[line].strip():
+            line -= 1
+        return line
+
+    def copy(self, start: int, end: int) -> None:
+        """
+        @cc 1
+        @desc copy some lines of the module into the skeleton, as they are
+        @arg start: the first line to copy
+        @arg end: the last line to copy
+        """
+        self.skeleton[start : end + 1] = self.original[start : end + 1]
+
+    def colon(self, offset: int) -> Optional[int]:
+        """
+        @cc 4
+        @desc find the colon that ends the header of a definition
+        @arg offset: the offset of the definition
+        @ret the offset of the colon, or None if there is none
+        """
+        level = 0
+        for match in HEADER.finditer(self.text, offset):
+            char = match.group()
+            if char == ":" and not level:
+                return match.start()
+            level += OPENERS.get(char, 0)
+        return None
+
+    def end_of(self, column: int, body: int) -> int:
+        """
+        @cc 5
+        @desc find the last line of a definition, from the next line dedented past it
+        @arg column: the column of the definition
+        @arg body: the offset that the body of the definition starts at
+        @ret the last line of the definition
+        """
+        dedent = DEDENTS.get(column)
+        if dedent is None:
+            dedent = DEDENTS[column] = re.compile(rf"\n {{0,{column}}}[^ \n\x00]")
+        offset = body
+        while True:
+            match = dedent.search(self.text, offset)
+            if not match:
+                return self.last_code(len(self.lines))
+            # lines inside of brackets can be dedented without ending anything
+            if not depth(self.text[body : match.start()]):
+                return self.last_code(self.line_of(match.start() + 1))
+            offset = match.end()
+
+    def definition(self, line: int, column: int, emit: bool) -> Optional[int]:
+        """
+        @cc 9
+        @desc find the extent of a definition, adding it to the skeleton if asked to
+        @arg line: the line the definition starts on
+        @arg column: the column the definition starts at
+        @arg emit: a flag to add the definition to the skeleton
+        @ret the indent of the body of the definition, or None for a one line body
+        """
+        colon = self.colon(self.starts[line] + column)
+        if colon is None:
+            raise SyntaxError("definition without a colon")
+        header = self.line_of(colon)
+        end = self.end_of(column, colon + 1)
+        self.ends[line] = end
+        if self.text[colon + 1 : self.starts[header + 1] - 1].strip():
+            # a body on the same line as the header can not hold definitions
+            if emit:
+                self.copy(line, end)
+            return None
+        first = header + 1
+        while first <= end and not self.lines[first].strip():
+            first += 1
+        if first > end or indent(self.lines[first]) <= column:
+            raise SyntaxError("definition without a body")
+        body = indent(self.lines[first])
+        if emit:
+            self.copy(line, header)
+            self.body(first)
+        return body
+
+    def body(self, first: int) -> None:
+        """
+        @cc 3
+        @desc add the first statement of a body to the skeleton, if it is a docstring
+        @arg first: the line of the first statement of the body
+        """
+        end = string_end(self.lines, first)
+        if end is not None:
+            self.copy(first, end)
+        elif not NESTED.match(self.lines[first].lstrip()):
+            # any other statement is left out, but the body still needs one
+            line = self.original[first]
+            self.skeleton[first] = line[: len(line) - len(line.lstrip())] + "pass"
+
+    def scan(self) -> str:
+        """
+        @cc 9
+        @desc find every definition, copying the ones that the models would read
+        @ret the skeleton of the module, with the same line numbers as the module
+        """
+        first = next((x for x, y in enumerate(self.lines) if y.strip()), 0)
+        end = string_end(self.lines, first) if first else None
+        if end is not None and not indent(self.lines[first]):
+            self.copy(first, end)
+        # the open definitions, as (last line, body indent, copied into the skeleton)
+        stack: List[Tuple[float, Optional[int], bool]] = [(float("inf"), 0, True)]
+        for match in DEFINITION.finditer(self.text):
+            line = self.line_of(match.start() + 1)
+            while stack[-1][0] < line:
+                stack.pop()
+            _, body, emitted = stack[-1]
+            if not emitted:
+                continue
+            column = len(match.group(1))
+            emit = column == body
+            inner = self.definition(line, column, emit)
+            stack.append((self.ends[line], inner, emit))
+        return "\n".join(self.skeleton[1:])
+
+
+def parse_skeleton(contents: str, filename: str) -> Optional[Module]:
+    """
+    @cc 6
+    @desc parse only the headers and docstrings of a module into our archives' models
+    @arg contents: the source code of the module
+    @arg filename: the path to report issues in the module under
+    @ret a Module object without function bodies, or None if it needs a full parse
+    """
+    try:
+        # bodies are left out of the skeleton, so the whole module is checked first
+        ast3.parse(contents)
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+    scanner = Scanner(contents)
+    try:
+        tree = ast3.parse(scanner.scan())
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+    definitions = (ast3.ClassDef, ast3.FunctionDef, ast3.AsyncFunctionDef)
+    nodes = list(tree.body)
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, definitions):
+            # the skeleton ends where its docstring does, so the real end is set
+            node.end_lineno = scanner.ends.get(node.lineno)
+            if node.end_lineno is None:
+                return None
+            nodes.extend(node.body)
+    module = Module(tree, filename)
+    module.end_line = scanner.last_code(len(scanner.lines))
+    module.skeleton = True
+    return module
@@ -3,7 +3,7 @@
 @desc tags for archives
 """
 import re
-from typing import List, Pattern
+from typing import Any, Dict, List, Optional, Pattern
 
 
 CHAR = "@"
@@ -11,6 +11,7 @@ EOL = r"(?:\n|\Z)"
 SPACE = r"(?:\s+)"
 ALNUM = r"([a-zA-Z0-9_]+)"
 ANY = r"(.+)"
+TOKEN = re.compile(rf"{CHAR}([a-zA-Z0-9_]+)")
 
 
 class Tag:
@@ -101,6 +102,59 @@ class Tags:
     NO_DOC = tag("nodoc", f"disable this {all_types} in the documentation")
     NO_LINT = tag("nolint", f"disable archives linting in this {all_types}")
 
+    _registry: Optional[Dict[str, Tag]] = None
+
+    @classmethod
+    def register(cls, new_tag: Tag) -> Tag:
+        """
+        @cc 1
+        @desc register a custom tag, so that it is parsed out of every docstring
+        @arg new_tag: the tag to register, such as one built with str_tag
+        @ret the registered tag
+        """
+        setattr(cls, new_tag.name.upper(), new_tag)
+        cls._registry = None
+        return new_tag
+
+    @classmethod
+    def registry(cls) -> Dict[str, Tag]:
+        """
+        @cc 3
+        @desc get all tags keyed by their name
+        @ret a dict of tag names to tag objects
+        """
+        if cls._registry is None:
+            cls._registry = {x.name: x for x in cls.all()}
+        return cls._registry
+
+    @classmethod
+    def scan(cls, text: str) -> Dict[str, List[Any]]:
+        """
+        @cc 7
+        @desc parse every tag out of a docstring in a single pass
+        @arg text: the docstring to scan for tags
+        @ret a dict of tag names to the values of each of their occurrences
+        """
+        found: Dict[str, List[Any]] = {}
+        if CHAR not in text:
+            return found
+        registry = cls.registry()
+        ends: Dict[str, int] = {}
+        for token in TOKEN.finditer(text):
+            found_tag = registry.get(token[1])
+            # skip unknown tags, and text already consumed by this tag's last match
+            if not found_tag or token.start() < ends.get(found_tag.name, 0):
+                continue
+            match = found_tag.regex.match(text, token.start())
+            if not match:
+                continue
+            ends[found_tag.name] = match.end()
+            groups = match.groups()
+            found.setdefault(found_tag.name, []).append(
+                groups[0] if len(groups) == 1 else groups
+            )
+        return found
+
     @classmethod
     def all(cls) -> List[Tag]:
         """
@@ -2,13 +2,15 @@
 @author jacobi petrucciani
 @desc archives rules submodule
 """
-from typing import Union
+from typing import List, Set, Union, TYPE_CHECKING
 from archives.models.rules import Rule
-from archives.models.python import Class, Function, Module
-from archives.globals import ast3
+from archives.globals import ast3, DEFAULT_ARG_IGNORE
 
+if TYPE_CHECKING:  # pragma: no cover
+    from archives.models.python import Arg, Class, Function, Module
 
-def no_docstring(obj: Union[Class, Function, Module]) -> bool:
+
+def no_docstring(obj: Union["Class", "Function", "Module"]) -> bool:
     """
     @cc 1
     @desc no docstring test
@@ -18,7 +20,7 @@ def no_docstring(obj: Union[Class, Function, Module]) -> bool:
     return not obj.doc
 
 
-def no_desc(obj: Union[Class, Function, Module]) -> bool:
+def no_desc(obj: Union["Class", "Function", "Module"]) -> bool:
     """
     @cc 2
     @desc no description test
@@ -96,7 +98,39 @@ def unnecessary_ret(function: "Function") -> bool:
     return bool(returns_none and function.doc and function.doc.ret)
 
 
-def nop(obj: Union[Class, Function, Module]) -> bool:
+def missing_args(function: "Function") -> Set[str]:
+    """
+    @cc 1
+    @desc find the args of a function that its docstring does not document
+    @arg function: the function to check
+    @ret the names of the undocumented args
+    """
+    return function.missing_args
+
+
+def unexpected_args(function: "Function") -> Set[str]:
+    """
+    @cc 1
+    @desc find the documented args of a function that it does not have
+    @arg function: the function to check
+    @ret the names of the documented args that do not exist
+    """
+    return function.unexpected_args
+
+
+def untyped_args(function: "Function") -> List["Arg"]:
+    """
+    @cc 4
+    @desc find the args of a function that have no type hint
+    @arg function: the function to check
+    @ret the untyped args, other than self and cls
+    """
+    return [
+        x for x in function.args if not x.typed and x.name not in DEFAULT_ARG_IGNORE
+    ]
+
+
+def nop(obj: Union["Class", "Function", "Module"]) -> bool:
     """
     @cc 1
     @desc a no-op check to allow for issues that can be manually added
@@ -118,16 +152,21 @@ CLASS_RULES = [
 FUNCTION_RULES = [
     Rule("F100", "function '{name}' missing docstring", no_docstring),
     Rule("F101", "function '{name}' missing @desc tag", no_desc),
-    Rule("F102", "function '{name}' missing @cc tag (cc: {cc})", no_cc),
+    Rule("F102", "function '{name}' missing @cc tag (cc: {cc})", no_cc, True),
     Rule(
         "F103",
         "function '{name}' mismatched @cc tag (tag is {doc_cc}, calculated {cc})",
         wrong_cc,
+        True,
     ),
     Rule("F104", "function '{name}' missing @ret tag", no_ret),
     Rule("F105", "function '{name}' has unnecessary @ret tag", unnecessary_ret),
     Rule("F106", "function '{name}' has no return type", no_ret_type),
 ]
-MISSING_ARG = Rule("A100", "function '{name}' missing @arg for '{arg}'", nop)
-UNEXPECTED_ARG = Rule("A101", "function '{name}' unexpected @arg for '{arg}'", nop)
-UNTYPED_ARG = Rule("A102", "function '{name}' has untyped arg '{arg}'", nop)
+# the checks of arg rules return each offending arg, to flag an issue for each
+MISSING_ARG = Rule("A100", "function '{name}' missing @arg for '{arg}'", missing_args)
+UNEXPECTED_ARG = Rule(
+    "A101", "function '{name}' unexpected @arg for '{arg}'", unexpected_args
+)
+UNTYPED_ARG = Rule("A102", "function '{name}' has untyped arg '{arg}'", untyped_args)
+ARG_RULES = [MISSING_ARG, UNEXPECTED_ARG, UNTYPED_ARG]
@@ -0,0 +1,363 @@
+"""
+@author jacobi petrucciani
+@desc an incremental static html site of the documentation of a project
+"""
+import hashlib
+import json
+import os
+from html import escape
+from posixpath import basename, dirname
+from typing import Dict, Iterable, List, Optional, Tuple
+from archives.archives import parse_source, ParseError
+from archives.globals import __version__
+from archives.utils.files import read_source
+
+
+MANIFEST = ".archives-manifest.json"
+STYLE = (
+    "body{font-family:sans-serif;max-width:60em;margin:2em auto;padding:0 1em}"
+    "section{border-left:2px solid #ddd;padding-left:1em;margin:1em 0}"
+    ".warn{color:#a40}.note{color:#555}code{background:#f4f4f4}"
+)
+
+
+def content_hash(raw: bytes) -> str:
+    """
+    @cc 1
+    @desc hash the contents of a module, along with the version that renders it
+    @arg raw: the contents of the module
+    @ret the hex digest of the contents and the archives version
+    """
+    return hashlib.sha256(__version__.encode("utf-8") + raw).hexdigest()
+
+
+def page_path(key: str) -> str:
+    """
+    @cc 1
+    @desc get the page of a module, which can not clash with the index of a folder
+    @arg key: the path of the module from the root of the project
+    @ret the path of the page from the root of the site
+    """
+    return f"{key}.html"
+
+
+def index_path(folder: str) -> str:
+    """
+    @cc 2
+    @desc get the index page of a folder
+    @arg folder: the path of the folder from the root of the project
+    @ret the path of the index page from the root of the site
+    """
+    return f"{folder}/index.html" if folder else "index.html"
+
+
+def page(title: str, body: List[str]) -> str:
+    """
+    @cc 1
+    @desc wrap the body of a page in a complete html document
+    @arg title: the title of the page
+    @arg body: the lines of the body of the page
+    @ret the html of the page
+    """
+    head = [
+        "<!doctype html>",
+        '<html><head><meta charset="utf-8">',
+        f"<title>{escape(title)}</title><style>{STYLE}</style>",
+        "</head><body>",
+    ]
+    return "\n".join([*head, *body, "</body></html>", ""])
+
+
+def render_doc(doc: Optional[Dict]) -> List[str]:
+    """
+    @cc 8
+    @desc render the description, author, notes, warnings, and links of a docstring
+    @arg doc: the serialized docstring, if there is one
+    @ret the lines of html for the docstring
+    """
+    if not doc:
+        return []
+    lines = [f"<p>{escape(doc['desc'])}</p>"] if doc["desc"] else []
+    if doc["author"]:
+        lines.append(f'<p class="note">by {escape(doc["author"])}</p>')
+    lines.extend(f'<p class="note">note: {escape(x)}</p>' for x in doc["notes"])
+    lines.extend(f'<p class="warn">warning: {escape(x)}</p>' for x in doc["warnings"])
+    if doc["links"]:
+        links = [f'<a href="{escape(y)}">{escape(x)}</a>' for x, y in doc["links"]]
+        lines.append(f"<p>links: {', '.join(links)}</p>")
+    return lines
+
+
+def hidden(data: Dict) -> bool:
+    """
+    @cc 2
+    @desc check if a module, class, or function is marked nodoc
+    @arg data: the serialized module, class, or function
+    @ret True if it should be left out of the documentation
+    """
+    return bool(data["doc"] and data["doc"]["no_doc"])
+
+
+def render_function(data: Dict, prefix: str = "") -> List[str]:
+    """
+    @cc 11
+    @desc render a function, with its args, return value, and nested functions
+    @arg data: the serialized function
+    @arg prefix: the qualified name of the class or function this is nested in
+    @ret the lines of html for the function
+    """
+    name = f"{prefix}{data['name']}"
+    args = [
+        f"{x['name']}: {x['type']}" if x["typed"] else x["name"] for x in data["args"]
+    ]
+    returns = f" -&gt; {escape(str(data['returns']))}" if data["returns"] else ""
+    lines = [
+        f'<section id="{escape(name)}">',
+        f"<h3><code>def {escape(name)}({escape(', '.join(args))}){returns}</code></h3>",
+        *render_doc(data["doc"]),
+    ]
+    doc = data["doc"] or {}
+    described = [(x["name"], doc.get("args", {}).get(x["name"])) for x in data["args"]]
+    described = [(x, y) for x, y in described if y]
+    if described:
+        lines.append("<dl>")
+        for arg, desc in described:
+            lines.append(f"<dt><code>{escape(arg)}</code></dt><dd>{escape(desc)}</dd>")
+        lines.append("</dl>")
+    if doc.get("ret"):
+        lines.append(f"<p><b>returns</b> {escape(doc['ret'])}</p>")
+    lines.extend(render_members(data, f"{name}."))
+    lines.append("</section>")
+    return lines
+
+
+def render_class(data: Dict, prefix: str = "") -> List[str]:
+    """
+    @cc 1
+    @desc render a class, with its methods and nested classes
+    @arg data: the serialized class
+    @arg prefix: the qualified name of the class or function this is nested in
+    @ret the lines of html for the class
+    """
+    name = f"{prefix}{data['name']}"
+    return [
+        f'<section id="{escape(name)}">',
+        f"<h2><code>class {escape(name)}</code></h2>",
+        *render_doc(data["doc"]),
+        *render_members(data, f"{name}."),
+        "</section>",
+    ]
+
+
+def render_members(data: Dict, prefix: str = "") -> List[str]:
+    """
+    @cc 5
+    @desc render the classes and functions in a module, class, or function
+    @arg data: the serialized module, class, or function
+    @arg prefix: the qualified name of the container, for nested members
+    @ret the lines of html for every member not marked nodoc
+    """
+    lines = []
+    for cls in data["classes"]:
+        if not hidden(cls):
+            lines.extend(render_class(cls, prefix))
+    for function in data["functions"]:
+        if not hidden(function):
+            lines.extend(render_function(function, prefix))
+    return lines
+
+
+def render_module(key: str, data: Dict) -> str:
+    """
+    @cc 1
+    @desc render the page of a module
+    @arg key: the path of the module from the root of the project
+    @arg data: the serialized module
+    @ret the html of the page
+    """
+    body = [
+        '<p><a href="index.html">index</a></p>',
+        f"<h1><code>{escape(key)}</code></h1>",
+        *render_doc(data["doc"]),
+        *render_members(data),
+    ]
+    return page(key, body)
+
+
+def render_index(folder: str, listing: Dict) -> str:
+    """
+    @cc 6
+    @desc render the index page of a folder, linking to its folders and modules
+    @arg folder: the path of the folder from the root of the project
+    @arg listing: the folders and the (name, description) of modules in the folder
+    @ret the html of the page
+    """
+    body = ['<p><a href="../index.html">up</a></p>'] if folder else []
+    body.append(f"<h1><code>{escape(folder or '/')}</code></h1><ul>")
+    for name in listing["folders"]:
+        link = escape(f"{name}/index.html")
+        body.append(f'<li><a href="{link}">{escape(name)}/</a></li>')
+    for name, desc in listing["modules"]:
+        link = f'<a href="{escape(page_path(name))}">{escape(name)}</a>'
+        body.append(f"<li>{link} {escape(desc)}</li>")
+    body.append("</ul>")
+    return page(folder or "index", body)
+
+
+def write_page(out_dir: str, path: str, text: str) -> None:
+    """
+    @cc 2
+    @desc write a page of the site atomically, creating its folder
+    @arg out_dir: the folder the site is in
+    @arg path: the path of the page from the root of the site
+    @arg text: the html of the page
+    """
+    site = os.path.abspath(out_dir)
+    target = os.path.abspath(os.path.join(site, path))
+    if os.path.commonpath([site, target]) != site:
+        raise ValueError(f"page {path!r} is outside of the site")
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp = f"{target}.{os.getpid()}.tmp"
+    with open(temp, "w", encoding="utf-8") as page_file:
+        page_file.write(text)
+    os.replace(temp, target)
+
+
+def render_page(job: Tuple[str, str, str]) -> Optional[Dict]:
+    """
+    @cc 4
+    @desc parse a module and write its page, so it can run in a worker
+    @arg job: a tuple of (the key of the module, its file, the folder of the site)
+    @ret the manifest entry of the module, or None if it could not be parsed
+    """
+    key, path, out_dir = job
+    raw = read_source(path)
+    try:
+        # pages never show complexity, so only headers and docstrings are parsed
+        module = parse_source(raw, path, True)
+    except ParseError:
+        return None
+    data = module.serialize()
+    entry = dict(hash=content_hash(raw), page=None, desc="")
+    if not hidden(data):
+        write_page(out_dir, page_path(key), render_module(key, data))
+        entry["page"] = page_path(key)
+        entry["desc"] = data["doc"]["desc"] if data["doc"] else ""
+    return entry
+
+
+def listings(modules: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    @cc 5
+    @desc find what the index page of each folder lists
+    @arg modules: the manifest entries of the modules, by key
+    @ret a dict of folders to the folders and modules they list
+    """
+    folders: Dict[str, Dict] = {"": dict(folders=set(), modules=[])}
+    for key, entry in sorted(modules.items()):
+        if not entry["page"]:
+            continue
+        folder = dirname(key)
+        listing = folders.setdefault(folder, dict(folders=set(), modules=[]))
+        listing["modules"].append([basename(key), entry["desc"]])
+        # the walk up stops at the root of a relative or an absolute key
+        while folder not in ("", "/"):
+            parent = dirname(folder)
+            listing = folders.setdefault(parent, dict(folders=set(), modules=[]))
+            listing["folders"].add(basename(folder))
+            folder = parent
+    for listing in folders.values():
+        listing["folders"] = sorted(listing["folders"])
+    return folders
+
+
+def load_manifest(out_dir: str) -> Dict:
+    """
+    @cc 3
+    @desc load the manifest of the last build of a site
+    @arg out_dir: the folder the site is in
+    @ret the manifest, or an empty one if there is none from this version
+    """
+    empty = dict(version=__version__, modules={}, indexes={})
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return empty
+    return manifest if manifest.get("version") == __version__ else empty
+
+
+def build_site(
+    files: Iterable[Tuple[str, str]], out_dir: str, jobs: int = 1
+) -> Tuple[List[str], List[str], List[str]]:
+    """
+    @cc 20
+    @desc render the pages of the modules and folders that changed since the last build
+    @arg files: the (key, path) of each module, keyed by its path from the project root
+    @arg out_dir: the folder to write the site to
+    @arg jobs: the number of worker processes to render pages with
+    @ret a tuple of the modules rendered, folders indexed, and modules not parsed
+    """
+    manifest = load_manifest(out_dir)
+    old = manifest["modules"]
+    modules: Dict[str, Dict] = {}
+    stale = []
+    for key, path in files:
+        entry = old.get(key)
+        if entry and entry["hash"] == content_hash(read_source(path)):
+            page_file = entry["page"] and os.path.join(out_dir, entry["page"])
+            if not page_file or os.path.isfile(page_file):
+                modules[key] = entry
+                continue
+        stale.append((key, path, out_dir))
+    if jobs > 1 and len(stale) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            entries = list(executor.map(render_page, stale, chunksize=4))
+    else:
+        entries = [render_page(x) for x in stale]
+    rendered, failed = [], []
+    for (key, _, __), entry in zip(stale, entries):
+        if entry is None:
+            failed.append(key)
+            # keep the last page of a module that no longer parses, until it is fixed
+            entry = old.get(key)
+            if not entry:
+                continue
+        else:
+            rendered.append(key)
+        modules[key] = entry
+
+    # pages of modules that are gone, or are now marked nodoc
+    for key, entry in old.items():
+        if entry["page"] and modules.get(key, {}).get("page") != entry["page"]:
+            remove(os.path.join(out_dir, entry["page"]))
+
+    indexes = {}
+    indexed = []
+    for folder, listing in listings(modules).items():
+        digest = hashlib.sha256(json.dumps(listing).encode("utf-8")).hexdigest()
+        indexes[folder] = digest
+        target = os.path.join(out_dir, index_path(folder))
+        if manifest["indexes"].get(folder) != digest or not os.path.isfile(target):
+            write_page(out_dir, index_path(folder), render_index(folder, listing))
+            indexed.append(folder)
+    for folder in set(manifest["indexes"]) - set(indexes):
+        remove(os.path.join(out_dir, index_path(folder)))
+
+    manifest = dict(version=__version__, modules=modules, indexes=indexes)
+    write_page(out_dir, MANIFEST, json.dumps(manifest, sort_keys=True))
+    return rendered, indexed, failed
+
+
+def remove(path: str) -> None:
+    """
+    @cc 2
+    @desc remove a page of the site, if it is still there
+    @arg path: the file to remove
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
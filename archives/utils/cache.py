@@ -0,0 +1,190 @@
+"""
+@author jacobi petrucciani
+@desc caches of lint results and parsed modules
+"""
+import json
+import os
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from archives.globals import __version__
+
+
+CACHE_DIR = ".archives_cache"
+CACHE_FORMAT = "4"
+DEFAULT_CACHE_SIZE = 20000
+SUFFIX = ".json"
+
+
+class Cache:
+    """
+    @desc a directory of per-file lint results with lru eviction
+    """
+
+    def __init__(self, directory: str, codes: Iterable[str], size: int) -> None:
+        """
+        @cc 2
+        @desc cache constructor
+        @arg directory: the directory to store cache entries in
+        @arg codes: the codes of the rules active for this run
+        @arg size: the maximum number of entries to keep
+        """
+        self.directory = Path(directory)
+        self.size = size
+        py_ver = ".".join(str(x) for x in sys.version_info[:3])
+        salt = "\0".join(
+            [CACHE_FORMAT, __version__, py_ver, ",".join(sorted(set(codes)))]
+        )
+        # hashlib is only imported once a run needs the cache
+        import hashlib
+
+        # every key starts from the salt, so it is hashed once and copied per key
+        self._salted = hashlib.sha256(salt.encode("utf-8"))
+
+    def key(self, path: str, contents: bytes) -> str:
+        """
+        @cc 1
+        @desc build the cache key for a file's contents under this run's settings
+        @arg path: the path of the file, as issues include it
+        @arg contents: the raw bytes of the file
+        @ret a hex digest to store the file's results under
+        """
+        return self._digest(b"file", path, contents)
+
+    def blob_key(self, path: str, blob: str) -> str:
+        """
+        @cc 1
+        @desc build the cache key for a file from its git blob id, without reading it
+        @arg path: the path of the file, as issues include it
+        @arg blob: the git object id of the file's contents
+        @ret a hex digest to store the file's results under
+        """
+        return self._digest(b"blob", path, blob.encode("ascii"))
+
+    def _digest(self, kind: bytes, path: str, data: bytes) -> str:
+        """
+        @cc 2
+        @desc hash the given key parts together with this run's settings
+        @arg kind: what the data is, so different kinds of keys never collide
+        @arg path: the path of the file
+        @arg data: the contents, or an id of the contents, of the file
+        @ret a hex digest of all of the parts
+        """
+        digest = self._salted.copy()
+        for part in [kind, path.encode("utf-8", "surrogateescape"), data]:
+            digest.update(b"\0")
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[List[List], Dict[str, int]]]:
+        """
+        @cc 2
+        @desc fetch a cache entry, marking it as recently used
+        @arg key: the key of the entry to fetch
+        @ret a tuple of (issue record fields, counters), or None on a miss
+        """
+        path = self.directory / f"{key}{SUFFIX}"
+        try:
+            with open(path, encoding="utf-8") as entry:
+                data = json.load(entry)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return data["records"], data["counters"]
+
+    def set(self, key: str, records: List, counters: Dict[str, int]) -> None:
+        """
+        @cc 2
+        @desc store a cache entry, ignoring any errors writing to disk
+        @arg key: the key to store the entry under
+        @arg records: the issue records found in the file
+        @arg counters: the object counters of the file
+        """
+        path = self.directory / f"{key}{SUFFIX}"
+        temp = self.directory / f"{key}.{os.getpid()}.tmp"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(temp, "w", encoding="utf-8") as entry:
+                json.dump(dict(records=records, counters=counters), entry)
+            os.replace(temp, path)
+        except OSError:
+            pass
+
+    def prune(self) -> int:
+        """
+        @cc 9
+        @desc evict the least recently used entries until the cache fits its size
+        @ret the number of entries evicted
+        """
+        try:
+            names = [x for x in os.listdir(self.directory) if x.endswith(SUFFIX)]
+        except OSError:
+            return 0
+        if len(names) <= self.size:
+            return 0
+        entries = []
+        for name in names:
+            try:
+                entries.append((os.stat(self.directory / name).st_mtime, name))
+            except OSError:
+                continue
+        entries.sort()
+        evicted = 0
+        for _, name in entries[: len(entries) - self.size]:
+            try:
+                os.remove(self.directory / name)
+                evicted += 1
+            except OSError:
+                continue
+        return evicted
+
+
+class ModelCache:
+    """
+    @desc an in memory lru cache of parsed modules, keyed by path and mtime
+    """
+
+    def __init__(self, size: int = DEFAULT_CACHE_SIZE) -> None:
+        """
+        @cc 1
+        @desc model cache constructor
+        @arg size: the maximum number of modules to keep in memory
+        """
+        self.size = size
+        self.entries: "OrderedDict[str, Tuple[Tuple[int, int], Any]]" = OrderedDict()
+
+    def get(self, filename: str) -> Any:
+        """
+        @cc 4
+        @desc fetch a parsed module, if the file has not changed since it was parsed
+        @arg filename: the path of the module
+        @ret the cached Module object, or None if it is missing or stale
+        """
+        entry = self.entries.get(filename)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        if entry[0] != (stat.st_mtime_ns, stat.st_size):
+            return None
+        self.entries.move_to_end(filename)
+        return entry[1]
+
+    def set(self, filename: str, module: Any) -> None:
+        """
+        @cc 3
+        @desc store a parsed module, evicting the least recently used if full
+        @arg filename: the path of the module
+        @arg module: the parsed Module object
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return
+        self.entries[filename] = ((stat.st_mtime_ns, stat.st_size), module)
+        self.entries.move_to_end(filename)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
@@ -3,50 +3,148 @@
 @desc file related helper utils
 """
 import click
+import importlib.util
 import io
+import os
 import tokenize
 from functools import lru_cache
+from operator import attrgetter
 from pathlib import Path
-from typing import Iterator, Iterable, Pattern, Tuple
+from typing import Any, Iterator, Iterable, List, Optional, Pattern, Tuple
 from archives.utils.text import err
 from archives.utils.state import get_state
 
 
+def has_pathspec() -> bool:
+    """
+    @cc 1
+    @desc check for the optional pathspec package, without paying to import it
+    @ret True if pathspec is installed
+    """
+    return importlib.util.find_spec("pathspec") is not None
+
+
+def gitignore_spec(directory: str) -> Optional[Any]:
+    """
+    @cc 3
+    @desc load the .gitignore of a directory, if it has one
+    @arg directory: the directory to look for a .gitignore in
+    @ret a pathspec GitIgnoreSpec of its patterns, or None if there is no .gitignore
+    """
+    try:
+        with open(os.path.join(directory, ".gitignore"), encoding="utf-8") as ignore:
+            lines = ignore.read().splitlines()
+    except OSError:
+        return None
+    import pathspec
+
+    return pathspec.GitIgnoreSpec.from_lines(lines) if lines else None
+
+
+def is_ignored(normalized_path: str, ignores: List[Tuple[str, Any]]) -> bool:
+    """
+    @cc 3
+    @desc check a path against the .gitignore files of the directories above it
+    @arg normalized_path: the path relative to the project root, with a leading slash
+    @arg ignores: a list of (normalized directory, GitIgnoreSpec) to check against
+    @ret True if any of the .gitignore files ignore this path
+    """
+    for base, spec in ignores:
+        if spec.match_file(normalized_path[len(base) :]):
+            return True
+    return False
+
+
 def get_python_files(
-    path: Path, root: Path, include: Pattern[str], exclude: Pattern[str]
+    path: Path,
+    root: Path,
+    include: Pattern[str],
+    exclude: Pattern[str],
+    gitignore: bool = False,
+    walked: Optional[List[str]] = None,
 ) -> Iterator[Path]:
     """
-    @cc 11
+    @cc 23
     @desc return the list of files in the path, including/excluding from args
     @arg path: the path to start with
     @arg root: the root of the overall path
     @arg include: a regex for including files
     @arg exclude: a regex for excluding files
-    @ret an iterator of all files found in this path
+    @arg gitignore: a flag to also skip anything ignored by .gitignore files
+    @arg walked: a list to add the real path of each directory walked to
+    @ret an iterator of all files found in this path, in a deterministic order
     """
     assert root.is_absolute(), f"INTERNAL ERROR: `root` must be absolute but is {root}"
-    for child in path.iterdir():
-        try:
-            normalized_path = "/" + child.resolve().relative_to(root).as_posix()
-        except ValueError:
-            if child.is_symlink():
-                continue
+    real = os.path.realpath(path)
+    relative = Path(real).relative_to(root).as_posix()
+    prefix = "/" if relative == "." else f"/{relative}/"
+    ignores: List[Tuple[str, Any]] = []
+    if gitignore:
+        # the .gitignore files from the project root down to the starting directory
+        parts = Path(relative).parts
+        for depth in range(len(parts) + 1):
+            spec = gitignore_spec(os.path.join(str(root), *parts[:depth]))
+            if spec:
+                ignores.append(("/" + "".join(f"{x}/" for x in parts[:depth]), spec))
 
-            raise
+    # a stack of directories being walked, so that symlink loops can be detected
+    active = {real}
+    walked = [] if walked is None else walked
+    walked.append(real)
+    stack = [(scan(str(path)), real, prefix, ignores)]
+    while stack:
+        entries, real, prefix, ignores = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            active.discard(real)
+            continue
 
-        if child.is_dir():
+        if entry.is_symlink():
+            child_real = os.path.realpath(entry.path)
+            try:
+                normalized_path = "/" + Path(child_real).relative_to(root).as_posix()
+            except ValueError:
+                continue
+        else:
+            child_real = os.path.join(real, entry.name)
+            normalized_path = prefix + entry.name
+
+        is_dir = entry.is_dir()
+        if is_dir:
             normalized_path += "/"
         exclude_match = exclude.search(normalized_path)
         if exclude_match and exclude_match.group(0):
             continue
+        if ignores and is_ignored(normalized_path, ignores):
+            continue
 
-        if child.is_dir():
-            yield from get_python_files(child, root, include, exclude)
+        if is_dir:
+            if child_real in active:
+                continue
+            child_ignores = ignores
+            spec = gitignore_spec(child_real) if gitignore else None
+            if spec:
+                child_ignores = [*ignores, (normalized_path, spec)]
+            active.add(child_real)
+            walked.append(child_real)
+            stack.append((scan(entry.path), child_real, normalized_path, child_ignores))
 
-        elif child.is_file():
+        elif entry.is_file():
             include_match = include.search(normalized_path)
             if include_match:
-                yield child
+                yield Path(entry.path)
+
+
+def scan(directory: str) -> Iterator[os.DirEntry]:
+    """
+    @cc 1
+    @desc list the entries of a directory, sorted by name
+    @arg directory: the directory to list
+    @ret an iterator of the directory's entries, in a deterministic order
+    """
+    with os.scandir(directory) as entries:
+        return iter(sorted(entries, key=attrgetter("name")))
 
 
 @lru_cache()
@@ -85,19 +183,43 @@ def path_empty(src: Tuple[str], ctx: click.Context) -> None:
         ctx.exit(2)
 
 
+def read_source(path: str) -> bytes:
+    """
+    @cc 1
+    @desc read the raw bytes of a module in one go, without an extra buffer
+    @arg path: the file of the module
+    @ret the contents of the file
+    """
+    with open(path, "rb", buffering=0) as file_to_read:
+        return file_to_read.readall()
+
+
+def decode_source(src: bytes) -> str:
+    """
+    @cc 2
+    @desc decode a module by its coding cookie or bom, as python would
+    @arg src: the raw bytes of the module
+    @ret the decoded source, with any bytes invalid in its encoding replaced
+    """
+    try:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(src).readline)
+    except SyntaxError:
+        # an unknown coding cookie, or one that disagrees with a bom
+        encoding = "utf-8"
+    return src.decode(encoding, errors="replace")
+
+
 def decode_bytes(src: bytes) -> Tuple[str, str, str]:
     """
     @cc 3
-    @desc decode bytes passed in
+    @desc decode bytes passed in, with universal newlines
     @arg src: source data
     @ret a tuple of (decoded_contents, encoding, newline)
     """
-    srcbuf = io.BytesIO(src)
-    encoding, lines = tokenize.detect_encoding(srcbuf.readline)
+    encoding, lines = tokenize.detect_encoding(io.BytesIO(src).readline)
     if not lines:
         return "", encoding, "\n"
 
     newline = "\r\n" if lines[0][-2:] == b"\r\n" else "\n"
-    srcbuf.seek(0)
-    with io.TextIOWrapper(srcbuf, encoding) as tiow:
-        return tiow.read(), encoding, newline
+    contents = decode_source(src).replace("\r\n", "\n").replace("\r", "\n")
+    return contents, encoding, newline
@@ -0,0 +1,190 @@
+"""
+@author jacobi petrucciani
+@desc git related helper utils
+"""
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Pattern, Tuple, Union
+
+
+HUNK = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+REGULAR_FILES = {"100644", "100755"}
+WHOLE_FILE = (1, sys.maxsize)
+
+
+class GitError(Exception):
+    """
+    @desc raised when a git command fails
+    """
+
+
+def git(args: List[str], cwd: Union[str, Path]) -> str:
+    """
+    @cc 3
+    @desc run a git command, returning its output
+    @arg args: the arguments to pass to git
+    @arg cwd: the directory to run git in
+    @ret the standard output of the git command
+    """
+    import subprocess
+
+    try:
+        result = subprocess.run(
+            ["git", "-c", "core.quotePath=false", *args],
+            cwd=str(cwd),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as error:
+        raise GitError(getattr(error, "stderr", None) or str(error)) from error
+    return result.stdout
+
+
+def parse_diff(diff: str, toplevel: Path) -> Dict[str, List[Tuple[int, int]]]:
+    """
+    @cc 8
+    @desc parse a zero context unified diff into the changed line ranges per file
+    @arg diff: the output of git diff --unified=0
+    @arg toplevel: the root of the git repository the diff paths are relative to
+    @ret a dict of absolute file paths to lists of (first, last) changed lines
+    """
+    hunks: Dict[str, List[Tuple[int, int]]] = {}
+    current = None
+    for line in diff.splitlines():
+        if line.startswith("+++ "):
+            path = line[4:].rstrip("\t")
+            current = None if path == "/dev/null" else str(toplevel / path[2:])
+            if current:
+                hunks[current] = []
+            continue
+        match = HUNK.match(line)
+        if match and current:
+            start, count = int(match[1]), int(match[2] or 1)
+            # a pure deletion touches the line it was removed after
+            hunks[current].append((start, max(start, start + count - 1)))
+    return hunks
+
+
+def changed_lines(ref: str, cwd: Path) -> Dict[str, List[Tuple[int, int]]]:
+    """
+    @cc 2
+    @desc find the lines of files that changed relative to the given git ref
+    @arg ref: the git ref to diff the working tree against
+    @arg cwd: a directory inside of the git repository
+    @ret a dict of resolved file paths to lists of (first, last) changed lines
+    """
+    toplevel = Path(git(["rev-parse", "--show-toplevel"], cwd).strip()).resolve()
+    diff = git(
+        [
+            "diff",
+            "--unified=0",
+            "--no-color",
+            "--no-ext-diff",
+            "--src-prefix=a/",
+            "--dst-prefix=b/",
+            ref,
+            "--",
+        ],
+        toplevel,
+    )
+    hunks = parse_diff(diff, toplevel)
+
+    # untracked files are new in their entirety
+    untracked = git(["ls-files", "--others", "--exclude-standard"], toplevel)
+    for path in untracked.splitlines():
+        hunks[str(toplevel / path)] = [WHOLE_FILE]
+    return hunks
+
+
+def excluded(normalized_path: str, start: int, exclude: Pattern[str]) -> bool:
+    """
+    @cc 5
+    @desc check a file, and each folder above it after the given offset, against a regex
+    @arg normalized_path: the path of the file relative to the project root
+    @arg start: the offset of the slash after the folder the walk started from
+    @arg exclude: a regex for excluding files
+    @ret True if the file or any of the folders it is in are excluded
+    """
+    end = normalized_path.find("/", start + 1)
+    while end != -1:
+        match = exclude.search(normalized_path[: end + 1])
+        if match and match.group(0):
+            return True
+        end = normalized_path.find("/", end + 1)
+    match = exclude.search(normalized_path)
+    return bool(match and match.group(0))
+
+
+class GitIndex:
+    """
+    @desc the files of a git repository, with the blob ids of the ones unchanged on disk
+    """
+
+    def __init__(self, cwd: Path) -> None:
+        """
+        @cc 8
+        @desc list the tracked and untracked files of the repository from its index
+        @arg cwd: a directory inside of the git repository
+        """
+        toplevel = git(["rev-parse", "--show-toplevel"], cwd).strip()
+        self.toplevel = os.path.realpath(toplevel)
+        self.files: Dict[str, Optional[str]] = {}
+        for entry in git(["ls-files", "-s", "-z"], self.toplevel).split("\0"):
+            if not entry:
+                continue
+            info, _, path = entry.partition("\t")
+            mode, blob, stage = info.split(" ")
+            if mode in REGULAR_FILES:
+                # unmerged files have no single blob to trust
+                self.files[path] = blob if stage == "0" else None
+
+        # the index stat data tells us which files differ from their blob
+        modified = git(["ls-files", "-m", "-z"], self.toplevel).split("\0")
+        untracked = git(
+            ["ls-files", "-o", "-z", "--exclude-standard"], self.toplevel
+        ).split("\0")
+        for path in [*modified, *untracked]:
+            if path:
+                self.files[path] = None
+        # tracked files deleted from the working tree have nothing left to lint
+        for path in git(["ls-files", "-d", "-z"], self.toplevel).split("\0"):
+            self.files.pop(path, None)
+        self.order = sorted(self.files, key=lambda x: x.split("/"))
+
+        # blob ids of the files that have been listed, by their absolute path
+        self.blobs: Dict[str, str] = {}
+
+    def python_files(
+        self, path: Path, root: Path, include: Pattern[str], exclude: Pattern[str]
+    ) -> Iterator[Path]:
+        """
+        @cc 8
+        @desc list the files in the given directory, including/excluding from args
+        @arg path: the directory to list the files of
+        @arg root: the root of the overall path
+        @arg include: a regex for including files
+        @arg exclude: a regex for excluding files
+        @ret an iterator of the files in this path, in the same order as get_python_files
+        """
+        relative = os.path.relpath(os.path.realpath(path), self.toplevel)
+        prefix = "" if relative == "." else f"{relative}/"
+        base = os.path.relpath(self.toplevel, root)
+        base = "/" if base == "." else f"/{base}/"
+        for name in self.order:
+            if not name.startswith(prefix):
+                continue
+            normalized_path = base + name
+            # like a walk from path, excludes apply to each folder below it
+            if excluded(normalized_path, len(base + prefix) - 1, exclude):
+                continue
+            if not include.search(normalized_path):
+                continue
+            file = path / name[len(prefix) :]
+            blob = self.files[name]
+            if blob:
+                self.blobs[str(file.absolute())] = blob
+            yield file
@@ -0,0 +1,120 @@
+"""
+@author jacobi petrucciani
+@desc machine readable metrics of a lint run, as json or an openmetrics textfile
+"""
+import json
+import os
+import sys
+from typing import Dict, List, Union
+from archives.globals import __version__
+from archives.utils.state import State
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore
+
+
+PREFIX = "archives"
+# the openmetrics name and help text of each metric, by its name in json
+METRICS = {
+    "wall_time_seconds": ("wall_time_seconds", "wall time of the run"),
+    "files_per_second": ("files_per_second", "files linted per second of wall time"),
+    "lines_per_second": ("lines_per_second", "lines linted per second of wall time"),
+    "cache_hit_ratio": ("cache_hit_ratio", "share of files found in the cache"),
+    "peak_rss_bytes": ("peak_rss_bytes", "peak resident memory, including workers"),
+    "issues": ("issues", "number of issues found"),
+    "module_count": ("modules", "number of modules linted"),
+    "class_count": ("classes", "number of classes linted"),
+    "function_count": ("functions", "number of functions linted"),
+    "module_nolint_count": ("nolint_modules", "number of modules marked nolint"),
+    "class_nolint_count": ("nolint_classes", "number of classes marked nolint"),
+    "function_nolint_count": ("nolint_functions", "number of functions marked nolint"),
+    "line_count": ("lines", "lines linted, up to the last statement of each module"),
+    "cache_hits": ("cache_hits", "number of files found in the cache"),
+    "cache_misses": ("cache_misses", "number of files not found in the cache"),
+}
+
+
+def peak_rss() -> int:
+    """
+    @cc 3
+    @desc get the peak resident memory of this process and its finished workers
+    @ret the peak resident memory in bytes, or 0 where it can not be measured
+    """
+    if resource is None:
+        return 0
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # linux reports kilobytes, while macos reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def collect(state: State, seconds: float, issues: Dict[str, int]) -> Dict:
+    """
+    @cc 2
+    @desc gather the metrics of a finished lint run
+    @arg state: the state of the run, with its merged counters
+    @arg seconds: the wall time of the run
+    @arg issues: the number of issues found for each rule code
+    @ret a dict of metric names to values, with the issues per rule under 'rules'
+    """
+    seconds = max(seconds, 1e-9)
+    looked_up = state.cache_hits + state.cache_misses
+    metrics: Dict[str, Union[int, float, str, Dict]] = dict(
+        version=__version__,
+        wall_time_seconds=round(seconds, 6),
+        files_per_second=round(state.module_count / seconds, 3),
+        lines_per_second=round(state.line_count / seconds, 3),
+        cache_hit_ratio=round(state.cache_hits / looked_up, 6) if looked_up else 0.0,
+        peak_rss_bytes=peak_rss(),
+        issues=sum(issues.values()),
+    )
+    metrics.update(state.counters())
+    metrics["rules"] = dict(sorted(issues.items()))
+    return metrics
+
+
+def openmetrics(metrics: Dict) -> List[str]:
+    """
+    @cc 3
+    @desc render metrics in the openmetrics text format, for prometheus
+    @arg metrics: the metrics of a run, from collect
+    @ret the lines of the textfile
+    """
+    lines = []
+    for key, (name, text) in METRICS.items():
+        lines.append(f"# HELP {PREFIX}_{name} {text}")
+        lines.append(f"# TYPE {PREFIX}_{name} gauge")
+        lines.append(f"{PREFIX}_{name} {metrics[key]}")
+    lines.append(f"# HELP {PREFIX}_rule_issues number of issues found per rule")
+    lines.append(f"# TYPE {PREFIX}_rule_issues gauge")
+    for code, count in metrics["rules"].items():
+        lines.append(f'{PREFIX}_rule_issues{{code="{code}"}} {count}')
+    lines.append(f"# HELP {PREFIX}_build_info the version of archives")
+    lines.append(f"# TYPE {PREFIX}_build_info gauge")
+    lines.append(f'{PREFIX}_build_info{{version="{metrics["version"]}"}} 1')
+    lines.append("# EOF")
+    return lines
+
+
+def write_metrics(path: str, metrics: Dict, metrics_format: str = None) -> None:
+    """
+    @cc 4
+    @desc write metrics to a file atomically, so scrapers never see a partial file
+    @arg path: the file to write to
+    @arg metrics: the metrics of a run, from collect
+    @arg metrics_format: either 'json' or 'openmetrics', or None to pick by the suffix
+    """
+    if metrics_format is None:
+        metrics_format = "openmetrics" if path.endswith(".prom") else "json"
+    if metrics_format == "openmetrics":
+        text = "\n".join(openmetrics(metrics)) + "\n"
+    else:
+        text = json.dumps(metrics, indent=2) + "\n"
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(text)
+    os.replace(temp, path)
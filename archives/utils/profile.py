@@ -0,0 +1,226 @@
+"""
+@author jacobi petrucciani
+@desc timers for profiling the phases, rules, and files of an archives run
+"""
+import heapq
+from collections import defaultdict
+from time import perf_counter
+from typing import Any, Callable, DefaultDict, Iterable, Iterator, List, Tuple
+
+
+PHASES = [
+    "discovery",
+    "cache",
+    "read",
+    "parse",
+    "models",
+    "docs",
+    "complexity",
+    "rules",
+    "output",
+]
+
+
+class Timer:
+    """
+    @desc a context manager that times a block under a name, when profiling
+    """
+
+    __slots__ = ("profiler", "table", "name")
+
+    def __init__(self, profiler: "Profiler", table: DefaultDict, name: str) -> None:
+        """
+        @cc 1
+        @desc timer constructor
+        @arg profiler: the profiler to record the time with
+        @arg table: the table of the profiler to record the time in
+        @arg name: the name to record the time under
+        """
+        self.profiler = profiler
+        self.table = table
+        self.name = name
+
+    def __enter__(self) -> None:
+        """
+        @cc 2
+        @desc start the timer
+        """
+        if self.profiler.enabled:
+            self.profiler.start(self.table, self.name)
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        """
+        @cc 2
+        @desc stop the timer
+        @arg exc_type: the type of the exception raised in the block, if any
+        @arg exc_value: the exception raised in the block, if any
+        @arg traceback: the traceback of the exception raised in the block, if any
+        """
+        if self.profiler.enabled:
+            self.profiler.stop()
+
+
+class Profiler:
+    """
+    @desc high resolution timers for the phases of a run, each rule, and each file
+    """
+
+    def __init__(self) -> None:
+        """
+        @cc 1
+        @desc profiler constructor
+        """
+        self.enabled = False
+        self.top = 0
+        self.phases: DefaultDict[str, float] = defaultdict(float)
+        self.rules: DefaultDict[str, float] = defaultdict(float)
+        self.calls: DefaultDict[str, int] = defaultdict(int)
+        self.files: List[Tuple[float, str]] = []
+        # the (table, name, start, time spent in nested timers) of running timers
+        self._stack: List[List] = []
+
+    def configure(self, enabled: bool, top: int = 10) -> None:
+        """
+        @cc 2
+        @desc turn profiling on or off, clearing anything recorded before
+        @arg enabled: a flag to turn profiling on
+        @arg top: how many of the slowest files to keep
+        """
+        # timers hold on to the tables, so they are cleared rather than replaced
+        self.phases.clear()
+        self.rules.clear()
+        self.calls.clear()
+        self.phases.update({x: 0.0 for x in PHASES})
+        self.files.clear()
+        self._stack.clear()
+        self.enabled = enabled
+        self.top = top
+
+    def start(self, table: DefaultDict, name: str) -> None:
+        """
+        @cc 1
+        @desc start timing under a name
+        @arg table: the table to record the time in
+        @arg name: the name to record the time under
+        """
+        self._stack.append([table, name, perf_counter(), 0.0])
+
+    def stop(self) -> None:
+        """
+        @cc 2
+        @desc stop the last started timer, only counting the time outside nested timers
+        """
+        table, name, start, nested = self._stack.pop()
+        elapsed = perf_counter() - start
+        table[name] += elapsed - nested
+        self.calls[name] += 1
+        if self._stack:
+            self._stack[-1][3] += elapsed
+
+    def phase(self, name: str) -> Timer:
+        """
+        @cc 1
+        @desc time a phase of the run
+        @arg name: the name of the phase
+        @ret a context manager that times its block
+        """
+        return Timer(self, self.phases, name)
+
+    def rule(self, code: str) -> Timer:
+        """
+        @cc 1
+        @desc time a rule that is checked inline
+        @arg code: the code of the rule
+        @ret a context manager that times its block
+        """
+        return Timer(self, self.rules, code)
+
+    def timed_rule(self, code: str, check: Callable) -> Callable:
+        """
+        @cc 1
+        @desc wrap the check of a rule so that each call of it is timed
+        @arg code: the code of the rule
+        @arg check: the check function of the rule
+        @ret a check function that records its time under the rule's code
+        """
+        timer = self.rule(code)
+
+        def timed(obj: Any) -> Any:
+            """
+            @cc 1
+            @desc run the check of the rule
+            @arg obj: the module, class, or function to check
+            @ret the result of the check
+            """
+            with timer:
+                return check(obj)
+
+        return timed
+
+    def timed_files(self, function: Callable) -> Callable:
+        """
+        @cc 1
+        @desc wrap a function that handles a file, to keep track of the slowest files
+        @arg function: a function that takes a filename as its first argument
+        @ret a function that records the time each call of it takes
+        """
+
+        def timed(filename: str, *args: Any) -> Any:
+            """
+            @cc 3
+            @desc run the function, recording the time it took for the file
+            @arg filename: the file being handled
+            @ret the result of the function
+            """
+            start = perf_counter()
+            try:
+                return function(filename, *args)
+            finally:
+                entry = (perf_counter() - start, filename)
+                if len(self.files) < self.top:
+                    heapq.heappush(self.files, entry)
+                elif self.top:
+                    heapq.heappushpop(self.files, entry)
+
+        return timed
+
+    def iterate(self, name: str, items: Iterable) -> Iterator:
+        """
+        @cc 3
+        @desc time how long it takes to produce each item of an iterator, as a phase
+        @arg name: the name of the phase
+        @arg items: the iterator to time
+        @ret an iterator of the same items
+        """
+        iterator = iter(items)
+        timer = self.phase(name)
+        while True:
+            with timer:
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def report(self) -> List[str]:
+        """
+        @cc 6
+        @desc build a report of where the time of the run was spent
+        @ret the lines of the report
+        """
+        lines = ["profile (seconds):"]
+        checks = sum(self.rules.values())
+        for name, seconds in self.phases.items():
+            if name == "rules":
+                seconds += checks
+            lines.append(f"  {name:<12}{seconds:>10.4f}")
+        for code, seconds in sorted(self.rules.items(), key=lambda x: -x[1]):
+            lines.append(f"    {code:<10}{seconds:>10.4f} ({self.calls[code]} checks)")
+        if self.files:
+            lines.append(f"slowest {len(self.files)} files (seconds):")
+            for seconds, filename in sorted(self.files, reverse=True):
+                lines.append(f"  {seconds:>10.4f} {filename}")
+        return lines
+
+
+# the profiler of this process, only recording anything while enabled
+PROFILER = Profiler()
@@ -3,7 +3,32 @@
 @desc click state related handling
 """
 import click
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from archives.models.rules import RuleSet
+
+
+OPTIONS = [
+    "verbose",
+    "quiet",
+    "ignore_exceptions",
+    "stats",
+    "disable_list",
+    "format",
+    "cache_dir",
+    "cache_size",
+    "profile",
+]
+COUNTERS = [
+    "module_count",
+    "class_count",
+    "function_count",
+    "module_nolint_count",
+    "class_nolint_count",
+    "function_nolint_count",
+    "line_count",
+    "cache_hits",
+    "cache_misses",
+]
 
 
 class State:
@@ -21,15 +46,37 @@ class State:
         self.quiet = False
         self.ignore_exceptions = False
         self.stats = False
+        self.jobs = 1
+        self.sort = True
+        self.watch_interval = 1.0
+        self.profile = False
+        self.profile_dump: Optional[str] = None
+        self.started = 0.0
+
+        # metrics options
+        self.metrics_file: Optional[str] = None
+        self.metrics_format: Optional[str] = None
 
         # disables
         self.disable_list: List[str] = []
 
+        # cache options
+        self.cache_dir: Optional[str] = None
+        self.cache_size = 0
+
+        # changed line ranges per file, when only linting a git diff
+        self.hunks: Optional[Dict[str, List[Tuple[int, int]]]] = None
+
+        # git blob ids of files unchanged from the git index, when listing from git
+        self.blobs: Dict[str, str] = {}
+
         # output options
         self.format = "flake8"
-        self.module_rules: List = []
-        self.class_rules: List = []
-        self.function_rules: List = []
+        self.output: Optional[str] = None
+        self.doc_format = "json"
+
+        # the active rules, compiled by apply_rules, with none active until then
+        self.rules = RuleSet(module=(), klass=(), function=(), args=(), disabled=())
 
         # object counters
         self.module_count = 0
@@ -41,6 +88,53 @@ class State:
         self.class_nolint_count = 0
         self.function_nolint_count = 0
 
+        # volume counters, for metrics
+        self.line_count = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def options(self) -> Dict:
+        """
+        @cc 2
+        @desc snapshot the user supplied options of this state
+        @ret a plain dict of options, safe to send to a worker process
+        """
+        return {x: getattr(self, x) for x in OPTIONS}
+
+    def counters(self) -> Dict[str, int]:
+        """
+        @cc 2
+        @desc snapshot the object counters of this state
+        @ret a plain dict of counter names to their values
+        """
+        return {x: getattr(self, x) for x in COUNTERS}
+
+    def update(self, options: Dict) -> None:
+        """
+        @cc 2
+        @desc apply a snapshot of options to this state
+        @arg options: a dict of option names to values, from State.options
+        """
+        for name, value in options.items():
+            setattr(self, name, value)
+
+    def merge(self, counters: Dict[str, int]) -> None:
+        """
+        @cc 2
+        @desc add the counters of another state into this one
+        @arg counters: a dict of counter names to values, from State.counters
+        """
+        for name, value in counters.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def reset(self) -> None:
+        """
+        @cc 2
+        @desc zero the object counters of this state
+        """
+        for name in COUNTERS:
+            setattr(self, name, 0)
+
 
 def get_state() -> State:
     """
@@ -0,0 +1,288 @@
+"""
+@author jacobi petrucciani
+@desc a sqlite index of every module, class, function, and arg, for instant lookups
+"""
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+from archives.globals import __version__
+from archives.utils.files import read_source
+
+if TYPE_CHECKING:  # pragma: no cover
+    import sqlite3
+
+
+INDEX_FILE = ".archives_index.db"
+# marks the sqlite files archives created, so that no other database is ever rebuilt
+APPLICATION_ID = 0x61726368
+# bump whenever the tables change, so older indexes are rebuilt
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE files (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, hash TEXT);
+CREATE TABLE symbols (
+    id INTEGER PRIMARY KEY,
+    file INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    parent INTEGER,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    qualname TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    returns TEXT,
+    complexity INTEGER,
+    author TEXT,
+    desc TEXT,
+    ret TEXT
+);
+CREATE INDEX symbols_file ON symbols(file);
+CREATE INDEX symbols_name ON symbols(name);
+CREATE INDEX symbols_qualname ON symbols(qualname);
+CREATE TABLE args (
+    symbol INTEGER NOT NULL REFERENCES symbols(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT,
+    desc TEXT
+);
+CREATE INDEX args_symbol ON args(symbol);
+CREATE TABLE tags (
+    symbol INTEGER NOT NULL REFERENCES symbols(id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    name TEXT,
+    value TEXT NOT NULL
+);
+CREATE INDEX tags_symbol ON tags(symbol);
+CREATE VIRTUAL TABLE docs USING fts5(desc, notes, tokenize='porter unicode61');
+"""
+COLUMNS = "files.path, symbols.line, symbols.kind, symbols.qualname, symbols.desc"
+
+
+class Symbol(NamedTuple):
+    """
+    @desc a module, class, or function found in the index
+    """
+
+    path: str
+    line: int
+    kind: str
+    qualname: str
+    desc: str
+
+    def render(self) -> str:
+        """
+        @cc 1
+        @desc format this symbol as a line of output
+        @ret the path, line, kind, and name of the symbol, with its description
+        """
+        return f"{self.path}:{self.line}: {self.kind} {self.qualname}: {self.desc}"
+
+
+def connect(path: str, readonly: bool = False) -> "sqlite3.Connection":
+    """
+    @cc 10
+    @desc open an index, creating its tables if it is new or from an older schema
+    @arg path: the file of the index
+    @arg readonly: a flag to open the index for lookups, without ever changing it
+    @ret a connection to the index
+    """
+    import sqlite3
+    from urllib.parse import quote
+
+    if readonly:
+        db = sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True)
+    else:
+        db = sqlite3.connect(path)
+    application = db.execute("PRAGMA application_id").fetchone()[0]
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    rows = db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = [x for (x,) in rows.fetchall()]
+    if tables and application != APPLICATION_ID:
+        db.close()
+        raise sqlite3.DatabaseError(f"{path} is not an archives index")
+    if version != SCHEMA_VERSION and readonly:
+        db.close()
+        raise sqlite3.DatabaseError(f"{path} is out of date, update it with --index")
+    if version != SCHEMA_VERSION:
+        with db:
+            for table in tables:
+                if not table.startswith(("sqlite_", "docs_")):
+                    db.execute(f"DROP TABLE IF EXISTS {table}")
+            db.executescript(SCHEMA)
+            db.execute(f"PRAGMA application_id = {APPLICATION_ID}")
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    db.execute("PRAGMA foreign_keys = ON")
+    return db
+
+
+def module_name(key: str) -> str:
+    """
+    @cc 3
+    @desc get the dotted name of a module from its path
+    @arg key: the path of the module from the root of the project
+    @ret the dotted name, naming packages by their folder
+    """
+    name = key[:-3] if key.endswith(".py") else key
+    if name.endswith("/__init__"):
+        name = name[: -len("/__init__")]
+    return name.replace("/", ".")
+
+
+def insert_module(db: "sqlite3.Connection", file: int, key: str, data: Dict) -> None:
+    """
+    @cc 17
+    @desc insert a serialized module, and everything in it, into the index
+    @arg db: the connection to the index
+    @arg file: the id of the file of the module
+    @arg key: the path of the module from the root of the project
+    @arg data: the serialized module
+    """
+    stack: List[Tuple[Dict, str, Optional[int], str]] = [(data, "module", None, "")]
+    while stack:
+        item, kind, parent, prefix = stack.pop()
+        doc = item["doc"] or dict(desc="", ret="", author="", args={})
+        qualname = module_name(key) if kind == "module" else prefix + item["name"]
+        returns = item.get("returns")
+        symbol = db.execute(
+            "INSERT INTO symbols (file, parent, kind, name, qualname, line, returns, "
+            "complexity, author, desc, ret) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                file,
+                parent,
+                kind,
+                item["name"],
+                qualname,
+                item.get("line", 1),
+                str(returns) if returns else None,
+                item.get("complexity"),
+                doc["author"],
+                doc["desc"],
+                doc["ret"],
+            ),
+        ).lastrowid
+        args = [
+            (x["name"], x["type"] if x["typed"] else None, doc["args"].get(x["name"]))
+            for x in item.get("args", [])
+        ]
+        db.executemany(
+            "INSERT INTO args VALUES (?, ?, ?, ?, ?)",
+            [(symbol, i, *x) for i, x in enumerate(args)],
+        )
+        tags = [(x, None, y) for x in ("note", "warn") for y in doc.get(f"{x}s", [])]
+        tags.extend(("link", x, y) for x, y in doc.get("links", []))
+        db.executemany(
+            "INSERT INTO tags VALUES (?, ?, ?, ?)", [(symbol, *x) for x in tags]
+        )
+        notes = "\n".join(x[2] for x in tags if x[0] != "link")
+        db.execute(
+            "INSERT INTO docs (rowid, desc, notes) VALUES (?, ?, ?)",
+            (symbol, doc["desc"], notes),
+        )
+        prefix = "" if kind == "module" else f"{qualname}."
+        stack.extend(
+            (x, "function", symbol, prefix) for x in reversed(item["functions"])
+        )
+        stack.extend((x, "class", symbol, prefix) for x in reversed(item["classes"]))
+
+
+def remove_file(db: "sqlite3.Connection", file: int) -> None:
+    """
+    @cc 1
+    @desc remove a file, and everything indexed from it
+    @arg db: the connection to the index
+    @arg file: the id of the file
+    """
+    db.execute(
+        "DELETE FROM docs WHERE rowid IN (SELECT id FROM symbols WHERE file = ?)",
+        (file,),
+    )
+    db.execute("DELETE FROM files WHERE id = ?", (file,))
+
+
+def update_index(
+    path: str, files: Iterable[Tuple[str, str]], root: str, skeleton: bool = False
+) -> Tuple[List[str], List[str], List[str]]:
+    """
+    @cc 9
+    @desc index the modules that changed since the last update, by their hash
+    @arg path: the file of the index
+    @arg files: the (key, path) of each module, keyed by its path from the project root
+    @arg root: the root of the project, to find modules that no longer exist
+    @arg skeleton: a flag to skip function bodies, indexing no complexity
+    @ret a tuple of the modules indexed, modules removed, and modules not parsed
+    """
+    import hashlib
+    from archives.archives import parse_source, ParseError
+
+    db = connect(path)
+    indexed, removed, failed = [], [], []
+    with db:
+        rows = db.execute("SELECT path, id, hash FROM files")
+        known = {x: (y, z) for x, y, z in rows.fetchall()}
+        for key, source in files:
+            raw = read_source(source)
+            digest = hashlib.sha256(__version__.encode("utf-8") + raw).hexdigest()
+            file, old_hash = known.pop(key, (None, None))
+            if digest == old_hash:
+                continue
+            try:
+                module = parse_source(raw, source, skeleton)
+            except ParseError:
+                failed.append(key)
+                continue
+            if file is not None:
+                remove_file(db, file)
+            cursor = db.execute(
+                "INSERT INTO files (path, hash) VALUES (?, ?)", (key, digest)
+            )
+            # an insert into a table with a rowid always sets the last one
+            assert cursor.lastrowid is not None
+            insert_module(db, cursor.lastrowid, key, module.serialize())
+            indexed.append(key)
+        # modules that were not listed this time are only dropped once they are gone
+        for key, (file, _) in known.items():
+            if not os.path.isfile(os.path.join(root, key)):
+                remove_file(db, file)
+                removed.append(key)
+    db.close()
+    return indexed, removed, failed
+
+
+def search(path: str, text: str, limit: int = 50) -> List[Symbol]:
+    """
+    @cc 4
+    @desc find the symbols whose description or notes mention every word of some text
+    @arg path: the file of the index
+    @arg text: the words to search for
+    @arg limit: the most symbols to return
+    @ret the matching symbols, best matches first
+    """
+    # each word is quoted, so punctuation is searched for rather than parsed
+    words = " ".join('"{}"'.format(x.replace('"', '""')) for x in text.split())
+    if not words:
+        return []
+    db = connect(path, readonly=True)
+    rows = db.execute(
+        f"SELECT {COLUMNS} FROM docs JOIN symbols ON symbols.id = docs.rowid "
+        "JOIN files ON files.id = symbols.file WHERE docs MATCH ? "
+        "ORDER BY rank LIMIT ?",
+        (words, limit),
+    ).fetchall()
+    db.close()
+    return [Symbol(*x) for x in rows]
+
+
+def lookup(path: str, name: str) -> List[Symbol]:
+    """
+    @cc 2
+    @desc find the symbols with a name, or a qualified name such as Class.method
+    @arg path: the file of the index
+    @arg name: the name to look up
+    @ret the symbols with that name, in order of their path and line
+    """
+    db = connect(path, readonly=True)
+    rows = db.execute(
+        f"SELECT {COLUMNS} FROM symbols JOIN files ON files.id = symbols.file "
+        "WHERE symbols.name = ? OR symbols.qualname = ? "
+        "ORDER BY files.path, symbols.line",
+        (name, name),
+    ).fetchall()
+    db.close()
+    return [Symbol(*x) for x in rows]
@@ -4,10 +4,14 @@
 """
 import click
 import json
-from typing import Dict, List, Union
+import sys
+from typing import Any, Dict, IO, List, Union
 from archives.utils.state import get_state
 
 
+BUFFER_SIZE = 1 << 16
+
+
 def debug(data: Union[str, Dict, List], force: bool = False) -> None:
     """
     @cc 4
@@ -63,3 +67,84 @@ def msg(data: Union[str, Dict, List]) -> None:
         if isinstance(data, (dict, list)):
             data = json.dumps(data, indent=2, sort_keys=True, default=str)
         click.secho(data, fg="blue")
+
+
+class Writer:
+    """
+    @desc a buffered writer for bulk output, only styling text written to a terminal
+    """
+
+    def __init__(
+        self, path: str = None, color: str = None, size: int = BUFFER_SIZE
+    ) -> None:
+        """
+        @cc 3
+        @desc writer constructor
+        @arg path: a file to write to, instead of standard out
+        @arg color: what color to print in, if writing to a terminal
+        @arg size: how many characters to buffer before writing them out
+        """
+        self.path = path
+        self.stream: IO[str] = (
+            open(path, "w", encoding="utf-8")  # pylint: disable=consider-using-with
+            if path
+            else sys.stdout
+        )
+        self.interactive = self.stream.isatty()
+        self.color = color if self.interactive else None
+        self.size = size
+        self.buffer: List[str] = []
+        self.buffered = 0
+
+    def write(self, lines: List[str]) -> None:
+        """
+        @cc 6
+        @desc queue up lines to be written, flushing if the buffer is full
+        @arg lines: the lines of text to write
+        """
+        if self.color:
+            lines = [click.style(x, fg=self.color) for x in lines]
+        self.buffer.extend(lines)
+        self.buffered += sum(len(x) for x in lines)
+        # terminals get each batch right away, pipes and files get big writes
+        if self.interactive or self.buffered >= self.size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        @cc 2
+        @desc write out everything in the buffer
+        """
+        if self.buffer:
+            self.buffer.append("")
+            self.stream.write("\n".join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+        self.stream.flush()
+
+    def close(self) -> None:
+        """
+        @cc 2
+        @desc flush the buffer, closing the output file if there is one
+        """
+        self.flush()
+        if self.path:
+            self.stream.close()
+
+    def __enter__(self) -> "Writer":
+        """
+        @cc 1
+        @desc enter dunder method for use as a context manager
+        @ret this writer
+        """
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        """
+        @cc 1
+        @desc exit dunder method, closing this writer
+        @arg exc_type: the type of exception raised in the context, if any
+        @arg exc_value: the exception raised in the context, if any
+        @arg traceback: the traceback of the exception, if any
+        """
+        self.close()
@@ -0,0 +1,26 @@
+"""
+@author jacobi petrucciani
+@desc helpers for watching files and directories for changes
+"""
+import os
+from typing import Dict, Iterable, Tuple
+
+
+Stamp = Tuple[int, int]
+
+
+def snapshot(paths: Iterable[str]) -> Dict[str, Stamp]:
+    """
+    @cc 3
+    @desc stat the given paths, to compare against a later snapshot
+    @arg paths: the files or directories to stat
+    @ret a dict of the paths that exist to their (mtime in ns, size)
+    """
+    stamps = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stamps[path] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
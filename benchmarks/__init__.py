@@ -0,0 +1,4 @@
+"""
+@author jacobi petrucciani
+@desc benchmarks for archives, run with `python -m benchmarks`
+"""
@@ -0,0 +1,9 @@
+"""
+@author jacobi petrucciani
+@desc entrypoint for running the benchmarks as a module
+"""
+from benchmarks.bench import bench
+
+
+if __name__ == "__main__":
+    bench()  # noqa
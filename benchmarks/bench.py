@@ -0,0 +1,325 @@
+"""
+@author jacobi petrucciani
+@desc time each phase of an archives run over a synthetic corpus
+"""
+import click
+import json
+import re
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from archives.archives import apply_rules, archives, lint
+from archives.globals import ast3, DEFAULT_EXCLUDES, DEFAULT_INCLUDES, FORMATS
+from archives.models.python import Module
+from archives.utils.files import get_python_files
+from archives.utils.state import State
+from archives.utils.text import err, out
+from benchmarks.corpus import generate, Spec
+
+
+BASELINE = Path(__file__).parent / "baseline.json"
+PHASES = ["discovery", "parsing", "models", "rules", "output"]
+DEFAULT = Spec()
+
+
+def build(objects: List) -> int:
+    """
+    @cc 2
+    @desc build every nested model below the given functions and classes
+    @arg objects: a list of Function and Class objects
+    @ret the number of objects built
+    """
+    count = 0
+    while objects:
+        node = objects.pop()
+        objects.extend([*node.functions, *node.classes])
+        count += 1
+    return count
+
+
+def phases(root: Path) -> Tuple[List[Callable[[], None]], Dict]:
+    """
+    @cc 1
+    @desc set up each phase of a lint run, each one working on the last one's results
+    @arg root: the root of the corpus to lint
+    @ret a tuple of (the phases to run in order, the results of the phases)
+    """
+    include, exclude = re.compile(DEFAULT_INCLUDES), re.compile(DEFAULT_EXCLUDES)
+    template = FORMATS["flake8"]
+    state = State()
+    apply_rules(state)
+    results: Dict = {}
+
+    def discovery() -> None:
+        """
+        @cc 1
+        @desc find the files of the corpus
+        """
+        results["files"] = list(get_python_files(root, root, include, exclude))
+
+    def parsing() -> None:
+        """
+        @cc 2
+        @desc read and parse the files of the corpus
+        """
+        results["trees"] = [
+            (str(x), ast3.parse(x.read_text(encoding="utf-8")))
+            for x in results["files"]
+        ]
+
+    def models() -> None:
+        """
+        @cc 3
+        @desc build the models of every module, function, and class
+        """
+        results["modules"] = [Module(x, path) for path, x in results["trees"]]
+        results["objects"] = sum(
+            build([*x.functions, *x.classes]) + len(x.complexities)
+            for x in results["modules"]
+        )
+
+    def rules() -> None:
+        """
+        @cc 3
+        @desc lint every module with the default rules
+        """
+        with click.Context(archives, obj=state):
+            results["issues"] = [x for y in results["modules"] for x in lint(y)]
+
+    def output() -> None:
+        """
+        @cc 2
+        @desc render every issue found in the default format
+        """
+        results["output"] = "\n".join(
+            x.record().render(template) for x in results["issues"]
+        )
+
+    return [discovery, parsing, models, rules, output], results
+
+
+def timings(root: Path, repeat: int) -> Tuple[Dict[str, float], int]:
+    """
+    @cc 4
+    @desc time each phase of a lint run, taking the best of a number of runs
+    @arg root: the root of the corpus to lint
+    @arg repeat: how many times to run each phase
+    @ret a tuple of (the best seconds taken by each phase, the number of files)
+    """
+    best = {x: float("inf") for x in PHASES}
+    for _ in range(repeat):
+        steps, results = phases(root)
+        for name, step in zip(PHASES, steps):
+            start = time.perf_counter()
+            step()
+            best[name] = min(best[name], time.perf_counter() - start)
+    return best, len(results["files"])
+
+
+def reference(repeat: int) -> float:
+    """
+    @cc 3
+    @desc time a fixed pure python workload, to measure the speed of this machine
+    @arg repeat: how many times to run the workload
+    @ret the best seconds taken by the workload
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        counts: Dict[str, int] = {}
+        for i in range(200000):
+            key = f"name{i % 997}"
+            counts[key] = counts.get(key, 0) + len(key)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(root: Path) -> Dict[str, int]:
+    """
+    @cc 2
+    @desc trace the peak memory allocated by each phase of a lint run
+    @arg root: the root of the corpus to lint
+    @ret a dict of each phase to the peak memory it allocated, in bytes
+    """
+    steps, _ = phases(root)
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for name, step in zip(PHASES, steps):
+            # only count what this phase allocates on top of the earlier phases
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            step()
+            peaks[name] = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def regressions(
+    report: Dict, baseline: Dict, tolerance: float, absolute: bool = False
+) -> List[str]:
+    """
+    @cc 6
+    @desc compare a report against a baseline, allowing for some noise
+    @arg report: the results of this benchmark run
+    @arg baseline: the results of a previous benchmark run
+    @arg tolerance: the fraction a result may be worse than the baseline by
+    @arg absolute: a flag to also compare the files/sec, which depend on the machine
+    @ret a list of descriptions of the phases that got worse
+    """
+    found = []
+    for name in PHASES:
+        rate, base_rate = report["relative"][name], baseline["relative"][name]
+        if rate < base_rate * (1 - tolerance):
+            found.append(f"{name}: {rate:.2f} files/reference, was {base_rate:.2f}")
+        rate, base_rate = report["files_per_sec"][name], baseline["files_per_sec"][name]
+        if absolute and rate < base_rate * (1 - tolerance):
+            found.append(f"{name}: {rate:.0f} files/sec, was {base_rate:.0f}")
+        peak, base_peak = report["peak_memory"][name], baseline["peak_memory"][name]
+        if peak > base_peak * (1 + tolerance):
+            found.append(
+                f"{name}: {peak / 2 ** 20:.1f}MB peak, was {base_peak / 2 ** 20:.1f}MB"
+            )
+    return found
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--files",
+    type=click.IntRange(min=1),
+    default=DEFAULT.files,
+    show_default=True,
+    help="number of files to generate",
+)
+@click.option(
+    "--functions",
+    type=click.IntRange(min=1),
+    default=DEFAULT.functions,
+    show_default=True,
+    help="number of functions per file",
+)
+@click.option(
+    "--depth",
+    type=click.IntRange(min=0),
+    default=DEFAULT.depth,
+    show_default=True,
+    help="maximum nesting depth of functions and branches",
+)
+@click.option(
+    "--doc-lines",
+    type=click.IntRange(min=0),
+    default=DEFAULT.doc_lines,
+    show_default=True,
+    help="number of lines of text in each docstring",
+)
+@click.option(
+    "--tag-density",
+    type=click.FloatRange(0, 1),
+    default=DEFAULT.tag_density,
+    show_default=True,
+    help="share of tags and type hints to include",
+)
+@click.option("--seed", type=int, default=DEFAULT.seed, show_default=True)
+@click.option("--repeat", type=click.IntRange(min=1), default=3, show_default=True)
+@click.option(
+    "--baseline",
+    type=click.Path(dir_okay=False),
+    default=str(BASELINE),
+    show_default=True,
+    help="the baseline to compare against",
+)
+@click.option(
+    "--save", is_flag=True, default=False, help="save this run as the baseline"
+)
+@click.option(
+    "--tolerance",
+    type=click.FloatRange(0, 1),
+    default=0.25,
+    show_default=True,
+    help="how much worse than the baseline a phase may be",
+)
+@click.option(
+    "--absolute",
+    is_flag=True,
+    default=False,
+    help="also compare files/sec, only meaningful on the machine of the baseline",
+)
+@click.pass_context
+def bench(
+    ctx: click.Context,
+    files: int,
+    functions: int,
+    depth: int,
+    doc_lines: int,
+    tag_density: float,
+    seed: int,
+    repeat: int,
+    baseline: str,
+    save: bool,
+    tolerance: float,
+    absolute: bool,
+) -> None:
+    """
+    benchmark each phase of archives over a synthetic corpus
+    \f
+    @cc 10
+    @desc the main cli method for the archives benchmarks
+    @arg ctx: the click context arg
+    @arg files: the number of files to generate
+    @arg functions: the number of functions per file
+    @arg depth: the maximum nesting depth of functions and branches
+    @arg doc_lines: the number of lines of text in each docstring
+    @arg tag_density: the share of tags and type hints to include
+    @arg seed: the seed of the corpus generator
+    @arg repeat: how many times to run each phase
+    @arg baseline: the path of the baseline to compare against
+    @arg save: a flag to save this run as the baseline
+    @arg tolerance: how much worse than the baseline a phase may be
+    @arg absolute: a flag to also compare files/sec, not just relative to the reference
+    """
+    spec = Spec(files, functions, depth, doc_lines, tag_density, seed)
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory).resolve()
+        generate(root, spec)
+        seconds, count = timings(root, repeat)
+        peaks = peak_memory(root)
+    # phases are compared by the files they get through in the time of a reference
+    # workload, so that a baseline still holds on a faster or slower machine
+    unit = reference(repeat)
+
+    report = dict(
+        spec=spec._asdict(),
+        files_per_sec={x: round(count / max(seconds[x], 1e-9), 1) for x in PHASES},
+        relative={x: round(count * unit / max(seconds[x], 1e-9), 2) for x in PHASES},
+        peak_memory=peaks,
+    )
+    for name in PHASES:
+        out(
+            f"{name:<10} {seconds[name] * 1000:>9.1f}ms "
+            f"{report['files_per_sec'][name]:>10.0f} files/sec "
+            f"{report['relative'][name]:>9.2f} files/reference "
+            f"{peaks[name] / 2 ** 20:>8.1f}MB peak"
+        )
+
+    path = Path(baseline)
+    if save:
+        path.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        out(f"saved baseline to {path}")
+        ctx.exit(0)
+    if not path.is_file():
+        out(f"no baseline at {path} to compare against")
+        ctx.exit(0)
+    previous = json.loads(path.read_text())
+    if previous["spec"] != report["spec"]:
+        out("the baseline was run with a different corpus, not comparing")
+        ctx.exit(0)
+    if "relative" not in previous:
+        out("the baseline has no timings relative to the reference, not comparing")
+        ctx.exit(0)
+    found = regressions(report, previous, tolerance, absolute)
+    for regression in found:
+        err(f"regression in {regression}")
+    ctx.exit(1 if found else 0)
@@ -0,0 +1,129 @@
+"""
+@author jacobi petrucciani
+@desc a seeded generator of synthetic python trees to benchmark archives against
+"""
+import random
+from pathlib import Path
+from typing import List, NamedTuple
+
+
+FILES_PER_PACKAGE = 20
+WORDS = [
+    "archive",
+    "record",
+    "parse",
+    "module",
+    "value",
+    "index",
+    "token",
+    "buffer",
+    "request",
+    "result",
+]
+
+
+class Spec(NamedTuple):
+    """
+    @desc the shape of a synthetic corpus
+    """
+
+    files: int = 500
+    functions: int = 10
+    depth: int = 3
+    doc_lines: int = 3
+    tag_density: float = 0.8
+    seed: int = 0
+
+
+def docstring(rng: random.Random, spec: Spec, pad: str, args: List[str]) -> List[str]:
+    """
+    @cc 6
+    @desc generate a docstring of filler text and a share of the archives tags
+    @arg rng: the seeded random generator to use
+    @arg spec: the shape of the corpus
+    @arg pad: the indentation of the docstring
+    @arg args: the arguments of the function being documented
+    @ret the lines of the docstring
+    """
+    lines = [f'{pad}"""']
+    for _ in range(spec.doc_lines):
+        lines.append(pad + " ".join(rng.choice(WORDS) for _ in range(8)))
+    tags = [f"@cc {rng.randint(1, 5)}", "@desc a generated function"]
+    tags.extend(f"@arg {x}: a generated argument" for x in args)
+    tags.append("@ret a generated value")
+    lines.extend(pad + x for x in tags if rng.random() < spec.tag_density)
+    lines.append(f'{pad}"""')
+    return lines
+
+
+def function(
+    rng: random.Random, spec: Spec, name: str, indent: int, depth: int
+) -> List[str]:
+    """
+    @cc 8
+    @desc generate a function with branches and nested functions up to a depth
+    @arg rng: the seeded random generator to use
+    @arg spec: the shape of the corpus
+    @arg name: the name of the function
+    @arg indent: the indentation level of the function
+    @arg depth: how many more levels of nesting are allowed below this function
+    @ret the lines of the function
+    """
+    pad = "    " * indent
+    args = [f"{rng.choice(WORDS)}_{i}" for i in range(rng.randint(0, 4))]
+    typed = rng.random() < spec.tag_density
+    signature = ", ".join(f"{x}: int" if typed else x for x in args)
+    returns = " -> int" if typed else ""
+    lines = [f"{pad}def {name}({signature}){returns}:"]
+    lines.extend(docstring(rng, spec, pad + "    ", args))
+    inner = indent + 1
+    if depth and rng.random() < 0.5:
+        lines.extend(function(rng, spec, f"{name}_inner", inner, depth - 1))
+    for level in range(rng.randint(0, depth)):
+        lines.append(f"{'    ' * inner}if {len(args) + level} > {level}:")
+        inner += 1
+    lines.append(f"{'    ' * inner}return {len(args)}")
+    return lines
+
+
+def module(rng: random.Random, spec: Spec, index: int) -> str:
+    """
+    @cc 6
+    @desc generate a module of functions, with some of them as methods of a class
+    @arg rng: the seeded random generator to use
+    @arg spec: the shape of the corpus
+    @arg index: the number of the module, to name it with
+    @ret the source code of the module
+    """
+    lines = ['"""', "@author archives benchmarks", f"@desc module {index}", '"""']
+    in_class = False
+    for i in range(spec.functions):
+        if not in_class and rng.random() < 0.2:
+            lines.extend(["", "", f"class Thing{i}:"])
+            lines.extend(['    """', "    @desc a generated class", '    """'])
+            in_class = True
+        elif in_class and rng.random() < 0.3:
+            in_class = False
+        lines.append("")
+        lines.extend(function(rng, spec, f"func_{i}", int(in_class), spec.depth))
+    return "\n".join(lines) + "\n"
+
+
+def generate(root: Path, spec: Spec) -> List[Path]:
+    """
+    @cc 2
+    @desc write a synthetic tree of python packages, the same every time for a spec
+    @arg root: the directory to write the corpus into
+    @arg spec: the shape of the corpus
+    @ret the paths of the modules that were written
+    """
+    rng = random.Random(spec.seed)
+    files = []
+    for index in range(spec.files):
+        package = root / f"pkg_{index // FILES_PER_PACKAGE // 10}"
+        package /= f"sub_{index // FILES_PER_PACKAGE}"
+        package.mkdir(parents=True, exist_ok=True)
+        path = package / f"mod_{index}.py"
+        path.write_text(module(rng, spec, index), encoding="utf-8")
+        files.append(path)
+    return files
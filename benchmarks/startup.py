@@ -0,0 +1,108 @@
+"""
+@author jacobi petrucciani
+@desc time how long archives takes to start for commands that never parse a file
+"""
+import click
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+from archives.utils.text import err, out
+
+
+COMMANDS = [["--version"], ["--list-rules"], ["--list-tags"]]
+# modules that only commands which lint or document files should import
+HEAVY = [
+    "archives.models.python",
+    "radon",
+    "pathspec",
+    "concurrent.futures",
+    "multiprocessing",
+    "cProfile",
+    "sqlite3",
+]
+RUN = "from archives.archives import archives; archives()"
+
+
+def wall_time(code: str, args: List[str], repeat: int) -> float:
+    """
+    @cc 2
+    @desc time a fresh interpreter running some code, taking the median of some runs
+    @arg code: the code for the interpreter to run
+    @arg args: the command line arguments to pass to the code
+    @arg repeat: how many times to run it
+    @ret the median seconds taken from start to exit
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code, *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def imports(args: List[str]) -> Dict[str, int]:
+    """
+    @cc 4
+    @desc run an archives command under python -X importtime
+    @arg args: the command line arguments to run archives with
+    @ret a dict of each module imported to its cumulative import time, in microseconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", RUN, *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            modules[parts[2].strip()] = int(parts[1])
+    return modules
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option("--repeat", type=click.IntRange(min=1), default=10, show_default=True)
+@click.option(
+    "--target",
+    type=click.FloatRange(min=0),
+    default=50.0,
+    show_default=True,
+    help="the most milliseconds each command may take to start and exit",
+)
+@click.pass_context
+def startup(ctx: click.Context, repeat: int, target: float) -> None:
+    """
+    check that commands which never parse a file start fast and import little
+    \f
+    @cc 8
+    @desc the cli method for the archives startup benchmark
+    @arg ctx: the click context arg
+    @arg repeat: how many times to run each command
+    @arg target: the most milliseconds each command may take
+    """
+    floor = wall_time("import click", [], repeat) * 1000
+    out(f"{'click':<14} {floor:>7.1f}ms, the floor for any click cli")
+    failed = False
+    for args in COMMANDS:
+        name = " ".join(args)
+        seconds = wall_time(RUN, args, repeat) * 1000
+        modules = imports(args)
+        own = (modules.get("archives", 0) - modules.get("click", 0)) / 1000
+        out(f"{name:<14} {seconds:>7.1f}ms, {own:.1f}ms importing archives")
+        loaded = [x for x in HEAVY if x in modules]
+        if loaded:
+            err(f"{name} imported {', '.join(loaded)}")
+        if loaded or seconds > target:
+            failed = True
+    ctx.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    startup()  # noqa
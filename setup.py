@@ -30,8 +30,9 @@ setup(
     url=f"{__user__}/{__library__}.git",
     download_url=f"{__user__}/{__library__}.git",
     license="MIT",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "tests"]),
     install_requires=INSTALL_REQUIRES,
+    extras_require={"gitignore": ["pathspec>=0.10.0"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.6",
@@ -42,6 +43,13 @@ setup(
         "Programming Language :: Python :: Implementation :: CPython",
         "Programming Language :: Python :: Implementation :: PyPy",
     ],
-    entry_points={"console_scripts": ["archives=archives.archives:archives"]},
+    entry_points={
+        "console_scripts": [
+            "archives=archives.archives:archives",
+            "archivesd=archives.daemon:archivesd",
+            "archives-client=archives.client:main",
+            "archives-lsp=archives.lsp:archives_lsp",
+        ]
+    },
     zip_safe=False,
 )
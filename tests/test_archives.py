@@ -1,12 +1,42 @@
 """
 tests for archives
 """
+import click
+import importlib
+import io
 import json
+import os
+import pstats
+import pytest
+import re
+import sqlite3
+import stat
+import subprocess
+import threading
 from click.testing import CliRunner
-from archives import archives
+from radon import visitors
+from radon.complexity import cc_visit_ast
+from archives import archives, client, daemon, lsp, Linter, ParseError
+from archives.globals import ast3, DEFAULT_EXCLUDES, DEFAULT_INCLUDES
+from archives.models import python
+from archives.models.rules import Record
+from archives.models.tags import str_tag, Tags
+from archives.site import build_site, listings
+from archives.utils.cache import CACHE_DIR, ModelCache
+from archives.utils import files
+from archives.utils.files import get_python_files
+from archives.utils.state import State
+from archives.utils.symbols import lookup, search, update_index
+from archives.utils.text import Writer
+from benchmarks.bench import bench, regressions
+from benchmarks.corpus import generate, Spec
+from benchmarks.startup import startup
 from typing import Callable, List
 
 
+cli = importlib.import_module("archives.archives")
+
+
 def run(function: Callable, args: List = None):
     """helper to run archives commands"""
     runner = CliRunner()
@@ -43,6 +73,177 @@ def test_doc_gen():
     # assert data["test.py"]["functions"][0]["returns"] == "Union[int, float, str]"
 
 
+def test_doc_streaming():
+    """test streaming doc formats, keyed by path from the project root"""
+    keys = ["extra/test.py", "archives/__init__.py", "archives/rules/__init__.py"]
+    paths = [f"./{x}" for x in keys]
+    result = run(archives, ["--doc", "--doc-format", "ndjson", *paths])
+    assert result.exit_code == 0
+    records = [json.loads(x) for x in result.output.splitlines()]
+    assert [x["path"] for x in records] == keys
+    result = run(archives, ["--doc", "--doc-format", "json-compact", *paths])
+    assert result.exit_code == 0
+    data = json.loads(result.output)
+    assert list(data) == keys
+    assert data == {x["path"]: x["module"] for x in records}
+    pretty = json.loads(run(archives, ["--doc", paths[0]]).output)
+    assert data["extra/test.py"] == pretty["test.py"]
+
+
+def test_doc_streaming_errors(tmp_path):
+    """test that modules which fail to parse never leave partial json behind"""
+    first, bad, last = tmp_path / "a.py", tmp_path / "b.py", tmp_path / "c.py"
+    for good in [first, last]:
+        good.write_text('"""\n@desc good\n"""\n')
+    bad.write_text("def broken(:\n")
+    paths = [str(first), str(bad), str(last)]
+    for doc_format in ["ndjson", "json-compact"]:
+        args = ["--doc", "--doc-format", doc_format]
+        result = run(archives, [*args, "--ignore-exceptions", *paths])
+        assert result.exit_code == 0
+        assert "error in parsing" in result.stderr
+        if doc_format == "ndjson":
+            lines = [json.loads(x) for x in result.stdout.splitlines()]
+            assert len(lines) == 2
+        else:
+            assert len(json.loads(result.stdout)) == 2
+        assert run(archives, [*args, *paths]).exit_code == 1
+    result = run(archives, ["--doc", "--doc-format", "json-compact", str(bad)])
+    assert json.loads(result.stdout) == {}
+
+
+def test_doc_html(tmp_path):
+    """test the html site only re-renders the pages a change affects"""
+    src, site = tmp_path / "src", str(tmp_path / "site")
+    (src / "pkg").mkdir(parents=True)
+    sources = dict(
+        top='"""\n@desc top\n"""\n',
+        hidden='"""\n@nodoc\n"""\n',
+        **{"pkg/a": '"""\n@desc a\n"""\n\n\ndef f(x: int) -> int:\n    return x\n'},
+        **{"pkg/b": '"""\n@desc b\n"""\n\n\ndef g():\n    """\n    @nodoc\n    """\n'},
+    )
+    for name, text in sources.items():
+        (src / f"{name}.py").write_text(text)
+
+    def build():
+        """build the site from everything left in src"""
+        files = [(x.relative_to(src).as_posix(), str(x)) for x in src.rglob("*.py")]
+        return build_site(sorted(files), site, 2)
+
+    assert build() == (["hidden.py", "pkg/a.py", "pkg/b.py", "top.py"], ["", "pkg"], [])
+    assert not (tmp_path / "site" / "hidden.py.html").exists()
+    assert "def g" not in (tmp_path / "site" / "pkg" / "b.py.html").read_text()
+    assert build() == ([], [], [])
+    (src / "pkg" / "a.py").write_text(sources["pkg/a"] + "    # changed\n")
+    assert build() == (["pkg/a.py"], [], [])
+    (src / "pkg" / "a.py").write_text(sources["pkg/a"].replace("@desc a", "@desc new"))
+    assert build() == (["pkg/a.py"], ["pkg"], [])
+    (src / "pkg" / "b.py").unlink()
+    (src / "top.py").write_text("def broken(:\n")
+    assert build() == ([], ["pkg"], ["top.py"])
+    assert not (tmp_path / "site" / "pkg" / "b.py.html").exists()
+    assert (tmp_path / "site" / "top.py.html").exists()
+    result = run(archives, ["--doc-html", site, "./extra/test.py"])
+    assert result.exit_code == 0
+    assert (tmp_path / "site" / "extra" / "test.py.html").exists()
+
+
+def test_doc_html_outside_root(tmp_path, monkeypatch):
+    """test that pages of sources outside the project root stay inside the site"""
+    site = tmp_path / "site"
+    (tmp_path / "root").mkdir()
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "b.py").write_text('"""\n@desc b\n"""\n')
+    monkeypatch.setattr(cli, "find_project_root", lambda src: tmp_path / "root")
+    result = run(archives, ["--doc-html", str(site), str(tmp_path / "other" / "b.py")])
+    assert result.exit_code == 0
+    key = (tmp_path / "other" / "b.py").relative_to("/").as_posix()
+    assert (site / f"{key}.html").exists()
+    assert not (tmp_path / "other" / "b.py.html").exists()
+    assert set(listings({"/tmp/x.py": dict(page="x", desc="")})) == {"", "/", "/tmp"}
+    with pytest.raises(ValueError):
+        build_site([("../escape.py", str(tmp_path / "other" / "b.py"))], str(site))
+
+
+def test_index(tmp_path):
+    """test the sqlite index only re-indexes changed files, and answers lookups"""
+    src, db = tmp_path / "src", str(tmp_path / "index.db")
+    (src / "pkg").mkdir(parents=True)
+    (src / "pkg" / "__init__.py").write_text('"""\n@desc the package\n"""\n')
+    (src / "pkg" / "a.py").write_text(
+        'class Walker:\n    """\n    @desc walks trees\n    """\n\n'
+        '    def walk(self, tree: str) -> int:\n        """\n'
+        "        @desc walk every branch of a tree\n        @note leaves are skipped\n"
+        '        @arg tree: the tree\n        """\n'
+    )
+
+    def update():
+        """index everything in src"""
+        files = [(x.relative_to(src).as_posix(), str(x)) for x in src.rglob("*.py")]
+        return update_index(db, sorted(files), str(src))
+
+    assert update() == (["pkg/__init__.py", "pkg/a.py"], [], [])
+    assert update() == ([], [], [])
+    walk = [("pkg/a.py", 6, "function", "Walker.walk", "walk every branch of a tree")]
+    assert search(db, "leaves") == search(db, "walking branches") == walk
+    assert lookup(db, "walk") == lookup(db, "Walker.walk") == walk
+    assert lookup(db, "pkg")[0].desc == "the package"
+    (src / "pkg" / "__init__.py").unlink()
+    (src / "pkg" / "a.py").write_text("def broken(:\n")
+    assert update() == ([], ["pkg/__init__.py"], ["pkg/a.py"])
+    assert lookup(db, "walk") == walk and lookup(db, "pkg") == []
+
+    result = run(archives, ["--index", "--index-file", db, "./extra/general.py"])
+    assert result.exit_code == 0
+    result = run(archives, ["--index-file", db, "--symbol", "GoodClass.func"])
+    assert result.output.startswith("extra/general.py:41: function GoodClass.func")
+    assert run(archives, ["--index-file", db, "--query", "nothing"]).exit_code == 1
+    missing = str(tmp_path / "missing.db")
+    assert run(archives, ["--index-file", missing, "--query", "x"]).exit_code == 2
+
+    # other sqlite files are never rebuilt, by an update or by a lookup
+    other = str(tmp_path / "other.db")
+    with sqlite3.connect(other) as connection:
+        connection.execute("CREATE TABLE files (name TEXT)")
+        connection.execute("INSERT INTO files VALUES ('kept')")
+    connection.close()
+    lookups = [["--symbol", "x"], ["--query", "x"]]
+    for args in [["--index", "./extra/general.py"], *lookups]:
+        result = run(archives, ["--index-file", other, *args])
+        assert result.exit_code == 2
+        assert "is not an archives index" in result.output
+    with sqlite3.connect(other) as connection:
+        assert connection.execute("SELECT name FROM files").fetchall() == [("kept",)]
+    connection.close()
+
+
+def test_encoding(tmp_path):
+    """test that modules are read in the encoding of their coding cookie"""
+    latin = tmp_path / "latin.py"
+    latin.write_bytes(
+        '# -*- coding: latin-1 -*-\n"""\n@desc caf\xe9\n"""\n'.encode("latin-1")
+    )
+    result = run(archives, ["--doc", str(latin)])
+    assert result.exit_code == 0
+    assert json.loads(result.output)["latin.py"]["doc"]["desc"] == "caf\xe9"
+    skeleton = cli.parse_source(latin.read_bytes(), "latin.py", True)
+    assert skeleton.skeleton and skeleton.doc.desc == "caf\xe9"
+
+    # bytes invalid in their encoding are replaced rather than failing the module
+    broken = '"""\n@desc broken\n"""\n# \xff\n'.encode("latin-1")
+    assert cli.parse_source(broken, "broken.py").doc.desc == "broken"
+    assert files.decode_source(broken).endswith("# \ufffd\n")
+
+    assert files.read_source(str(latin)) == latin.read_bytes()
+    crlf = "# -*- coding: latin-1 -*-\r\nname = 'caf\xe9'\r\n".encode("latin-1")
+    assert files.decode_bytes(crlf) == (
+        "# -*- coding: latin-1 -*-\nname = 'caf\xe9'\n",
+        "iso-8859-1",
+        "\r\n",
+    )
+    assert files.decode_bytes(b"") == ("", "utf-8", "\n")
+
+
 def test_no_lint():
     """test doc flag"""
     result = run(archives, ["./extra/no_lint.py"])
@@ -56,3 +257,633 @@ def test_archives_self():
     result = run(archives, ["--disable", "F103", "./archives/"])
     assert result.exit_code == 0
     assert "0 issues found" in result.output
+
+
+def test_jobs():
+    """test that linting across worker processes matches a serial run"""
+    serial = run(archives, ["--stats", "./extra/"])
+    parallel = run(archives, ["--stats", "--jobs", "2", "./extra/"])
+    assert parallel.exit_code == serial.exit_code == 1
+    assert parallel.output == serial.output
+    assert "9 functions (1 nolint)" in parallel.output
+
+
+def test_jobs_invalid():
+    """test that a bad jobs value is rejected"""
+    result = run(archives, ["--jobs", "none", "./extra/"])
+    assert result.exit_code == 2
+    assert "invalid number of jobs" in result.output
+
+
+def test_cache(tmp_path):
+    """test that warm runs are served from the result cache"""
+    cache_dir = tmp_path / "cache"
+    args = ["--stats", "--cache-dir", str(cache_dir), "./extra/"]
+    cold = run(archives, args)
+    assert len(list(cache_dir.iterdir())) == 3
+    warm = run(archives, args)
+    assert warm.exit_code == cold.exit_code == 1
+    assert warm.output == cold.output
+
+
+def test_cache_size(tmp_path):
+    """test that the cache evicts entries beyond its size"""
+    cache_dir = tmp_path / "cache"
+    run(archives, ["--cache-dir", str(cache_dir), "--cache-size", "1", "./extra/"])
+    assert len(list(cache_dir.iterdir())) == 1
+
+
+def test_no_cache(tmp_path):
+    """test that the cache can be disabled"""
+    cache_dir = tmp_path / "cache"
+    run(archives, ["--no-cache", "--cache-dir", str(cache_dir), "./extra/"])
+    assert not cache_dir.exists()
+
+
+def test_cache_root(tmp_path, monkeypatch):
+    """test that the cache is only kept at a project root that is a git checkout"""
+    (tmp_path / "module.py").write_text('"""\n@desc a module\n"""\n')
+    monkeypatch.setattr(cli, "find_project_root", lambda src: tmp_path)
+    run(archives, [str(tmp_path)])
+    assert not (tmp_path / CACHE_DIR).exists()
+    (tmp_path / ".git").mkdir()
+    run(archives, [str(tmp_path)])
+    assert (tmp_path / CACHE_DIR).is_dir()
+
+
+def test_diff(tmp_path):
+    """test that only changed objects are linted against a git ref"""
+    source = tmp_path / "diffed.py"
+    source.write_text(
+        '"""\n@author a\n@desc a module\n"""\n\n\n'
+        "def first(x):\n    return 1\n\n\ndef second(x):\n    return 2\n"
+    )
+    (tmp_path / "other.py").write_text("def third(x):\n    return 3\n")
+    git = ["git", "-c", "user.name=a", "-c", "user.email=a@b.c"]
+    subprocess.run([*git, "init", "-q"], cwd=tmp_path, check=True)
+    subprocess.run([*git, "add", "."], cwd=tmp_path, check=True)
+    subprocess.run([*git, "commit", "-qm", "init"], cwd=tmp_path, check=True)
+    source.write_text(source.read_text().replace("return 2", "return 22"))
+
+    result = run(archives, ["--no-cache", "--diff", "HEAD", str(tmp_path)])
+    assert result.exit_code == 1
+    assert "'second'" in result.output
+    assert "'first'" not in result.output
+    assert "third" not in result.output
+
+
+def test_git(tmp_path, monkeypatch):
+    """test that files unchanged from the git index are looked up by their blob id"""
+    for name in ["a.py", "b.py", "gone.py", "pkg/c.py"]:
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text("def foo():\n    pass\n")
+    git = ["git", "-c", "user.name=a", "-c", "user.email=a@b.c"]
+    subprocess.run([*git, "init", "-q"], cwd=tmp_path, check=True)
+    subprocess.run([*git, "add", "."], cwd=tmp_path, check=True)
+    subprocess.run([*git, "commit", "-qm", "init"], cwd=tmp_path, check=True)
+    (tmp_path / "b.py").write_text("def bar():\n    pass\n")
+    (tmp_path / "new.py").write_text("def baz():\n    pass\n")
+    # deleted from the working tree, but not yet from the index
+    (tmp_path / "gone.py").unlink()
+    args = ["--git", "--cache-dir", str(tmp_path / "cache"), str(tmp_path)]
+    first = run(archives, args)
+    assert first.exit_code == 1 and "gone.py" not in first.output
+
+    blobs = {}
+    lint_file = cli.lint_file
+
+    def tracked(filename, options, blob=None):
+        blobs[filename.rsplit("/", 1)[-1]] = blob
+        return lint_file(filename, options, blob)
+
+    monkeypatch.setattr(cli, "lint_file", tracked)
+    monkeypatch.setattr(cli, "parse_module", None)
+    second = run(archives, args)
+    assert second.exit_code == 1
+    assert second.output == first.output
+    assert list(blobs) == ["a.py", "b.py", "new.py", "c.py"]
+    assert blobs["a.py"] and blobs["c.py"]
+    assert blobs["b.py"] is None and blobs["new.py"] is None
+    assert "c.py:1:0: F100 function 'foo' missing docstring" in second.output
+
+
+def test_lazy_complexity(monkeypatch):
+    """test that complexity is not computed when its rules are disabled"""
+
+    def explode(*args):
+        """radon should never be called"""
+        raise AssertionError("complexity was computed")
+
+    monkeypatch.setattr(visitors, "ComplexityVisitor", explode)
+    result = run(archives, ["--no-cache", "--disable", "F102,F103", "./extra/"])
+    assert result.exit_code == 1
+    assert "issues found" in result.output
+
+
+def test_rule_set():
+    """test that disabled rules are compiled out of the dispatch tables once"""
+    rules = cli.compile_rules(("F100", "A101"), False)
+    assert rules is cli.compile_rules(("F100", "A101"), False)
+    assert rules.disabled == frozenset(["F100", "A101"])
+    assert "F100" not in rules.codes() and "A101" not in rules.codes()
+    assert {"M100", "C100", "F101", "A100", "A102"} <= set(rules.codes())
+    assert [x.code for x, _ in rules.args] == ["A100", "A102"]
+
+    result = run(archives, ["--no-cache", "--disable", "A100,A102", "./extra/"])
+    assert result.exit_code == 1
+    assert " A101 " in result.output
+    assert " A100 " not in result.output and " A102 " not in result.output
+
+
+def test_skeleton():
+    """test that a skeleton parse lints and documents the same as a full parse"""
+    state = State()
+    state.disable_list = ["F102", "F103"]
+    cli.apply_rules(state)
+    assert not state.rules.measures and cli.compile_rules((), False).measures
+    source = '"doc" \\\n"more"\ndef f(a,\nb: int = (1,\n2)) -> int:\n    x = [\n1]\n'
+    source += "    return x\n@dec\nclass A:\n\n    # comment\n    def m(self): pass\n"
+    source += '    async def n(self):\n        """@desc n"""\n    @property\n'
+    source += '    def p(self) -> int:\n        ("@desc joined "\n         "doc")\n'
+    source += "        def hidden(): pass\n        return 1\n"
+    source += "if True:\n    def g(): ...\n"
+    source += 'def h():\n    print("#")\ndef k():\n\t"""tabs"""\n\treturn 1  # end\n'
+    full = cli.parse_source(source, "x.py")
+    skeleton = cli.parse_source(source, "x.py", True)
+    assert skeleton.skeleton and not full.skeleton
+    assert [x.record() for x in cli.lint(full, state)] == [
+        x.record() for x in cli.lint(skeleton, state)
+    ]
+    assert skeleton.end_line == full.end_line == 28
+    assert [x.end_line for x in skeleton.functions] == [8, 25, 28]
+    doc = skeleton.serialize()
+    assert doc["classes"][0]["functions"][1]["doc"]["desc"] == "joined doc"
+    assert doc["functions"][0]["complexity"] is None
+    assert full.serialize()["functions"][0]["complexity"] == 1
+
+    # bodies are left out, but syntax errors in them are still found
+    for broken in ["def f(:\n", "def f():\n    x = (\n", "def f():\n    x = = 1\n"]:
+        with pytest.raises(ParseError):
+            cli.parse_source(broken, "x.py", True)
+
+    # a form feed in an indent resets it, rather than ending the class
+    source = 'class A:\n    """@desc a"""\n\f\n    def f(self):\n        pass\n'
+    source += "\f    def g(self):\n        pass\n"
+    full = cli.parse_source(source, "x.py")
+    skeleton = cli.parse_source(source, "x.py", True)
+    assert skeleton.skeleton and [x.name for x in skeleton.classes[0].functions] == [
+        "f",
+        "g",
+    ]
+    assert [x.record() for x in cli.lint(full, state)] == [
+        x.record() for x in cli.lint(skeleton, state)
+    ]
+
+
+def test_empty_module(tmp_path):
+    """test that an empty module is reported as missing its docstring"""
+    for skeleton in [False, True]:
+        module = cli.parse_source("", "empty.py", skeleton)
+        assert module.doc is None and module.end_line == 0
+    (tmp_path / "empty.py").write_text("")
+    result = run(archives, ["--no-cache", str(tmp_path / "empty.py")])
+    assert result.exit_code == 1
+    assert "empty.py:0:0: M100" in result.output
+
+
+def test_linter(tmp_path):
+    """test that the linter api keeps its own state and raises on parse errors"""
+    linter = Linter(disable=["M102"])
+    source = '"""\n@desc a module\n"""\ndef foo(x: int):\n    """\n    @cc 1\n'
+    source += '    @desc foo\n    @arg x: a number\n    """\n    return x\n'
+    records = linter.lint_source(source, "foo.py")
+    assert [x.code for x in records] == ["F104", "F106"]
+    assert linter.render(records) == [
+        "foo.py:4:0: F104 function 'foo' missing @ret tag",
+        "foo.py:4:0: F106 function 'foo' has no return type",
+    ]
+    linter.lint_source(source, "foo.py")
+    assert linter.counters["module_count"] == 2
+    assert linter.counters["function_count"] == 2
+    linter.reset()
+    assert linter.counters["module_count"] == 0
+
+    with pytest.raises(ParseError):
+        linter.lint_source("def broken(:\n", "broken.py")
+    with pytest.raises(ValueError):
+        Linter(output_format="nope")
+    with pytest.raises(FileNotFoundError):
+        linter.lint_paths([tmp_path / "missing"])
+
+    records = linter.lint_paths(["./extra/", "./extra/general.py"])
+    expected = run(archives, ["--no-cache", "--disable", "M102", "./extra/"])
+    assert linter.render(records) == expected.output.splitlines()[:-3]
+
+    (tmp_path / "broken.py").write_text("def broken(:\n")
+    result = run(archives, ["--no-cache", "--ignore-exceptions", str(tmp_path)])
+    assert result.exit_code == 0
+    assert "error in parsing" in result.output
+
+
+def test_lsp():
+    """test that the language server re-lints only the function that changed"""
+
+    def frame(message):
+        """frame a message for the server"""
+        body = json.dumps(dict(jsonrpc="2.0", **message)).encode("utf-8")
+        return f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+
+    def diagnostics(output):
+        """read the codes of the diagnostics published for each lint"""
+        output.seek(0)
+        published = []
+        for message in iter(lambda: lsp.read_message(output), None):
+            if message.get("method") == "textDocument/publishDiagnostics":
+                found = message["params"]["diagnostics"]
+                starts = [x["range"]["start"]["line"] + 1 for x in found]
+                published.append(list(zip(starts, [x["code"] for x in found])))
+        return published
+
+    uri = "file:///tmp/doc.py"
+    first = open("extra/general.py").read()
+    lines = first.splitlines()
+    body = next(i for i, x in enumerate(lines) if x.startswith("    return")) + 1
+    second = "\n".join([*lines[:body], "    x = 1", "    x += 1", *lines[body:]])
+    opened = dict(textDocument=dict(uri=uri, text=first))
+    changed = dict(textDocument=dict(uri=uri), contentChanges=[dict(text=second)])
+
+    output = io.BytesIO()
+    state = State()
+    cli.apply_rules(state)
+    server = lsp.Server(state, output, 0)
+    server.handle(dict(method="textDocument/didOpen", params=opened))
+    server.handle(dict(method="textDocument/didChange", params=changed))
+    server.flush()
+    assert server.partial_lints == 1
+    fresh = dict(textDocument=dict(uri="file:///tmp/fresh.py", text=second))
+    server.handle(dict(method="textDocument/didOpen", params=fresh))
+    published = diagnostics(output)
+    assert len(published) == 3
+    assert published[1] == published[2] != published[0]
+    assert len(published[0]) == len(Linter().lint_source(first))
+    record = Record("x.py", 9, 0, "A102", "untyped arg '<Arg[a](line:9)>'", 12)
+    moved = lsp.shift(record, 5, 2)
+    assert (moved.line, moved.end_line) == (11, 14)
+    assert moved.text == "untyped arg '<Arg[a](line:11)>'"
+
+    changed["contentChanges"] = [dict(text="def broken(:\n")]
+    messages = [
+        dict(id=1, method="initialize", params={}),
+        dict(method="textDocument/didOpen", params=opened),
+        dict(method="textDocument/didChange", params=changed),
+        dict(id=2, method="shutdown"),
+        dict(method="exit"),
+    ]
+    output = io.BytesIO()
+    server = lsp.Server(state, output, 0)
+    assert server.serve(io.BytesIO(b"".join(frame(x) for x in messages))) == 0
+    assert diagnostics(output)[-1] == [(1, "E999")]
+    output.seek(0)
+    assert lsp.read_message(output)["result"]["capabilities"]
+
+
+def test_module_complexity():
+    """test that module wide complexity matches radon's per function results"""
+    source = (
+        '"""module"""\n'
+        "def outer(x):\n"
+        "    if x:\n"
+        "        x += 1\n"
+        "    def inner(y):\n"
+        "        return y and x or y\n"
+        "    class Nested:\n"
+        "        def method(self):\n"
+        "            return [z for z in range(3) if z]\n"
+        "    return inner\n"
+        "class Top:\n"
+        "    def method(self, x):\n"
+        "        for _ in x:\n"
+        "            assert x\n"
+    )
+    tree = ast3.parse(source)
+    expected = {
+        x.lineno: cc_visit_ast(x)[0].complexity
+        for x in ast3.walk(tree)
+        if isinstance(x, ast3.FunctionDef)
+    }
+    module = python.Module(tree, "complexity.py")
+    functions = [*module.functions, *module.classes[0].functions]
+    functions.extend(module.functions[0].functions)
+    functions.extend(module.functions[0].classes[0].functions)
+    assert len(functions) == 4
+    for function in functions:
+        assert function.complexity == expected[function.line]
+
+
+def test_custom_tag():
+    """test that registered custom tags are parsed from docstrings"""
+    since = Tags.register(str_tag("since", "denote the version something was added"))
+    try:
+        source = '"""\n@desc a module\n@since 1.2.0\n"""\n'
+        doc = python.Module(ast3.parse(source), "since.py").doc
+        assert doc.desc == "a module"
+        assert doc.first(since, "") == "1.2.0"
+        assert since in Tags.all()
+    finally:
+        delattr(Tags, "SINCE")
+        Tags._registry = None  # pylint: disable=protected-access
+
+
+def test_streaming(monkeypatch):
+    """test that each file's issues are written before the next file is linted"""
+    events = []
+    lint_file = cli.lint_file
+    write = Writer.write
+
+    def tracked_lint_file(filename, options, blob=None):
+        """record each file being linted"""
+        events.append("lint")
+        return lint_file(filename, options, blob)
+
+    def tracked_write(writer, lines):
+        """record each batch of lines being written"""
+        events.append("out")
+        write(writer, lines)
+
+    monkeypatch.setattr(cli, "lint_file", tracked_lint_file)
+    monkeypatch.setattr(Writer, "write", tracked_write)
+    result = run(archives, ["--no-cache", "./extra/general.py", "./extra/test.py"])
+    assert result.exit_code == 1
+    assert events[:2] == ["lint", "out"]
+    assert events.count("lint") == 2
+    assert events.index("lint", 1) > events.index("out")
+
+
+def test_output_file(tmp_path):
+    """test that issues can be written straight to a file"""
+    output = tmp_path / "issues.txt"
+    result = run(archives, ["--no-cache", "--output", str(output), "./extra/"])
+    assert result.exit_code == 1
+    issues = output.read_text().splitlines()
+    assert len(issues) == 52
+    assert all("extra/" in x for x in issues)
+    assert "extra/" not in result.output
+    assert "52 issues found" in result.output
+
+
+def test_release_ast():
+    """test that models drop their AST once everything is extracted from it"""
+    source = '"""module"""\ndef outer(x):\n    def inner(y):\n        return y\n'
+    module = python.Module(ast3.parse(source), "release.py")
+    outer = module.functions[0]
+    assert not module.classes
+    assert outer.functions[0].name == "inner"
+    assert not outer.classes
+    assert outer._node is None  # pylint: disable=protected-access
+    assert outer.complexity == 1
+    assert module._body is None  # pylint: disable=protected-access
+    assert not hasattr(outer, "__dict__")
+
+
+def test_daemon(tmp_path, monkeypatch):
+    """test that archives-client runs archives through archivesd"""
+    address = str(tmp_path / "archivesd.sock")
+    monkeypatch.setattr(cli, "MODELS", ModelCache())
+    server = daemon.make_server(address)
+    assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        expected = run(archives, ["--no-cache", "./extra/"])
+        for _ in range(2):
+            stdout, stderr = io.StringIO(), io.StringIO()
+            code = client.run(["./extra/"], address, stdout, stderr)
+            assert code == expected.exit_code == 1
+            assert stdout.getvalue() == expected.output
+        assert len(cli.MODELS.entries) == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_daemon_cwd(tmp_path, monkeypatch):
+    """test that archivesd lints relative paths from the directory of each request"""
+    monkeypatch.setattr(cli, "MODELS", ModelCache())
+    for name in ["pa", "pb"]:
+        # the same name, size, and mtime in each directory
+        (tmp_path / name / ".git").mkdir(parents=True)
+        (tmp_path / name / "a.py").write_text(
+            f'"""\n@desc a\n"""\ndef {name}():\n    pass\n'
+        )
+        os.utime(tmp_path / name / "a.py", ns=(0, 0))
+    for src in [".", "a.py"]:
+        outputs = []
+        for name in ["pa", "pb", "pa"]:
+            wfile = io.BytesIO()
+            request = dict(argv=["--no-cache", src], cwd=str(tmp_path / name))
+            assert daemon.run_request(request, wfile) == 1
+            frames = [json.loads(x) for x in wfile.getvalue().splitlines()]
+            outputs.append("".join(x.get("out", "") for x in frames))
+        assert "'pa'" in outputs[0] and "'pb'" in outputs[1]
+        assert outputs[0] == outputs[2]
+
+
+def test_daemon_loopback():
+    """test that archivesd only listens on loopback hosts over tcp"""
+    server = daemon.make_server("127.0.0.1:0")
+    server.server_close()
+    with pytest.raises(ValueError):
+        daemon.make_server("0.0.0.0:0")
+
+
+def test_client_stdin():
+    """test that archives-client only forwards stdin for a - path"""
+    assert client.reads_stdin(["-"])
+    assert client.reads_stdin(["-o", "-", "-"])
+    assert client.reads_stdin(["--", "-"])
+    assert not client.reads_stdin(["-o", "-", "./extra/"])
+    assert not client.reads_stdin(["--output", "-", "--", "./extra/"])
+    options = {
+        x
+        for param in archives.params
+        if isinstance(param, click.Option) and not param.is_flag
+        for x in param.opts
+    }
+    assert options == client.VALUE_OPTIONS
+
+
+def test_watch(tmp_path, monkeypatch):
+    """test that watch mode only re-lints the files that changed"""
+    good = '"""\n@author test\n@desc good\n"""\n'
+    (tmp_path / "a.py").write_text(good)
+    (tmp_path / "b.py").write_text(good)
+    linted = []
+    lint_file = cli.lint_file
+
+    def tracked(filename, options, blob=None):
+        linted.append(filename.rsplit("/", 1)[-1])
+        return lint_file(filename, options, blob)
+
+    def tick(_):
+        if linted == ["a.py", "b.py"]:
+            (tmp_path / "a.py").write_text(good + "\n\ndef foo():\n    pass\n")
+        elif len(linted) == 3:
+            (tmp_path / "c.py").write_text(good)
+        else:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(cli, "lint_file", tracked)
+    monkeypatch.setattr(cli.time, "sleep", tick)
+    result = run(archives, ["--no-cache", "--watch", str(tmp_path)])
+    assert result.exit_code == 0
+    assert linted == ["a.py", "b.py", "a.py", "c.py"]
+    assert result.output.count("0 issues found") == 1
+    assert result.output.count("issues found") == 3
+    assert result.output.count("a.py:7:0: F106") == 2
+
+
+def test_watch_new_folder(tmp_path, monkeypatch):
+    """test that watch mode lints files added to folders created while watching"""
+    good = '"""\n@author test\n@desc good\n"""\n'
+    (tmp_path / "a.py").write_text(good)
+    linted = []
+    lint_file = cli.lint_file
+
+    def tracked(filename, options, blob=None):
+        linted.append(filename.rsplit("/", 1)[-1])
+        return lint_file(filename, options, blob)
+
+    def tick(_):
+        if not (tmp_path / "pkg").exists():
+            (tmp_path / "pkg").mkdir()
+        elif not (tmp_path / "pkg" / "new.py").exists():
+            (tmp_path / "pkg" / "new.py").write_text(good)
+        else:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(cli, "lint_file", tracked)
+    monkeypatch.setattr(cli.time, "sleep", tick)
+    result = run(archives, ["--no-cache", "--watch", str(tmp_path)])
+    assert result.exit_code == 0
+    assert linted == ["a.py", "new.py"]
+
+
+def test_watch_parse_error(tmp_path, monkeypatch):
+    """test that saving a syntax error while watching reports it and keeps watching"""
+    good = '"""\n@author test\n@desc good\n"""\n'
+    (tmp_path / "a.py").write_text(good)
+    (tmp_path / "b.py").write_text(good + "def foo():\n    pass\n")
+    saves: List[str] = []
+
+    def tick(_):
+        if not saves:
+            raise KeyboardInterrupt
+        (tmp_path / "a.py").write_text(saves.pop(0))
+        # the stamps of both saves must differ, even on coarse file systems
+        stamp = 1000 + len(saves)
+        os.utime(tmp_path / "a.py", (stamp, stamp))
+
+    monkeypatch.setattr(cli.time, "sleep", tick)
+    for flags in [[], ["--ignore-exceptions"]]:
+        saves = [good + "def broken(:\n", good]
+        args = ["--no-cache", "--watch", *flags, str(tmp_path)]
+        result = run(archives, args)
+        assert result.exit_code == 0
+        reports = result.output.split("found")
+        assert len(reports) == 4
+        assert all("b.py:5:0: F100" in x for x in reports[:3])
+        assert ("a.py:5:11: E999 unable to parse module" in reports[1]) != bool(flags)
+        assert "E999" not in reports[0] + reports[2]
+
+
+def test_discovery(tmp_path):
+    """test that file discovery prunes ignored folders and survives symlink loops"""
+    for name in ["a.py", "pkg/b.py", "pkg/c.txt", "build/d.py", "skip/e.py"]:
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text("")
+    (tmp_path / "pkg" / "loop").symlink_to(tmp_path)
+    (tmp_path / ".gitignore").write_text("skip/\n")
+    include, exclude = re.compile(DEFAULT_INCLUDES), re.compile(DEFAULT_EXCLUDES)
+
+    def found(gitignore):
+        files = get_python_files(tmp_path, tmp_path, include, exclude, gitignore)
+        return [x.relative_to(tmp_path).as_posix() for x in files]
+
+    assert found(False) == ["a.py", "pkg/b.py", "skip/e.py"]
+    assert found(True) == ["a.py", "pkg/b.py"]
+
+
+def test_benchmarks(tmp_path):
+    """test that the benchmark corpus is seeded and runs compare to a baseline"""
+    spec = Spec(files=3, functions=4)
+    first = [x.read_text() for x in generate(tmp_path / "a", spec)]
+    assert first == [x.read_text() for x in generate(tmp_path / "b", spec)]
+    other = generate(tmp_path / "c", spec._replace(seed=1))
+    assert first != [x.read_text() for x in other]
+
+    baseline = tmp_path / "baseline.json"
+    args = ["--files", "3", "--functions", "4", "--repeat", "1"]
+    args += ["--baseline", str(baseline)]
+    assert run(bench, [*args, "--save"]).exit_code == 0
+    result = run(bench, [*args, "--tolerance", "1"])
+    assert result.exit_code == 0
+    assert result.output.count("files/sec") == 5
+    assert run(bench, [*args, "--files", "4"]).exit_code == 0
+
+    # files/sec only count against the baseline when asked to
+    saved = json.loads(baseline.read_text())
+    slower = dict(saved, files_per_sec={x: 0 for x in saved["files_per_sec"]})
+    assert regressions(slower, saved, 0.25) == []
+    assert len(regressions(slower, saved, 0.25, absolute=True)) == 5
+    slower = dict(saved, relative={x: 0 for x in saved["relative"]})
+    assert len(regressions(slower, saved, 0.25)) == 5
+
+
+def test_startup():
+    """test that commands which never parse a file leave the heavy modules unloaded"""
+    result = run(startup, ["--repeat", "1", "--target", "10000"])
+    assert result.exit_code == 0, result.output
+    assert result.output.count("importing archives") == 3
+
+
+def test_profile(tmp_path):
+    """test that profiling extends the stats with phase, rule, and file timings"""
+    dump = tmp_path / "archives.pstats"
+    args = ["--no-cache", "--stats", "--profile-files", "2", "--profile-dump"]
+    result = run(archives, [*args, str(dump), "./extra/"])
+    assert result.exit_code == 1
+    assert "52 issues found" in result.output
+    assert "functions (1 nolint)" in result.output
+    report = result.output[result.output.index("profile (seconds):") :]
+    for name in ["discovery", "parse", "docs", "complexity", "rules", "F100", "A100"]:
+        assert f"  {name} " in report
+    assert "slowest 2 files" in report
+    assert pstats.Stats(str(dump)).total_calls > 0
+
+    result = run(archives, ["--no-cache", "--stats", "./extra/"])
+    assert "profile" not in result.output
+
+
+def test_metrics_file(tmp_path):
+    """test that run metrics are written as json or openmetrics"""
+    metrics = tmp_path / "metrics.json"
+    args = ["--cache-dir", str(tmp_path / "cache"), "--metrics-file", str(metrics)]
+    run(archives, [*args, "./extra/"])
+    result = run(archives, [*args, "./extra/"])
+    assert result.exit_code == 1
+    data = json.loads(metrics.read_text())
+    assert data["module_count"] == 3
+    assert data["function_nolint_count"] == 1
+    assert data["cache_hit_ratio"] == 1.0
+    assert data["issues"] == sum(data["rules"].values()) == 52
+    assert data["rules"]["F100"] == 2
+    assert data["line_count"] > 0 and data["files_per_second"] > 0
+    assert data["peak_rss_bytes"] > 0
+
+    textfile = tmp_path / "archives.prom"
+    run(archives, ["--no-cache", "--metrics-file", str(textfile), "./extra/"])
+    lines = textfile.read_text().splitlines()
+    assert "archives_modules 3" in lines
+    assert "archives_cache_misses 0" in lines
+    assert 'archives_rule_issues{code="F100"} 2' in lines
+    assert lines[-1] == "# EOF"